@@ -39,6 +39,42 @@ CONF = ioninit.config(__name__)
 
 
 cassandra_timeout = CONF.getValue('CassandraTimeout',10.0)
+
+# Maximum number of rows in a single multiget_slice or batch_mutate call
+cassandra_batch_size = CONF.getValue('CassandraBatchSize', 200)
+
+# Maximum number of equal to queries of an IN query running at the same time
+cassandra_query_concurrency = CONF.getValue('CassandraQueryConcurrency', 10)
+
+def _batches(keys):
+    """
+    Splits a list of keys into lists of at most cassandra_batch_size keys.
+    """
+    for start in xrange(0, len(keys), cassandra_batch_size):
+        yield keys[start:start + cassandra_batch_size]
+
+def _index_expression(query_tuple):
+    """
+    Converts a store.Query predicate into a cassandra IndexExpression
+    """
+    if query_tuple[2] == Query.EQ:
+        new_pred = IndexOperator.EQ
+    elif query_tuple[2] == Query.GT:
+        new_pred = IndexOperator.GT
+    else:
+        raise CassandraError("Illegal predicate value")
+    args = {'column_name':query_tuple[0], 'op':new_pred, 'value': query_tuple[1]}
+    return IndexExpression(**args)
+
+def _row_values(row):
+    """
+    Converts a cassandra row into a dictionary of column name to value
+    """
+    row_vals = {}
+    for column in row.columns:
+        row_vals[column.column.name] = column.column.value
+    return row_vals
+
 class CassandraError(Exception):
     """
     An exception class for ION Cassandra Client errors
@@ -128,6 +164,52 @@ class CassandraStore(TCPConnection):
         columns = {"value": value, "has_key":"1"}
         yield self.client.batch_insert(key, self._cache_name, columns)
 
+    @defer.inlineCallbacks
+    def multi_get(self, keys):
+        """
+        @brief Return the values corresponding to a list of keys, using one multiget_slice per batch of keys
+        @param keys List of keys
+        @retval Deferred that fires with a dictionary of key to value, None for keys that are not found
+        """
+        keys = list(set(keys))
+        result = dict.fromkeys(keys)
+
+        for batch in _batches(keys):
+            rows = yield self._multiget_slice(batch)
+            for key, columns in rows.items():
+                for column in columns:
+                    result[key] = column.column.value
+
+        defer.returnValue(result)
+
+    @defer.inlineCallbacks
+    def batch_put(self, items):
+        """
+        @brief Write many key/value pairs into cassandra, using one batch_mutate per batch of keys
+        @param items Dictionary of keys to values
+        @retval Deferred for success
+        """
+        keys = items.keys()
+        for batch in _batches(keys):
+            mutationmap = {}
+            for key in batch:
+                mutationmap[key] = {self._cache_name: {"value": items[key], "has_key":"1"}}
+            yield self._batch_mutate(mutationmap)
+
+    @timeout(cassandra_timeout)
+    def _multiget_slice(self, keys):
+        """
+        One multiget_slice call for a batch of keys. Each batch has its own timeout.
+        """
+        return self.client.multiget_slice(keys, self._cache_name, names=['value'])
+
+    @timeout(cassandra_timeout)
+    def _batch_mutate(self, mutationmap):
+        """
+        One batch_mutate call for a batch of keys. Each batch has its own timeout.
+        """
+        return self.client.batch_mutate(mutationmap)
+
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
     def has_key(self, key):
@@ -218,6 +300,28 @@ class CassandraIndexedStore(CassandraStore):
         
         yield self.client.batch_insert(key, self._cache_name, index_cols)
 
+    @defer.inlineCallbacks
+    def batch_put(self, items, index_attributes=None):
+        """
+        Istore batch_put, plus a dictionary of indexed stuff for each key
+
+        @param items Dictionary of keys to the value column of each Cassandra row
+        @param index_attributes Dictionary of keys to the dictionary of index columns for that row
+        """
+        if index_attributes is None:
+            index_attributes = {}
+
+        keys = items.keys()
+        for batch in _batches(keys):
+            mutationmap = {}
+            for key in batch:
+                index_cols = dict(**index_attributes.get(key, {}))
+                yield self._check_index(index_cols)
+                index_cols.update({"value":items[key], "has_key":"1"})
+
+                mutationmap[key] = {self._cache_name: index_cols}
+            yield self._batch_mutate(mutationmap)
+
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
     def update_index(self, key, index_attributes):
@@ -263,15 +367,15 @@ class CassandraIndexedStore(CassandraStore):
             raise IndexStoreError("Values for the indexed columns must be of type str.")
         
 
-    @timeout(cassandra_timeout)
     @defer.inlineCallbacks
-    def query(self, query_predicates, row_count=100):
+    def query(self, query_predicates, row_count=100, limit=None):
         """
         Search for rows in the Cassandra instance.
     
         @param indexed_attributes is a dictionary with column:value mappings.
         Rows are returned that have columns set to the value specified in 
         the dictionary
+        @param limit is the maximum number of rows to return. It overrides row_count when it is given.
         
         @retVal a dictionary containing the keys and values which match the query.
         
@@ -279,28 +383,94 @@ class CassandraIndexedStore(CassandraStore):
         """
         #log.info('Query against cache: %s' % self._cache_name)
         predicates = query_predicates.get_predicates()
-        def fix_preds(query_tuple):
-            if query_tuple[2] == Query.EQ:
-                new_pred = IndexOperator.EQ
-            elif query_tuple[2] == Query.GT:
-                new_pred = IndexOperator.GT
-            else:
-                raise CassandraError("Illegal predicate value")
-            args = {'column_name':query_tuple[0], 'op':new_pred, 'value': query_tuple[1]}
-            return IndexExpression(**args)
-        selection_predicates = map(fix_preds, predicates)
+
+        if limit is not None:
+            row_count = limit
+
+        if Query.IN in [pred[2] for pred in predicates]:
+            # get_indexed_slices has no IN operator - run an equal to query for each value, a few at a time
+            # Each query has its own timeout, waiting for a turn does not count
+            queries = query_predicates.split_in()
+            sem = defer.DeferredSemaphore(cassandra_query_concurrency)
+            results = yield defer.DeferredList([sem.run(self._query_slices, q.get_predicates(), row_count) for q in queries], fireOnOneErrback=True, consumeErrors=True)
+
+            result = {}
+            for success, rows in results:
+                result.update(rows)
+
+            if limit is not None and len(result) > limit:
+                result = dict(result.items()[:limit])
+            defer.returnValue(result)
+
+        result = yield self._query_slices(predicates, row_count)
+        defer.returnValue(result)
+
+    @timeout(cassandra_timeout)
+    @defer.inlineCallbacks
+    def _query_slices(self, predicates, row_count):
+        """
+        Runs a query without IN predicates as a single get_indexed_slices call.
+        """
+        selection_predicates = map(_index_expression, predicates)
         #log.debug("Calling get_indexed_slices selection_predicate %s " % (selection_predicates,))
         
         rows = yield self.client.get_indexed_slices(self._cache_name, selection_predicates, count=row_count)
         #log.info("Got rows back")
         result ={}
         for row in rows:
-            row_vals = {}
-            for column in row.columns:
-                row_vals[column.column.name] = column.column.value
-            result[row.key] = row_vals
+            result[row.key] = _row_values(row)
+
+        defer.returnValue(result)
+
+    @defer.inlineCallbacks
+    def query_all(self, query_predicates, page_size=1000):
+        """
+        Search for all the rows which match a query. A query returns at most row_count rows, this pages through
+        the indexed slices page_size rows at a time until there are no more.
+
+        @retVal a dictionary containing the keys and values which match the query.
+        """
+        predicates = query_predicates.get_predicates()
+
+        page_size = max(page_size, 2)
+
+        result = {}
+        if Query.IN in [pred[2] for pred in predicates]:
+            for q in query_predicates.split_in():
+                rows = yield self.query_all(q, page_size)
+                result.update(rows)
+            defer.returnValue(result)
+
+        selection_predicates = map(_index_expression, predicates)
+
+        start_key = ''
+        while True:
+            # The start key is included in the slice - it was the last row of the previous page
+            rows = yield self._get_indexed_slices_page(selection_predicates, page_size, start_key)
+            for row in rows:
+                result[row.key] = _row_values(row)
+
+            if len(rows) < page_size:
+                break
+            start_key = rows[-1].key
 
         defer.returnValue(result)
+
+    @timeout(cassandra_timeout)
+    def _get_indexed_slices_page(self, selection_predicates, page_size, start_key):
+        """
+        One page of the rows of a query_all. Each page has its own timeout.
+        """
+        return self.client.get_indexed_slices(self._cache_name, selection_predicates, count=page_size, start_key=start_key)
+
+    @defer.inlineCallbacks
+    def query_count(self, query_predicates, page_size=1000):
+        """
+        Count the rows which match a query. Cassandra has no count for indexed slices, so all of the rows are fetched,
+        page_size rows at a time.
+        """
+        result = yield self.query_all(query_predicates, page_size=page_size)
+        defer.returnValue(len(result))
         
     @timeout(cassandra_timeout)
     @defer.inlineCallbacks
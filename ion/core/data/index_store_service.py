@@ -24,6 +24,9 @@ from zope.interface import implements
 from ion.core import ioninit
 CONF = ioninit.config(__name__)
 
+# Maximum number of equal to queries of an IN query sent at the same time
+QUERY_CONCURRENCY = CONF.getValue('query_concurrency', 10)
+
 
 
 QUERY_ATTRIBUTES_TYPE = object_utils.create_type_identifier(object_id=17, version=1)
@@ -228,8 +231,22 @@ class IndexStoreServiceClient(ServiceClient):
     
       
     @defer.inlineCallbacks
-    def query(self, query_predicates):
+    def query(self, query_predicates, limit=None):
         log.info("Called Index Store Service client: Query")
+
+        if Query.IN in [pred[2] for pred in query_predicates.get_predicates()]:
+            # The query message has no IN predicate - send an equal to query for each value, a few at a time
+            queries = query_predicates.split_in()
+            sem = defer.DeferredSemaphore(QUERY_CONCURRENCY)
+            results = yield defer.DeferredList([sem.run(self.query, q, limit) for q in queries], fireOnOneErrback=True, consumeErrors=True)
+
+            result = {}
+            for success, rows in results:
+                result.update(rows)
+
+            if limit is not None and len(result) > limit:
+                result = dict(result.items()[:limit])
+            defer.returnValue(result)
         
         request = yield self.mc.create_instance(QUERY_ATTRIBUTES_TYPE)
 
@@ -252,7 +269,15 @@ class IndexStoreServiceClient(ServiceClient):
 
             results[row.key] = cols
 
+            if limit is not None and len(results) >= limit:
+                break
+
         defer.returnValue(results)
+
+    @defer.inlineCallbacks
+    def query_count(self, query_predicates):
+        results = yield self.query(query_predicates)
+        defer.returnValue(len(results))
         
     @defer.inlineCallbacks
     def put(self, key, value, index_attributes=None):
@@ -332,6 +357,25 @@ class IndexStoreServiceClient(ServiceClient):
         log.info("%s" % (ret,))
         defer.returnValue(ret)
         
+    @defer.inlineCallbacks
+    def multi_get(self, keys):
+        """
+        The service has no multi key operation - the gets are sent concurrently.
+        """
+        keys = list(keys)
+        results = yield defer.DeferredList([self.get(key) for key in keys], fireOnOneErrback=True)
+        defer.returnValue(dict([(key, value) for key, (success, value) in zip(keys, results)]))
+
+    @defer.inlineCallbacks
+    def batch_put(self, items, index_attributes=None):
+        """
+        The service has no batch operation - the puts are sent concurrently.
+        """
+        if index_attributes is None:
+            index_attributes = {}
+
+        yield defer.DeferredList([self.put(key, value, index_attributes.get(key)) for key, value in items.items()], fireOnOneErrback=True)
+
     @defer.inlineCallbacks
     def get_query_attributes(self):
 
@@ -9,6 +9,7 @@
         in memory implementation
 """
 import os
+import bisect
 from zope.interface import Interface
 from zope.interface import implements
 
@@ -49,6 +50,19 @@ class IStore(Interface):
      
         """
 
+    def multi_get(keys):
+        """
+        @param keys  a list of immutable keys
+        @retval Deferred, for a dictionary of each key to its value, or None if not existing.
+        """
+
+    def batch_put(items):
+        """
+        @param items  a dictionary of immutable keys to the objects to be associated with them, written in as few
+                operations on the backend as possible.
+        @retval Deferred, for success of this operation
+        """
+
 class Store(object):
     """
     Memory implementation of an asynchronous key/value store, using a dict.
@@ -74,6 +88,19 @@ class Store(object):
         """
         return defer.maybeDeferred(self.kvs.update, {key:value})
 
+    def multi_get(self, keys):
+        """
+        @see IStore.multi_get
+        """
+        kvs = self.kvs
+        return defer.succeed(dict([(key, kvs.get(key, None)) for key in keys]))
+
+    def batch_put(self, items):
+        """
+        @see IStore.batch_put
+        """
+        return defer.maybeDeferred(self.kvs.update, items)
+
     def remove(self, key):
         """
         @see IStore.remove
@@ -122,13 +149,35 @@ class IIndexStore(IStore):
         @retval Deferred, for success of this operation
      
         """
+
+    def multi_get(keys):
+        """
+        @param keys  a list of immutable keys
+        @retval Deferred, for a dictionary of each key to its value, or None if not existing.
+        """
+
+    def batch_put(items, index_attributes=None):
+        """
+        @param items  a dictionary of immutable keys to the objects to be associated with them, written in as few
+                operations on the backend as possible.
+        @param index_attributes a dictionary of keys to the dictionary of attributes by which to index each value
+        @retval Deferred, for success of this operation
+        """
         
-    def query(query_predicates):
+    def query(query_predicates, limit=None):
         """
         Search for rows in the Cassandra instance.
         @param query_predicates is a store.Query object
+        @param limit is the maximum number of rows to return, or None for all of them
         @retVal a thrift representation of the rows returned by the query.
         """
+
+    def query_count(query_predicates):
+        """
+        Count the rows which match a query, without returning them.
+        @param query_predicates is a store.Query object
+        @retVal Deferred, for the number of matching rows
+        """
         
     def update_index(key, index_attributes):
         """
@@ -170,15 +219,24 @@ class IndexStore(object):
     
     self.indices is an index to map attribute names to attribute values to keys
         {attr_names:{attr_value: set( keys)}}.
+
+    self.sorted_values holds the distinct values of each attribute in sorted order, so that GT predicates can be
+    served with a bisect instead of a scan over every value. It belongs to each instance and is rebuilt whenever it
+    no longer matches indices.
+        {attr_names:(attr_index, [sorted attr_values])}
     """
     implements(IIndexStore)
 
     kvs = {}
     indices = {}
 
+    # Number of attribute values counted to estimate the size of a GT posting set
+    GT_ESTIMATE_SAMPLE = 32
+
     def __init__(self, *args, **kwargs):
         #self.kvs = {}
         #self.indices = {}
+        self.sorted_values = {}
         
         if kwargs.has_key('indices'):
             for name in kwargs.get('indices'):
@@ -207,6 +265,33 @@ class IndexStore(object):
         self._update_index(key, index_attributes)
                         
         return defer.maybeDeferred(self.kvs.update, {key: dict({"value":value},**index_attributes)})        
+
+    def multi_get(self, keys):
+        """
+        @see IIndexStore.multi_get
+        """
+        result = {}
+        for key in keys:
+            row = self.kvs.get(key, None)
+            if row is None:
+                result[key] = None
+            else:
+                result[key] = row.get("value")
+        return defer.succeed(result)
+
+    def batch_put(self, items, index_attributes=None):
+        """
+        @see IIndexStore.batch_put
+        Raises an exception if index_attibutes contains attributes that are not indexed
+        by the underlying store.
+        """
+        return defer.maybeDeferred(self._batch_put, items, index_attributes or {})
+
+    def _batch_put(self, items, index_attributes):
+        for key, value in items.iteritems():
+            attributes = index_attributes.get(key, {})
+            self._update_index(key, attributes)
+            self.kvs[key] = dict({"value":value}, **attributes)
     
     def remove(self, key):
         """
@@ -217,58 +302,183 @@ class IndexStore(object):
             del self.kvs[key]            
         return defer.succeed(None)
         
-    def query(self, query_predicates):
+    def query(self, query_predicates, limit=None):
         """
         Search for rows in the Cassandra instance.
     
         @param indexed_attributes is a dictionary with column:value mappings.
         Rows are returned that have columns set to the value specified in 
         the dictionary
+        @param limit is the maximum number of rows to return, or None for all of them
         
         @retVal A data structure representing Cassandra rows. See the class
         docstring for the description of the data structure.
         """
         log.debug("In query: predicates %s" % query_predicates)
 
+        keys = self._query_keys(query_predicates)
+
+        #log.debug("keys: "+ str(keys))
+        result = {}
+        for k in keys:
+            if limit is not None and len(result) >= limit:
+                break
+
+            # This is stupid, but now remove effectively works - delete keys are no longer visible!
+            if self.kvs.has_key(k):
+                result[k] = self.kvs.get(k).copy()
+
+        log.debug("Query Results: %s" % result)
+
+        return defer.succeed(result)
+
+    def query_count(self, query_predicates):
+        """
+        @see IIndexStore.query_count
+        """
+        keys = self._query_keys(query_predicates)
+
+        count = 0
+        for k in keys:
+            if self.kvs.has_key(k):
+                count += 1
+
+        return defer.succeed(count)
+
+    def _query_keys(self, query_predicates):
+        """
+        Plans and runs a query against the indices, returning the set of matching keys.
+
+        The cost of each predicate is estimated from the size of its posting set. The smallest EQ posting set seeds the
+        result and the other predicates are applied cheapest first, stopping as soon as the result is empty. Set
+        intersection already walks the smaller set, but GT and IN posting sets have to be built as a union - once the
+        result is smaller than that, the rows in the result are checked directly instead.
+        """
         predicates = query_predicates.get_predicates()
 
-        eq_filter = lambda x: x[2] == Query.EQ
-        preds_eq = filter(eq_filter, predicates)
-        keys = set()
+        plan = []
+        for k,v,p in predicates:
+            if p == Query.EQ:
+                plan.append((self._eq_posting_size(k, v), k, v, p))
+            elif p == Query.GT:
+                plan.append((self._gt_posting_size(k, v), k, v, p))
+            elif p == Query.IN:
+                plan.append((self._in_posting_size(k, v), k, v, p))
+            else:
+                raise IndexStoreError('Invalid predicate type "%s" in query to IndexStore!' % p)
+
+        preds_eq = [pred for pred in plan if pred[3] != Query.GT]
         if len(preds_eq) == 0:
             raise IndexStoreError('Invalid arguments to IndexStore - must provide at least one equal to operator for search!')
+
+        # Seed with the most selective equality predicate
+        seed = min(preds_eq)
+        plan.remove(seed)
+        plan.sort()
+
+        cost, k, v, p = seed
+        if p == Query.EQ:
+            keys = set(self.indices.get(k, {}).get(v, ()))
         else:
-            k,v,pred = preds_eq.pop()
-            kindex = self.indices.get(k, None)
-            if kindex:
-                keys.update(kindex.get(v,set()))
+            keys = self._in_posting(k, v)
 
-        for k,v,p in predicates:
+        for cost, k, v, p in plan:
+            if not keys:
+                break
 
-            kindex = self.indices.get(k,None)
             if p == Query.EQ:
-                
-                if kindex:
-                    keys.intersection_update(kindex.get(v,set()))
+                keys.intersection_update(self.indices.get(k, {}).get(v, ()))
+            elif len(keys) <= cost:
+                # Cheaper to look at the rows we already have
+                keys = self._filter_rows(keys, k, v, p)
             elif p == Query.GT:
-                
-                matches = set()
-                for attr_val in kindex.keys():
-                    if attr_val > v:
-                        matches.update(kindex.get(attr_val,set()))
-                keys.intersection_update(matches)
+                keys.intersection_update(self._gt_posting(k, v))
+            else:
+                keys.intersection_update(self._in_posting(k, v))
 
-        #log.debug("keys: "+ str(keys))
-        result = {}
-        for k in keys:
-            # This is stupid, but now remove effectively works - delete keys are no longer visible!
-            if self.kvs.has_key(k):
-                result[k] = self.kvs.get(k).copy()
+        return keys
 
-        log.debug("Query Results: %s" % result)
+    def _eq_posting_size(self, attr, value):
+        return len(self.indices.get(attr, {}).get(value, ()))
+
+    def _gt_values(self, attr, value):
+        """
+        Returns the distinct values of an indexed attribute which are greater than value, using the sorted values.
+        """
+        kindex = self.indices.get(attr, None)
+        if not kindex:
+            return []
+
+        values = self._get_sorted_values(attr, kindex)
+        return values[bisect.bisect_right(values, value):]
+
+    def _gt_posting_size(self, attr, value):
+        """
+        Estimates the size of the posting set of a GT predicate for the query plan. Only the first GT_ESTIMATE_SAMPLE
+        values greater than value are counted, the others are assumed to have as many keys on average.
+        """
+        kindex = self.indices.get(attr, None)
+        if not kindex:
+            return 0
+
+        values = self._get_sorted_values(attr, kindex)
+        start = bisect.bisect_right(values, value)
+        sample = values[start:start + self.GT_ESTIMATE_SAMPLE]
+
+        size = 0
+        for attr_val in sample:
+            size += len(kindex[attr_val])
+
+        count = len(values) - start
+        if count > len(sample):
+            size = size * count // len(sample)
+        return size
+
+    def _gt_posting(self, attr, value):
+        kindex = self.indices.get(attr, {})
+        matches = set()
+        for attr_val in self._gt_values(attr, value):
+            matches.update(kindex[attr_val])
+        return matches
+
+    def _in_posting_size(self, attr, values):
+        kindex = self.indices.get(attr, {})
+        size = 0
+        for value in values:
+            size += len(kindex.get(value, ()))
+        return size
+
+    def _in_posting(self, attr, values):
+        kindex = self.indices.get(attr, {})
+        matches = set()
+        for value in values:
+            matches.update(kindex.get(value, ()))
+        return matches
+
+    def _filter_rows(self, keys, attr, value, pred):
+        result = set()
+        for key in keys:
+            row = self.kvs.get(key, None)
+            if row is None or not row.has_key(attr):
+                continue
+
+            if pred == Query.GT:
+                if row[attr] > value:
+                    result.add(key)
+            elif row[attr] in value:
+                result.add(key)
+        return result
+
+    def _get_sorted_values(self, attr, kindex):
+        """
+        Gets the sorted distinct values of an attribute, rebuilding them if the index has been replaced or cleared.
+        """
+        entry = self.sorted_values.get(attr, None)
+        if entry is None or entry[0] is not kindex or len(entry[1]) != len(kindex):
+            entry = (kindex, sorted(kindex.keys()))
+            self.sorted_values[attr] = entry
+        return entry[1]
 
-        return defer.succeed(result)                
-    
     def _update_index(self, key, index_attributes):
         log.debug("In _update_index: key %s index_attributes %s" % (key,index_attributes))
         #Ensure that we are updating attributes that are indexed.
@@ -300,7 +510,14 @@ class IndexStore(object):
             #    kindex = {}
             #    self.indices[k] = kindex
             # Create a set of keys if it does not already exist
-            kindex[v] = kindex.get(v, set())
+            if not kindex.has_key(v):
+                kindex[v] = set()
+
+                # Keep the sorted values current if they are in use
+                entry = self.sorted_values.get(k, None)
+                if entry is not None and entry[0] is kindex and len(entry[1]) == len(kindex) - 1:
+                    bisect.insort(entry[1], v)
+
             kindex[v].add(key)
     
 
@@ -339,6 +556,7 @@ class Query:
     
     EQ = "EQ"
     GT = "GT"
+    IN = "IN"
     def __init__(self):
         self._predicates = []
 
@@ -354,9 +572,38 @@ class Query:
     
     def add_predicate_gt(self, name, value):
         self._predicates.append((name,value,Query.GT))
+
+    def add_predicate_in(self, name, values):
+        """
+        Matches rows where the attribute is equal to any one of the values.
+        """
+        self._predicates.append((name,frozenset(values),Query.IN))
         
     def get_predicates(self):
         return self._predicates    
+
+    def split_in(self):
+        """
+        For backends which can not search for a set of values - returns a list of queries, one for each value of
+        the IN predicate, which together return the same rows as this query. Only one IN predicate is allowed.
+        """
+        preds_in = [pred for pred in self._predicates if pred[2] == Query.IN]
+        if len(preds_in) == 0:
+            return [self]
+        elif len(preds_in) > 1:
+            raise IndexStoreError('Only one IN predicate can be split into equal to queries!')
+
+        name, values, pred = preds_in[0]
+        queries = []
+        for value in values:
+            q = Query()
+            for item in self._predicates:
+                if item[2] == Query.IN:
+                    q.add_predicate_eq(name, value)
+                else:
+                    q._predicates.append(item)
+            queries.append(q)
+        return queries
         
     
 
@@ -198,6 +198,22 @@ class StoreServiceClient(ServiceClient):
         (content, headers, msg) = yield self.rpc_send('remove', row)
         defer.returnValue(content)
         
+    @defer.inlineCallbacks
+    def multi_get(self, keys):
+        """
+        The service has no multi key operation - the gets are sent concurrently.
+        """
+        keys = list(keys)
+        results = yield defer.DeferredList([self.get(key) for key in keys], fireOnOneErrback=True)
+        defer.returnValue(dict([(key, value) for key, (success, value) in zip(keys, results)]))
+
+    @defer.inlineCallbacks
+    def batch_put(self, items):
+        """
+        The service has no batch operation - the puts are sent concurrently.
+        """
+        yield defer.DeferredList([self.put(key, value) for key, value in items.items()], fireOnOneErrback=True)
+
     @defer.inlineCallbacks
     def has_key(self, key):
         log.info("Called Store Service client: has_key")
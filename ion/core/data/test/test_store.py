@@ -120,6 +120,20 @@ class IStoreTest(unittest.TestCase):
         has_key = yield self.ds.has_key(self.key)
         self.failUnlessEqual(has_key, False)
 
+    @defer.inlineCallbacks
+    def test_batch_put_multi_get(self):
+        key2 = object_utils.sha1bin(str(uuid4()))
+        value2 = object_utils.sha1bin(str(uuid4()))
+        missing = object_utils.sha1bin(str(uuid4()))
+
+        yield self.ds.batch_put({self.key:self.value, key2:value2})
+
+        b = yield self.ds.get(key2)
+        self.failUnlessEqual(value2, b)
+
+        result = yield self.ds.multi_get([self.key, key2, missing])
+        self.failUnlessEqual(result, {self.key:self.value, key2:value2, missing:None})
+
 
 class StoreServiceTest(IStoreTest, IonTestCase):
 
@@ -340,6 +354,110 @@ class IndexStoreTest(IStoreTest):
 
 
 
+    @defer.inlineCallbacks
+    def test_batch_put_indexed(self):
+
+        d5 = {'full_name':'Orson Scott Card', 'birth_date': '1951', 'state':'NC'}
+        d6 = {'full_name':'Dan Wells', 'birth_date': '1977', 'state':'UT'}
+
+        yield self.ds.batch_put({'ocard':'BinaryValue for Orson Scott Card', 'dwells':'BinaryValue for Dan Wells'},
+                                {'ocard':d5, 'dwells':d6})
+
+        query = Query()
+        query.add_predicate_eq('state', 'UT')
+        query.add_predicate_gt('birth_date', '1976')
+
+        rows = yield self.ds.query(query)
+        self.failUnlessEqual(rows.keys(), ['dwells'])
+        self.failUnlessEqual(rows['dwells']['value'], 'BinaryValue for Dan Wells')
+        self.failUnlessEqual(rows['dwells']['full_name'], 'Dan Wells')
+
+    @defer.inlineCallbacks
+    def test_query_limit(self):
+
+        query = Query()
+        query.add_predicate_eq('state', 'UT')
+
+        rows = yield self.ds.query(query, limit=2)
+        self.failUnlessEqual(len(rows), 2)
+        for key in rows.keys():
+            self.assertIn(key, ['bsanderson', 'htayler', 'jstewart'])
+
+    @defer.inlineCallbacks
+    def test_query_count(self):
+
+        query = Query()
+        query.add_predicate_eq('state', 'UT')
+        count = yield self.ds.query_count(query)
+        self.failUnlessEqual(count, 3)
+
+        query = Query()
+        query.add_predicate_gt('birth_date', '1970')
+        query.add_predicate_eq('state', 'UT')
+        count = yield self.ds.query_count(query)
+        self.failUnlessEqual(count, 1)
+
+    @defer.inlineCallbacks
+    def test_query_in(self):
+
+        query = Query()
+        query.add_predicate_in('full_name', ['Brandon Sanderson', 'Patrick Rothfuss', 'John Stewart', 'Nobody'])
+        query.add_predicate_eq('state', 'UT')
+
+        rows = yield self.ds.query(query)
+        self.failUnlessEqual(set(rows.keys()), set(['bsanderson', 'jstewart']))
+        self.failUnlessEqual(rows['jstewart']['value'], self.binary_value4)
+
+        query.add_predicate_gt('birth_date', '')
+        rows = yield self.ds.query(query)
+        self.failUnlessEqual(rows.keys(), ['bsanderson'])
+
+    def test_query_split_in(self):
+
+        query = Query()
+        query.add_predicate_gt('birth_date', '')
+        query.add_predicate_in('state', ['UT', 'WI'])
+
+        queries = query.split_in()
+        self.failUnlessEqual(len(queries), 2)
+        preds = set([tuple(q.get_predicates()) for q in queries])
+        self.failUnlessEqual(preds, set([(('birth_date', '', Query.GT), ('state', 'UT', Query.EQ)),
+                                         (('birth_date', '', Query.GT), ('state', 'WI', Query.EQ))]))
+
+    @defer.inlineCallbacks
+    def test_query_greater_after_put(self):
+
+        query = Query()
+        query.add_predicate_gt('birth_date', '1974')
+        query.add_predicate_eq('state', 'UT')
+        rows = yield self.ds.query(query)
+        self.failUnlessEqual(rows.keys(), ['bsanderson'])
+
+        # A new birth date must be visible to the next greater than query
+        yield self.ds.put('dwells', 'BinaryValue for Dan Wells', {'full_name':'Dan Wells', 'birth_date': '1977', 'state':'UT'})
+
+        rows = yield self.ds.query(query)
+        self.failUnlessEqual(set(rows.keys()), set(['bsanderson', 'dwells']))
+
+    @defer.inlineCallbacks
+    def test_gt_posting_size_estimate(self):
+
+        # The estimate is a plan detail of the memory store. Its rows and indices are class attributes, so start
+        # without the rows of setUp
+        self.patch(store.IndexStore, 'kvs', {})
+        self.patch(store.IndexStore, 'indices', {})
+        ds = store.IndexStore(indices=self.columns)
+        ds.GT_ESTIMATE_SAMPLE = 2
+
+        for year in range(1900, 1910):
+            yield ds.put('key%d' % year, 'value', {'birth_date':str(year), 'state':'CO'})
+
+        # At most two values are counted, the others are assumed to be the same size
+        self.failUnlessEqual(ds._gt_posting_size('birth_date', '1904'), 5)
+        self.failUnlessEqual(ds._gt_posting_size('birth_date', '1908'), 1)
+        self.failUnlessEqual(ds._gt_posting_size('birth_date', '1909'), 0)
+        self.failUnlessEqual(ds._gt_posting_size('full_name', ''), 0)
+
     @defer.inlineCallbacks
     def test_update_index_blank(self):
 
@@ -24,7 +24,10 @@ msg_sign = CONF.getValue('msg_sign', True)
 class Interceptor(ContainerProcess):
     """
     Interceptor that processes messages as the come along and passes them on.
+    A synchronous interceptor never returns a Deferred from process_sync,
+    which the interceptor system calls instead of process.
     """
+    synchronous = False
 
 class EnvelopeInterceptor(Interceptor):
     """
@@ -45,6 +48,18 @@ class EnvelopeInterceptor(Interceptor):
         else:
             raise ConfigurationError("Illegal EnvelopeInterceptor path: %s" % invocation.path)
 
+    def process_sync(self, invocation):
+        """
+        @brief process without a Deferred - only for synchronous interceptors
+        @retval invocation instance, may be modified
+        """
+        if invocation.path == Invocation.PATH_IN:
+            return self.before(invocation)
+        elif invocation.path == Invocation.PATH_OUT:
+            return self.after(invocation)
+        else:
+            raise ConfigurationError("Illegal EnvelopeInterceptor path: %s" % invocation.path)
+
     def before(self, invocation):
         return invocation
     def after(self, invocation):
@@ -54,6 +69,8 @@ class PassThroughInterceptor(EnvelopeInterceptor):
     """
     Interceptor that drops messages.
     """
+    synchronous = True
+
     def before(self, invocation):
         invocation.proceed()
         return invocation
@@ -65,6 +82,8 @@ class DropInterceptor(EnvelopeInterceptor):
     """
     Interceptor that drops messages.
     """
+    synchronous = True
+
     def before(self, invocation):
         invocation.drop()
         return invocation
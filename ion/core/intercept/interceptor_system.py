@@ -6,6 +6,7 @@
 @brief Process Manager for capability container
 """
 
+import time
 import types
 
 from twisted.internet import defer
@@ -22,6 +23,35 @@ from ion.core.process.cprocess import ContainerProcess, IContainerProcess, Invoc
 from ion.util.state_object import BasicLifecycleObject
 import ion.util.procutils as pu
 
+CONF = ioninit.config(__name__)
+
+
+class TimingHistogram(object):
+    """
+    Counts of durations in power of two microsecond buckets, keyed by the
+    upper bound of the bucket.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        bucket = 1 << int(duration * 1e6).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def summary(self):
+        return {'count':self.count,
+                'mean':self.total / self.count if self.count else 0.0,
+                'max':self.max,
+                'buckets':dict(self.buckets)}
+
+
 class InterceptorSystem(Interceptor):
     """
     Container interceptor system class.
@@ -33,6 +63,10 @@ class InterceptorSystem(Interceptor):
         self.interceptors = {}
         self.paths = {}
 
+        # Per step timing histograms, collected only when switched on
+        self.timing = CONF.getValue('timing', False)
+        self._timings = {}
+
     # Life cycle
 
     @defer.inlineCallbacks
@@ -66,27 +100,71 @@ class InterceptorSystem(Interceptor):
             # have priorities and alternative routes
 
     # API
-    @defer.inlineCallbacks
     def process(self, invocation):
         """
+        Runs the invocation through the interceptors of its path. Consecutive
+        synchronous interceptors run in a plain loop, a Deferred is only chained
+        where an interceptor is asynchronous.
         @param invocation container object for parameters
-        @retval invocation instance, may be modified
+        @retval Deferred for the invocation instance, may be modified
         """
         pathname = invocation.path
         path = self.paths.get(pathname, None)
         if not path:
-            raise RuntimeError("Path %s unknown" % invocation.path)
-        for path_element in path:
+            return defer.fail(RuntimeError("Path %s unknown" % invocation.path))
+        try:
+            result = self._run_path(invocation, pathname, path, 0)
+        except Exception:
+            return defer.fail()
+        if isinstance(result, defer.Deferred):
+            return result
+        return defer.succeed(result)
+
+    def timings(self, reset=False):
+        """
+        @brief Durations of the interceptor steps, collected when timing is on
+        @retval dict of (path, step name) to count, mean and max seconds and
+            the counts per power of two microseconds bucket
+        """
+        timings = dict((key, hist.summary()) for key, hist in self._timings.iteritems())
+        if reset:
+            self._timings.clear()
+        return timings
+
+    # Helpers
+
+    def _run_path(self, invocation, pathname, path, index):
+        """
+        Runs the path from the step at index on. Returns the invocation, or a
+        Deferred of the rest of the path once an asynchronous step is reached.
+        """
+        timing = self.timing
+        start = None
+        while index < len(path):
+            path_element = path[index]
             invocation.path = pathname
             intc = path_element['interceptor_instance']
-            #log.debug("Process path %s step %s" % (invocation.path, path_element['name']))
+            if timing:
+                start = time.time()
             try:
-                invocation = yield defer.maybeDeferred(intc.process, invocation)
+                if intc.synchronous:
+                    invocation = intc.process_sync(invocation)
+                else:
+                    result = intc.process(invocation)
+                    if isinstance(result, defer.Deferred):
+                        result.addCallbacks(self._step_done, self._step_failed,
+                                            callbackArgs=(pathname, path, index, start),
+                                            errbackArgs=(invocation, path_element))
+                        return result
+                    invocation = result
             except Exception, ex:
                 log.exception("Error in interceptor path %s step %s" % (
                     invocation.path, path_element['name']))
                 invocation.error(str(ex))
-                raise ex
+                raise
+
+            if start is not None:
+                self._record(pathname, path_element['name'], time.time() - start)
 
             # Continuation
             if invocation.status == Invocation.STATUS_DROP:
@@ -95,9 +173,27 @@ class InterceptorSystem(Interceptor):
             if invocation.status == Invocation.STATUS_DONE:
                 #log.debug("Process path %s step %s: DONE" % (invocation.path, path_element['name']))
                 break
-        defer.returnValue(invocation)
+            index += 1
+        return invocation
 
-    # Helpers
+    def _step_done(self, invocation, pathname, path, index, start):
+        if start is not None:
+            self._record(pathname, path[index]['name'], time.time() - start)
+        if invocation.status in (Invocation.STATUS_DROP, Invocation.STATUS_DONE):
+            return invocation
+        return self._run_path(invocation, pathname, path, index + 1)
+
+    def _step_failed(self, failure, invocation, path_element):
+        log.error("Error in interceptor path %s step %s: %s" % (
+            invocation.path, path_element['name'], failure.getTraceback()))
+        invocation.error(str(failure.value))
+        return failure
+
+    def _record(self, pathname, name, duration):
+        hist = self._timings.get((pathname, name))
+        if hist is None:
+            hist = self._timings[(pathname, name)] = TimingHistogram()
+        hist.add(duration)
 
     @defer.inlineCallbacks
     def _init_system(self, config):
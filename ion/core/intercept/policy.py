@@ -20,13 +20,18 @@ from ion.core.messaging.message_client import MessageInstance
 from ion.core.process.cprocess import Invocation
 
 import time
+import weakref
 
 from ion.util.config import Config
+from ion.util.cache import LRUDict
+from ion.util.state_object import BasicStates
 
 from ion.services.coi.datastore_bootstrap.ion_preload_config import OWNED_BY_ID
 from ion.services.dm.inventory.association_service import AssociationServiceClient, ASSOCIATION_QUERY_MSG_TYPE
-from ion.services.dm.inventory.association_service import IDREF_TYPE
+from ion.services.dm.inventory.association_service import IDREF_TYPE, BLOBS_MESSAGE_TYPE
 from ion.core.messaging.message_client import MessageClient
+from ion.services.dm.distribution.events import OwnershipChangeEventSubscriber
+from ion.services.dm.distribution.publisher_subscriber import SubscriberFactory
 
 from google.protobuf.internal.containers import RepeatedScalarFieldContainer
 
@@ -102,6 +107,78 @@ def construct_user_role_lists(userroledict):
 userroledb_filename = ioninit.adjust_dir(CONF.getValue('userroledb'))
 user_role_dict = construct_user_role_lists(Config(userroledb_filename).getObject())
 
+# The bit of each role in the role masks of the policy table
+ROLE_BITS = {'ANONYMOUS':1,
+             'AUTHENTICATED':2,
+             'DATA_PROVIDER':4,
+             'MARINE_OPERATOR':8,
+             'EARLY_ADOPTER':16,
+             'OWNER':32,
+             'ADMIN':64}
+
+def role_mask(roles):
+    mask = 0
+    for role in roles:
+        mask |= ROLE_BITS[role]
+    return mask
+
+class PolicyTable(object):
+    """
+    The policy dictionary and user role dictionary compiled for the interceptor: the policy of each service operation
+    is one entry keyed by (service, operation), and the roles of each user are one bitmask. A table is never modified,
+    a change compiles a new table.
+    """
+
+    def __init__(self, policy_dictionary, user_role_dict):
+        # (service, operation) -> (mask of the roles allowed, True if owners are allowed, resources, set of role names)
+        self.decisions = {}
+        for service, operations in policy_dictionary.iteritems():
+            for operation, op_dict in operations.iteritems():
+                roles = op_dict['roles']
+                self.decisions[(service, operation)] = (role_mask(roles - set(['OWNER'])), 'OWNER' in roles, op_dict['resources'], roles)
+
+        # ooi_id -> mask of the roles given to the user in the user role db
+        self.user_masks = {}
+        for role, role_entries in user_role_dict.iteritems():
+            for role_entry in role_entries:
+                ooi_id = role_entry['ooi_id']
+                if ooi_id is not None:
+                    self.user_masks[ooi_id] = self.user_masks.get(ooi_id, 0) | ROLE_BITS[role]
+
+    def user_mask(self, ooi_id):
+        if ooi_id == 'ANONYMOUS':
+            return ROLE_BITS['ANONYMOUS']
+        return ROLE_BITS['ANONYMOUS'] | ROLE_BITS['AUTHENTICATED'] | self.user_masks.get(ooi_id, 0)
+
+policy_table = PolicyTable(policy_dictionary, user_role_dict)
+
+def compile_policy():
+    """
+    Compile the current policy and user role dictionaries into a new policy table and make it current.
+    """
+    global policy_table
+    policy_table = PolicyTable(policy_dictionary, user_role_dict)
+    return policy_table
+
+def reload_policy():
+    """
+    Read the policy db and user role db files again. The users mapped to subjects keep their roles. The new policy is
+    used by all messages authorized after this call - none see part of it.
+    """
+    global policy_dictionary, user_role_dict
+
+    new_policy_dictionary = construct_policy_lists(Config(policydb_filename).getObject())
+    new_user_role_dict = construct_user_role_lists(Config(userroledb_filename).getObject())
+
+    for role, role_entries in new_user_role_dict.iteritems():
+        mapped = dict([(role_entry['subject'], role_entry['ooi_id']) for role_entry in user_role_dict.get(role, [])])
+        for role_entry in role_entries:
+            role_entry['ooi_id'] = mapped.get(role_entry['subject'])
+
+    policy_dictionary = new_policy_dictionary
+    user_role_dict = new_user_role_dict
+    return compile_policy()
+
 def subject_has_role(subject,role):
     if role == 'ANONYMOUS':
         return True
@@ -115,23 +192,13 @@ def user_has_role(ooi_id,role):
     if role == 'OWNER':
         # Will be special handled within the policy flow
         return False
-    if role == 'ANONYMOUS':
-        return True
-    elif role == 'AUTHENTICATED':
-        if ooi_id != 'ANONYMOUS':
-            return True
-        else:
-            return False
-    else:
-        for role_entry in user_role_dict[role]:
-            if role_entry['ooi_id'] == ooi_id:
-                return True
-    return False
+    return bool(policy_table.user_mask(ooi_id) & ROLE_BITS[role])
 
 def map_ooi_id_to_subject_role(subject,ooi_id,role):
     for role_entry in user_role_dict[role]:
         if role_entry['subject'] == subject:
             role_entry['ooi_id'] = ooi_id
+            compile_policy()
             return
 
 # Role convenience methods
@@ -171,169 +238,355 @@ def subject_has_early_adopter_role(subject):
 def user_has_early_adopter_role(ooi_id):
     return user_has_role(ooi_id, 'EARLY_ADOPTER')
 
+class OwnershipCache(object):
+    """
+    The ownership decisions of the association service by resource id and user id. Decisions expire after a time to
+    live and are forgotten when the datastore announces a new commit to an ownership association of the resource.
+    """
+
+    def __init__(self, ttl, size):
+        """
+        @param ttl the number of seconds a decision is used for, 0 to disable the cache
+        @param size the limit on the number of resources held
+        """
+        self.ttl = ttl
+
+        # resource id -> {user id: (owned, time)}
+        self._decisions = LRUDict(size)
+
+        # The process which receives the ownership change events
+        self._subscriber_process = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self.decisions = 0
+        self.decision_time = 0.0
+        self.max_decision_time = 0.0
+
+    @defer.inlineCallbacks
+    def subscribe(self, process):
+        """
+        Subscribe to the ownership change events in the given process, unless the process which subscribed before is
+        still active. Decisions made while no process was subscribed are forgotten.
+        """
+        subscribed = self._subscriber_process and self._subscriber_process()
+        if subscribed is not None and subscribed._get_state() == BasicStates.S_ACTIVE:
+            return
+
+        self._decisions.clear()
+        self._subscriber_process = weakref.ref(process)
+
+        sub_factory = SubscriberFactory(subscriber_type=OwnershipChangeEventSubscriber, process=process)
+        yield sub_factory.build(handler=self._on_ownership_changed)
+
+    def _on_ownership_changed(self, data):
+        """
+        Handler for ownership change events - the origin of the event is the resource id.
+        """
+        self.invalidate(data['content'].origin)
+
+    def invalidate(self, resource_id):
+        if resource_id in self._decisions:
+            del self._decisions[resource_id]
+            self.invalidations += 1
+
+    def get(self, user_id, resource_id):
+        """
+        @retval True or False if the decision is cached, otherwise None
+        """
+        decision = self._decisions.get(resource_id, {}).get(user_id)
+        if decision is None or time.time() - decision[1] > self.ttl:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return decision[0]
+
+    def put(self, user_id, resource_id, owned):
+        users = self._decisions.get(resource_id)
+        if users is None:
+            users = self._decisions[resource_id] = {}
+        users[user_id] = (owned, time.time())
+
+    def record_decision(self, seconds):
+        self.decisions += 1
+        self.decision_time += seconds
+        self.max_decision_time = max(self.max_decision_time, seconds)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'resources':len(self._decisions.keys()),
+                'hits':self.hits,
+                'misses':self.misses,
+                'hit_rate':float(self.hits) / lookups if lookups else 0.0,
+                'invalidations':self.invalidations,
+                'decisions':self.decisions,
+                'mean_decision_time':self.decision_time / self.decisions if self.decisions else 0.0,
+                'max_decision_time':self.max_decision_time}
+
+
+# Key of the Invocation args entry where the PolicyHeaderInterceptor leaves the ownership check it could not make
+OWNER_CHECK = 'policy_owner_check'
+
+def check_headers(msg, invocation):
+    """
+    @brief Policy enforcement method which implements the functionality
+        conceptualized as the policy decision point (PDP), as far as it
+        can be decided from the message headers alone.
+    This method
+    will take the specified user id, convert it into a role.  A search
+    will then be performed on the global policy_dictionary to determine if
+    the user has the appropriate authority to access the specified
+    resource via the specified action. A final check is made to determine
+    if the user's authentication has expired.
+    The following rules are applied to determine authority:
+    - If there are no policy tuple entries for service, or no policy
+    tuple entries for the specified role, the action is assumed to be allowed.
+    - Else, there is a policy tuple for this service:operation.  A check
+    is made to ensure the user role is equal to or greater than the
+    required role.
+    Role precedence from lower to higher is:
+        ANONYMOUS, AUTHORIZED, OWNER, ADMIN
+    @param msg: dict with the message headers, the content is not used
+    @param invocation: invocation object passed on interceptor stack, dropped if not authorized
+    @return: None if the decision is made, otherwise the tuple of (user_id, expiry, service, operation, resources)
+        for the ownership check, which needs the decoded content
+    """
+
+    # Ignore messages that are not of performative 'request'
+    if msg.get('performative', None) != 'request':
+        return None
+
+    # Reject improperly defined messages
+    if not 'user-id' in msg:
+        log.error("Policy Interceptor: Rejecting improperly defined message missing user-id [%s].", msg)
+        invocation.drop(note='Error: no user-id defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+        return None
+    if not 'expiry' in msg:
+        log.error("Policy Interceptor: Rejecting improperly defined message missing expiry [%s].", msg)
+        invocation.drop(note='Error: no expiry defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+        return None
+    if not 'receiver' in msg:
+        log.error("Policy Interceptor: Rejecting improperly defined message missing receiver [%s].", msg)
+        invocation.drop(note='Error: no receiver defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+        return None
+    if not 'op'in msg:
+        log.error("Policy Interceptor: Rejecting improperly defined message missing op [%s].", msg)
+        invocation.drop(note='Error: no op defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+        return None
+
+    user_id = msg['user-id']
+    expirystr = msg['expiry']
+
+    if not type(expirystr) is str:
+        log.error("Policy Interceptor: Rejecting improperly defined message with bad expiry [%s].", expirystr)
+        invocation.drop(note='Error: expiry improperly defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+        return None
+
+    try:
+        expiry = int(expirystr)
+    except ValueError, ex:
+        log.error("Policy Interceptor: Rejecting improperly defined message with bad expiry [%s].", expirystr)
+        invocation.drop(note='Error: expiry improperly defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+        return None
+
+    rcvr = msg['receiver']
+    service = rcvr.rsplit('.',1)[-1]
+
+    operation = msg['op']
+
+    # One probe of the current policy table - a reload replaces the table, not its contents
+    table = policy_table
+    decision = table.decisions.get((service, operation))
+
+    log.debug('Policy Interceptor: Authorization request for service [%s] operation [%s] user_id [%s] expiry [%s]', service, operation, user_id, expiry)
+    if decision is not None:
+        roles_mask, owner_allowed, resources, role_entry = decision
+
+        if not table.user_mask(user_id) & roles_mask:
+            # Special handling for ownership role
+            # ANONYMOUS can never own a resource, so return fail
+            if user_id == 'ANONYMOUS' or not owner_allowed:
+                log.warn('Policy Interceptor: Authentication failed for service [%s] operation [%s] resource [%s] user_id [%s] expiry [%s] for roles [%s]. Returning Not Authorized.', service, operation, '*', user_id, expiry, role_entry)
+                invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
+                return None
+
+            return (user_id, expiry, service, operation, resources)
+    else:
+        log.debug('Policy Interceptor: service operation not in policy dictionary.')
+
+    check_expiry(invocation, user_id, expiry, service, operation)
+    return None
+
+def check_expiry(invocation, user_id, expiry, service, operation):
+    if expiry > 0:
+        current_time = time.time()
+
+        if current_time > expiry:
+            log.warn('Policy Interceptor: Current time [%s] exceeds expiry [%s] for service [%s] operation [%s] resource [%s] user_id [%s] . Returning Not Authorized.', current_time, expiry, service, operation, '*', user_id)
+            invocation.drop(note='Authentication expired', code=Invocation.CODE_UNAUTHORIZED)
+            return invocation
+
+    log.debug('Policy Interceptor: Returning Authorized.')
+    return invocation
+
+
+class PolicyHeaderInterceptor(EnvelopeInterceptor):
+    """
+    The checks of the policy step which need only the message headers. On the in path it runs before the codec, so a
+    request is rejected before its content is decoded. An ownership check is left for the PolicyInterceptor.
+    """
+    synchronous = True
+
+    def before(self, invocation):
+        msg = invocation.message
+        if hasattr(msg, 'message_headers'):
+            headers = msg.message_headers
+        else:
+            headers = invocation.content
+
+        invocation.args[OWNER_CHECK] = check_headers(headers, invocation)
+        return invocation
+
+    def after(self, invocation):
+        return invocation
+
+
 class PolicyInterceptor(EnvelopeInterceptor):
+
+    def __init__(self, *args, **kwargs):
+        EnvelopeInterceptor.__init__(self, *args, **kwargs)
+
+        self.ownership_cache = OwnershipCache(CONF.getValue('ownership_cache_ttl', 0), CONF.getValue('ownership_cache_size', 10000))
+
+        # The message and association service clients of each process
+        self._clients = weakref.WeakKeyDictionary()
+
     def before(self, invocation):
         msg = invocation.content
+        if OWNER_CHECK in invocation.args:
+            # The PolicyHeaderInterceptor made the header checks
+            owner_check = invocation.args[OWNER_CHECK]
+            if owner_check is None:
+                return defer.succeed(invocation)
+            return self._authorize_owner(msg, invocation, *owner_check)
+
         return self.is_authorized(msg, invocation)
 
     def after(self, invocation):
         return invocation
 
-    @defer.inlineCallbacks
     def is_authorized(self, msg, invocation):
         """
-        @brief Policy enforcement method which implements the functionality
-            conceptualized as the policy decision point (PDP).
-        This method
-        will take the specified user id, convert it into a role.  A search
-        will then be performed on the global policy_dictionary to determine if
-        the user has the appropriate authority to access the specified
-        resource via the specified action. A final check is made to determine
-        if the user's authentication has expired.
-        The following rules are applied to determine authority:
-        - If there are no policy tuple entries for service, or no policy
-        tuple entries for the specified role, the action is assumed to be allowed.
-        - Else, there is a policy tuple for this service:operation.  A check
-        is made to ensure the user role is equal to or greater than the
-        required role.
-        Role precedence from lower to higher is:
-            ANONYMOUS, AUTHORIZED, OWNER, ADMIN
+        @brief Makes the header checks of check_headers and, if they leave it
+        open, the ownership check of the resources in the message content.
         @param msg: message content from invocation
         @param invocation: invocation object passed on interceptor stack.
-        @return: invocation object indicating status of authority check
+        @return: deferred invocation object indicating status of authority check
         """
+        owner_check = check_headers(msg, invocation)
+        if owner_check is None:
+            return defer.succeed(invocation)
 
-        # Ignore messages that are not of performative 'request'
-        if msg.get('performative', None) != 'request':
-            defer.returnValue(invocation)
+        return self._authorize_owner(msg, invocation, *owner_check)
 
-        # Reject improperly defined messages
-        if not 'user-id' in msg:
-            log.error("Policy Interceptor: Rejecting improperly defined message missing user-id [%s]." % str(msg))
-            invocation.drop(note='Error: no user-id defined in message header!', code=Invocation.CODE_BAD_REQUEST)
-            defer.returnValue(invocation)
-        if not 'expiry' in msg:
-            log.error("Policy Interceptor: Rejecting improperly defined message missing expiry [%s]." % str(msg))
-            invocation.drop(note='Error: no expiry defined in message header!', code=Invocation.CODE_BAD_REQUEST)
-            defer.returnValue(invocation)
-        if not 'receiver' in msg:
-            log.error("Policy Interceptor: Rejecting improperly defined message missing receiver [%s]." % str(msg))
-            invocation.drop(note='Error: no receiver defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+    @defer.inlineCallbacks
+    def _authorize_owner(self, msg, invocation, user_id, expiry, service, operation, resources):
+        """
+        Authorize a user who has none of the roles of the operation, but may own the resources in the message.
+        """
+        return_uuid_list = self.find_uuids(invocation, msg, user_id, resources)
+        if invocation.status != Invocation.STATUS_PROCESS:
+            log.warn('Policy Interceptor: Authentication failed for service [%s] operation [%s] resource [%s] user_id [%s] expiry [%s] for role [OWNER].', service, operation, '*', user_id, expiry)
             defer.returnValue(invocation)
-        if not 'op'in msg:
-            log.error("Policy Interceptor: Rejecting improperly defined message missing op [%s]." % str(msg))
-            invocation.drop(note='Error: no op defined in message header!', code=Invocation.CODE_BAD_REQUEST)
+
+        yield self.check_owner(user_id, return_uuid_list, invocation)
+        if invocation.status != Invocation.STATUS_PROCESS:
+            log.warn('Policy Interceptor: Authentication failed for service [%s] operation [%s] resource [%s] user_id [%s] expiry [%s] for role [OWNER].', service, operation, '*', user_id, expiry)
             defer.returnValue(invocation)
 
-        user_id = msg['user-id']
-        expirystr = msg['expiry']
+        log.debug('Policy Interceptor: Role <OWNER> authentication matches')
+        defer.returnValue(check_expiry(invocation, user_id, expiry, service, operation))
 
-        if not type(expirystr) is str:
-            log.error("Policy Interceptor: Rejecting improperly defined message with bad expiry [%s]." % str(expirystr))
-            invocation.drop(note='Error: expiry improperly defined in message header!', code=Invocation.CODE_BAD_REQUEST)
-            defer.returnValue(invocation)
+    @defer.inlineCallbacks
+    def check_owner(self, user_id, uuid_list, invocation):
+        """
+        Drop the invocation unless the user owns all of the resources. Decisions which are not cached are asked of the
+        association service with one request.
+        """
+        start = time.time()
+        cache = self.ownership_cache
 
-        try:
-            expiry = int(expirystr)
-        except ValueError, ex:
-            log.error("Policy Interceptor: Rejecting improperly defined message with bad expiry [%s]." % str(expirystr))
-            invocation.drop(note='Error: expiry improperly defined in message header!', code=Invocation.CODE_BAD_REQUEST)
-            defer.returnValue(invocation)
+        missing = []
+        for uuid in uuid_list:
+            owned = None
+            if cache.ttl:
+                owned = cache.get(user_id, uuid)
 
-        rcvr = msg['receiver']
-        service = rcvr.rsplit('.',1)[-1]
-
-        operation = msg['op']
-
-        log.info('Policy Interceptor: Authorization request for service [%s] operation [%s] user_id [%s] expiry [%s]' % (service, operation, user_id, expiry))
-        if service in policy_dictionary:
-            service_list = policy_dictionary[service]
-            # TODO figure out how to handle non-wildcard resource ids
-            if operation in service_list:
-                role_entry = service_list[operation]['roles']
-                log.info('Policy Interceptor: Policy tuple [%s]' % str(role_entry))
-
-                role_match_found = False
-                for role in role_entry:
-                    if user_has_role(user_id, role):
-                        log.info('Policy Interceptor: Role <%s> authentication matches' % role)
-                        role_match_found = True
-                        break
-
-                if role_match_found == False:
-                    # Special handling for ownership role
-                    # ANONYMOUS can never own a resource, so return fail
-                    if user_id == 'ANONYMOUS':
-                        log.warn('Policy Interceptor: Authentication failed for service [%s] operation [%s] resource [%s] user_id [%s] expiry [%s] for roles [%s]. Returning Not Authorized.' % (service, operation, '*', user_id, expiry, str(role_entry)))
-                        invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
-                        defer.returnValue(invocation)
-
-                    isOwnershipPolicy = False
-                    for role in role_entry:
-                        if role == 'OWNER':
-                            isOwnershipPolicy = True
-                            break
-
-                    if isOwnershipPolicy == True:
-                        return_uuid_list = self.find_uuids(invocation, msg, user_id, service_list[operation]['resources'])
-                        if invocation.status != Invocation.STATUS_PROCESS:
-                            log.warn('Policy Interceptor: Authentication failed for service [%s] operation [%s] resource [%s] user_id [%s] expiry [%s] for role [OWNER].' % (service, operation, '*', user_id, expiry))
-                            defer.returnValue(invocation)
-                            
-                        yield self.check_owner(user_id, return_uuid_list, invocation)
-                        if invocation.status != Invocation.STATUS_PROCESS:
-                            log.warn('Policy Interceptor: Authentication failed for service [%s] operation [%s] resource [%s] user_id [%s] expiry [%s] for role [OWNER].' % (service, operation, '*', user_id, expiry))
-                            defer.returnValue(invocation)
-                        else:
-                            log.info('Policy Interceptor: Role <OWNER> authentication matches')
-                    else:
-                        log.warn('Policy Interceptor: Authentication failed for service [%s] operation [%s] resource [%s] user_id [%s] expiry [%s] for roles [%s]. Returning Not Authorized.' % (service, operation, '*', user_id, expiry, str(role_entry)))
-                        invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
-                        defer.returnValue(invocation)
-            else:
-                log.info('Policy Interceptor: operation not in policy dictionary.')
-        else:
-            log.info('Policy Interceptor: service not in policy dictionary.')
+            if owned is False:
+                log.warn('Policy Interceptor: Authentication failed. User <%s> does not own resource <%s>.', user_id, uuid)
+                invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
+                cache.record_decision(time.time() - start)
+                return
+            elif owned is None and uuid not in missing:
+                missing.append(uuid)
+
+        if missing:
+            if cache.ttl:
+                yield cache.subscribe(invocation.process)
 
-        expiry_time = int(expiry)
-        if (expiry_time > 0):
-            current_time = time.time()
+            results = yield self._associations_exist(user_id, missing, invocation.process)
+
+            if len(results) != len(missing):
+                log.error('Policy Interceptor: Ownership check of %d resources returned %d results.', len(missing), len(results))
+                invocation.drop(note='Error: Ownership check failed!', code=Invocation.CODE_UNAUTHORIZED)
+                cache.record_decision(time.time() - start)
+                return
 
-            if current_time > expiry_time:
-                log.warn('Policy Interceptor: Current time [%s] exceeds expiry [%s] for service [%s] operation [%s] resource [%s] user_id [%s] . Returning Not Authorized.' % (str(current_time), expiry, service, operation, '*', user_id))
-                invocation.drop(note='Authentication expired', code=Invocation.CODE_UNAUTHORIZED)
-                defer.returnValue(invocation)
+            for uuid, owned in zip(missing, results):
+                if cache.ttl:
+                    cache.put(user_id, uuid, owned)
 
-        log.info('Policy Interceptor: Returning Authorized.')
-        defer.returnValue(invocation)
+                if not owned:
+                    log.warn('Policy Interceptor: Authentication failed. User <%s> does not own resource <%s>.', user_id, uuid)
+                    invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
+                    break
+
+        cache.record_decision(time.time() - start)
 
     @defer.inlineCallbacks
-    def check_owner(self, user_id, uuid_list, invocation):
-        self.mc = MessageClient(proc=invocation.process)
-        self.asc = AssociationServiceClient(proc=invocation.process)
+    def _associations_exist(self, user_id, uuid_list, process):
+        """
+        @retval a list with True for each resource in uuid_list which the user owns, False for the others
+        """
+        clients = self._clients.get(process)
+        if clients is None:
+            clients = self._clients[process] = (MessageClient(proc=process), AssociationServiceClient(proc=process))
+        mc, asc = clients
 
-        for uuid in uuid_list:        
-            request = yield self.mc.create_instance(ASSOCIATION_QUERY_MSG_TYPE)
+        request = yield mc.create_instance(BLOBS_MESSAGE_TYPE)
 
-            request.object = request.CreateObject(IDREF_TYPE)
-            request.object.key = user_id
+        for uuid in uuid_list:
+            query = request.CreateObject(ASSOCIATION_QUERY_MSG_TYPE)
 
-            request.predicate = request.CreateObject(IDREF_TYPE)
-            request.predicate.key = OWNED_BY_ID
+            query.object = request.CreateObject(IDREF_TYPE)
+            query.object.key = user_id
 
-            request.subject = request.CreateObject(IDREF_TYPE)
-            request.subject.key = uuid
+            query.predicate = request.CreateObject(IDREF_TYPE)
+            query.predicate.key = OWNED_BY_ID
 
-            # make the request
-            log.warn('Calling association service for user id <%s> and uuid <%s>' % (user_id, uuid))
-            result = yield self.asc.association_exists(request)
-            log.warn('Return from association service call for user id <%s> and uuid <%s>' % (user_id, uuid))
-            if result.result == False:
-                log.warn('Policy Interceptor: Authentication failed. User <%s> does not own resource <%s>.' % (user_id, uuid))
-                invocation.drop(note='Not authorized', code=Invocation.CODE_UNAUTHORIZED)
-                return
-            else:
-                log.warn('Policy Interceptor: User <%s> owns resource <%s>.' % (user_id, uuid))
+            query.subject = request.CreateObject(IDREF_TYPE)
+            query.subject.key = uuid
+
+            link = request.blob_elements.add()
+            link.SetLink(query)
+
+        log.info('Calling association service for user id <%s> and %d resources', user_id, len(uuid_list))
+        result = yield asc.associations_exist(request)
+
+        defer.returnValue([exists.result for exists in result.blob_elements])
 
     def find_uuids(self, invocation, msg, user_id, resources):
         """
@@ -343,7 +596,7 @@ class PolicyInterceptor(EnvelopeInterceptor):
         to see if user is an owner of the resource.
         """
 
-        log.info('Policy Interceptor: In check_resource_ownership. Resources: <%s>' % str(resources))
+        log.debug('Policy Interceptor: In check_resource_ownership. Resources: <%s>', resources)
         
         content = msg.get('content','')
         if isinstance(content, MessageInstance):
@@ -356,11 +609,11 @@ class PolicyInterceptor(EnvelopeInterceptor):
             else:
                 return uuid_list
         else:
-            log.error("Policy Interceptor: Rejecting improperly defined message missing MessageInstance [%s]." % str(msg))
+            log.error("Policy Interceptor: Rejecting improperly defined message missing MessageInstance [%s].", msg)
             invocation.drop(note='Error: MessageInstance missing from message payload!', code=Invocation.CODE_BAD_REQUEST)
 
     def find_uuids_traverse_gpbs(self, invocation, msg, wrapper, repo, user_id, resources, uuid_list = None):
-        log.info('Policy Interceptor: In check_resource_ownership_traverse_gpbs')
+        log.debug('Policy Interceptor: In check_resource_ownership_traverse_gpbs')
 
         if uuid_list is None:
             uuid_list = []
@@ -368,25 +621,25 @@ class PolicyInterceptor(EnvelopeInterceptor):
         childLinksSet = wrapper.ChildLinks
         
         if len(childLinksSet) == 0:
-            log.info('Policy Interceptor: Returning from check_resource_ownership_traverse_gpbs.  ChildLinksSet zero length.')
+            log.debug('Policy Interceptor: Returning from check_resource_ownership_traverse_gpbs.  ChildLinksSet zero length.')
             return
             
         for link in wrapper.ChildLinks:
             obj = repo.get_linked_object(link)
             type = obj.ObjectType
             typeId = type.object_id
-            log.info('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  Child type: <%s>' % str(typeId))
+            log.debug('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  Child type: <%s>', typeId)
             if typeId in resources:
-                log.info('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  Child type match found in resources')
+                log.debug('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  Child type match found in resources')
                 gpbMessage = obj.GPBMessage
                 uuid = getattr(gpbMessage,resources[typeId])
-                log.info('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  GPB type: %s UUID: %s' % (str(typeId),uuid))
+                log.debug('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  GPB type: %s UUID: %s', typeId,uuid)
                 if not uuid:
-                    log.error("Policy Interceptor: Rejecting improperly defined message missing expected uuid [%s]." % str(msg))
+                    log.error("Policy Interceptor: Rejecting improperly defined message missing expected uuid [%s].", msg)
                     invocation.drop(note='Error: Uuid missing from message payload!', code=Invocation.CODE_BAD_REQUEST)
                     return
                 if uuid == '':
-                    log.error("Policy Interceptor: Rejecting improperly defined message missing expected uuid [%s]." % str(msg))
+                    log.error("Policy Interceptor: Rejecting improperly defined message missing expected uuid [%s].", msg)
                     invocation.drop(note='Error: Uuid missing from message payload!', code=Invocation.CODE_BAD_REQUEST)
                     return
                 if isinstance(uuid, RepeatedScalarFieldContainer):
@@ -396,12 +649,12 @@ class PolicyInterceptor(EnvelopeInterceptor):
                 elif isinstance(uuid, unicode):
                     uuid_list.append(uuid.decode('utf-8'))
                 else:
-                    log.error("Policy Interceptor: Rejecting improperly defined message with unexpected uuid variable type [%s]." % str(msg))
+                    log.error("Policy Interceptor: Rejecting improperly defined message with unexpected uuid variable type [%s].", msg)
                     invocation.drop(note='Error: Uuid variable type not supported!', code=Invocation.CODE_BAD_REQUEST)
                     return
-                log.info('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  Added UUID: %s to return list' % uuid)
+                log.debug('Policy Interceptor: In check_resource_ownership_traverse_gpbs.  Added UUID: %s to return list', uuid)
 
-            log.info('Policy Interceptor: Recursing.')
+            log.debug('Policy Interceptor: Recursing.')
             self.find_uuids_traverse_gpbs(invocation, msg, obj, repo, user_id, resources, uuid_list)
         return uuid_list
                 
@@ -7,6 +7,8 @@
 """
 
 import hashlib
+import os
+import time
 try:
     import json
 except:
@@ -23,6 +25,7 @@ from ion.core.intercept import interceptor
 from ion.core.security import authentication
 from ion.util import procutils as pu
 from ion.util.path import adjust_dir
+from ion.util.cache import LRUDict
 
 
 # Configuration
@@ -31,9 +34,13 @@ msg_sign = CONF.getValue('msg_sign', True)
 #XXX HACKS
 _priv_key_path = adjust_dir(CONF.getValue('priv_key_path'))
 _cert_path = adjust_dir(CONF.getValue('cert_path'))
+# Seconds between checks of the key and certificate files for changes
+_key_check_interval = CONF.getValue('key_check_interval', 5)
 
 
 class DigitalSignatureInterceptor(interceptor.EnvelopeInterceptor):
+    synchronous = True
+
     def before(self, invocation):
         msg = invocation.message
 
@@ -58,6 +65,51 @@ class DigitalSignatureInterceptor(interceptor.EnvelopeInterceptor):
         invocation.message = msg
         return invocation
 
+class KeyFile(object):
+    """
+    A key or certificate file, read and parsed once and again when the file changes.
+    """
+
+    def __init__(self, path, parse, check_interval=None):
+        """
+        @param parse callable which parses the file contents
+        @param check_interval the number of seconds between checks for a changed file
+        """
+        self.path = path
+        self.parse = parse
+        self.check_interval = _key_check_interval if check_interval is None else check_interval
+
+        self.text = None
+        self.value = None
+        # Incremented each time the file is parsed
+        self.version = 0
+
+        self._stat = None
+        self._checked = 0
+
+    def get(self):
+        """
+        @retval the parsed contents of the file
+        """
+        now = time.time()
+        if self.value is None or now - self._checked > self.check_interval:
+            self._checked = now
+
+            st = os.stat(self.path)
+            stat = (st.st_mtime, st.st_size, st.st_ino)
+            if stat != self._stat:
+                f = open(self.path)
+                text = f.read()
+                f.close()
+
+                self.value = self.parse(text)
+                self.text = text
+                self._stat = stat
+                self.version += 1
+
+        return self.value
+
+
 class SystemSecurityPlugin(interceptor.EnvelopeInterceptor):
     """Decorate outgoing messages with security attributes and read
     security attributes of incoming messages.
@@ -80,8 +132,9 @@ class SystemSecurityPlugin(interceptor.EnvelopeInterceptor):
     Need to research more on what other user/security attributes should be
     included in the message headers.
     """
+    synchronous = True
 
-    def __init__(self, name, system_priv_key_path=None, allowed_certs=None):
+    def __init__(self, name, system_priv_key_path=None, allowed_certs=None, verify_cache_size=None):
         if allowed_certs is None: allowed_certs = {}
         
         interceptor.EnvelopeInterceptor.__init__(self, name)
@@ -97,26 +150,36 @@ class SystemSecurityPlugin(interceptor.EnvelopeInterceptor):
         self.allowed_certs = allowed_certs
         self.auth = authentication.Authentication()
 
-    def _read_key(self, path):
-        f = open(path)
-        key = f.read()
-        f.close()
-        return key
+        # The parsed private key and certificate public keys
+        self._priv_key_file = KeyFile(self._priv_key_path, self.auth.load_private_key)
+        self._cert_files = {}
+
+        # Signatures verified before, for messages delivered again with the same content and signature
+        if verify_cache_size is None:
+            verify_cache_size = CONF.getValue('verify_cache_size', 0)
+        self._verified = LRUDict(verify_cache_size) if verify_cache_size else None
+
+    def _cert_file(self, id):
+        cert_file = self._cert_files.get(id)
+        if cert_file is None:
+            path = self.allowed_certs[id] #XXX Need an error condition for a
+                                          #bad id
+            cert_file = self._cert_files[id] = KeyFile(path, self.auth.load_certificate_key)
+        return cert_file
 
     def certs(self, id):
         """
         Get cert path by given id.
-        Read cert file and return cert.
+        Return the cert, read from the file when it has changed.
         """
-        path = self.allowed_certs[id] #XXX Need an error condition for a
-                                      #bad id
-        cert = self._read_key(path)
-        return cert
+        cert_file = self._cert_file(id)
+        cert_file.get()
+        return cert_file.text
 
     @property
     def priv_key(self):
-        key = self._read_key(self._priv_key_path)
-        return key
+        self._priv_key_file.get()
+        return self._priv_key_file.text
 
     def after(self, invocation):
         """
@@ -126,15 +189,14 @@ class SystemSecurityPlugin(interceptor.EnvelopeInterceptor):
         """
         content = invocation.message['content'] #Hope this is a string!
         try:
-            hash = hashlib.sha1(content).hexdigest()
+            digest = hashlib.sha1(content).digest()
         except TypeError:
             # Not sure what to do, being hashable is not really a policy,
             # so dropping might not be appropriate. Need to raise some kind
             # of error.
             invocation.error(note='Error taking hash of content!')
             return invocation
-        priv_key = self.priv_key
-        signature = self.auth.sign_message(hash, priv_key)
+        signature = self.auth.sign_digest(digest, self._priv_key_file.get())
         invocation.message['signer'] = 'ooi-ion' #XXX What should this header be?
         invocation.message['signature'] = signature
         # Do we call invocation.proceed ???
@@ -149,11 +211,24 @@ class SystemSecurityPlugin(interceptor.EnvelopeInterceptor):
         #hack check of message spec!
         if message.has_key('signature') and message.has_key('signer'):
             content = invocation.message['content'] #this better be there
-            hash = hashlib.sha1(content).hexdigest()
+            digest = hashlib.sha1(content).digest()
             signature = invocation.message['signature']
             signer = invocation.message['signer']
-            cert = self.certs(signer)
-            verifiedQ = self.auth.verify_message(hash, cert, signature)
+            cert_file = self._cert_file(signer)
+            cert_key = cert_file.get()
+
+            verified_key = None
+            if self._verified is not None:
+                verified_key = (signer, cert_file.version, digest, signature)
+                verifiedQ = verified_key in self._verified
+            else:
+                verifiedQ = False
+
+            if not verifiedQ:
+                verifiedQ = self.auth.verify_digest(digest, cert_key, signature)
+                if verifiedQ and verified_key is not None:
+                    self._verified[verified_key] = True
+
             if verifiedQ:
                 # Do we call invocation.proceed ???
                 return invocation
@@ -5,7 +5,7 @@
 @author Michael Meisinger
 @brief test interceptor system
 """
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
@@ -17,6 +17,7 @@ from ion.core.intercept.interceptor import Interceptor, EnvelopeInterceptor
 from ion.core.intercept.interceptor import PassThroughInterceptor, DropInterceptor
 from ion.core.intercept.interceptor import Invocation
 from ion.core.intercept.interceptor_system import InterceptorSystem
+from ion.core.intercept.signature import SystemSecurityPlugin, KeyFile
 from ion.test.iontest import IonTestCase
 from ion.util.config import Config
 
@@ -105,6 +106,61 @@ class InterceptorTest(IonTestCase):
         self.assertEqual(ti1.numafter, 1)
         self.assertEqual(ti2.numafter, 1)
 
+    @defer.inlineCallbacks
+    def test_intercept_sync_async(self):
+        is_config1 = {
+            'interceptors':{
+                'pass':{
+                    'classname':'ion.core.intercept.interceptor.PassThroughInterceptor'
+                },
+                'test1':{
+                    'classname':'ion.core.intercept.test.test_interceptor.TestInterceptor',
+                },
+                'async1':{
+                    'classname':'ion.core.intercept.test.test_interceptor.AsyncTestInterceptor',
+                },
+                'test3':{
+                    'classname':'ion.core.intercept.test.test_interceptor.TestInterceptor',
+                },
+            },
+            'stack':[
+                {'name':'test1', 'interceptor':'test1' },
+                {'name':'pass1', 'interceptor':'pass' },
+                {'name':'async1', 'interceptor':'async1' },
+                {'name':'test3', 'interceptor':'test3' },
+            ]
+        }
+
+        intercept_sys = InterceptorSystem()
+        yield intercept_sys.initialize(is_config1)
+        yield intercept_sys.activate()
+        intercept_sys.timing = True
+        ti1 = intercept_sys.interceptors['test1']
+        ta = intercept_sys.interceptors['async1']
+        ti3 = intercept_sys.interceptors['test3']
+
+        # The steps after the asynchronous interceptor run once it finishes
+        d = intercept_sys.process(Invocation(path=Invocation.PATH_OUT, message="123"))
+        self.assertEqual(ti1.numafter, 1)
+        self.assertEqual(ta.numafter, 1)
+        self.assertEqual(ti3.numafter, 0)
+        inv = yield d
+        self.assertEqual(inv.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(inv.path, Invocation.PATH_OUT)
+        self.assertEqual(ti3.numafter, 1)
+
+        inv = yield intercept_sys.process(Invocation(path=Invocation.PATH_IN, message="123"))
+        self.assertEqual(ti1.numbefore, 1)
+        self.assertEqual(ta.numbefore, 1)
+        self.assertEqual(ti3.numbefore, 1)
+
+        timings = intercept_sys.timings(reset=True)
+        self.assertEqual(len(timings), 8)
+        for key in ((Invocation.PATH_OUT, 'async1'), (Invocation.PATH_IN, 'test1')):
+            self.assertEqual(timings[key]['count'], 1)
+            self.assertEqual(sum(timings[key]['buckets'].values()), 1)
+        self.assertEqual(intercept_sys.timings(), {})
+
     @defer.inlineCallbacks
     def test_intercept_drop(self):
         is_config1 = {
@@ -240,6 +296,22 @@ class TestInterceptor(EnvelopeInterceptor):
         return invocation
 
 
+class AsyncTestInterceptor(TestInterceptor):
+    """
+    Interceptor to test messages, finishing each step later.
+    """
+    def before(self, invocation):
+        return self._later(TestInterceptor.before(self, invocation))
+
+    def after(self, invocation):
+        return self._later(TestInterceptor.after(self, invocation))
+
+    def _later(self, invocation):
+        d = defer.Deferred()
+        reactor.callLater(0, d.callback, invocation)
+        return d
+
+
 class TestSignature(IonTestCase):
 
     @defer.inlineCallbacks
@@ -319,9 +391,47 @@ class TestSignature(IonTestCase):
         self.failUnlessEqual(inv_incoming_b.status, 
                 Invocation.STATUS_DROP)
 
-
-
-
-
-
-
+    @defer.inlineCallbacks
+    def test_verify_cache(self):
+        plugin = SystemSecurityPlugin('signature', verify_cache_size=10)
+
+        verified = []
+        verify_digest = plugin.auth.verify_digest
+        def count_verify(*args):
+            verified.append(args)
+            return verify_digest(*args)
+        plugin.auth.verify_digest = count_verify
+
+        inv = yield plugin.process(Invocation(path=Invocation.PATH_OUT, message={'content':'foo'}))
+        message = inv.message
+
+        # The same content and signature delivered again is verified once
+        for x in range(3):
+            inv = Invocation(path=Invocation.PATH_IN, message=message.copy())
+            inv = yield plugin.process(inv)
+            self.failUnlessEqual(inv.status, Invocation.STATUS_PROCESS)
+        self.failUnlessEqual(len(verified), 1)
+
+        message['content'] = 'bar'
+        inv = yield plugin.process(Invocation(path=Invocation.PATH_IN, message=message))
+        self.failUnlessEqual(inv.status, Invocation.STATUS_DROP)
+
+    def test_key_file_reload(self):
+        path = self.mktemp()
+        f = open(path, 'w')
+        f.write('key one')
+        f.close()
+
+        key_file = KeyFile(path, str.upper, check_interval=0)
+        self.failUnlessEqual(key_file.get(), 'KEY ONE')
+        self.failUnlessEqual(key_file.version, 1)
+
+        # Not parsed again while unchanged
+        self.failUnlessEqual(key_file.get(), 'KEY ONE')
+        self.failUnlessEqual(key_file.version, 1)
+
+        f = open(path, 'w')
+        f.write('key number two')
+        f.close()
+        self.failUnlessEqual(key_file.get(), 'KEY NUMBER TWO')
+        self.failUnlessEqual(key_file.version, 2)
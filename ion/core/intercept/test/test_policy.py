@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/intercept/test/test_policy.py
+@brief test the ownership decisions of the policy interceptor
+"""
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+from ion.core.intercept import policy
+from ion.core.intercept.policy import PolicyInterceptor, PolicyHeaderInterceptor, OwnershipCache, PolicyTable, ROLE_BITS
+from ion.core.intercept.interceptor import Invocation
+
+
+class PolicyTableTest(unittest.TestCase):
+
+    def setUp(self):
+        policy_dictionary = policy.construct_policy_lists([
+            ('AUTHENTICATED', 'hello.authenticated_op', '*'),
+            ('ADMIN', 'hello.admin_op', '*'),
+            ('OWNER', 'hello.owner_op', {9:'resource_id'}),
+            ])
+        user_role_dict = {'ADMIN':[{'subject':'/CN=admin', 'ooi_id':'admin_id'}],
+                          'DATA_PROVIDER':[{'subject':'/CN=admin', 'ooi_id':'admin_id'},
+                                           {'subject':'/CN=provider', 'ooi_id':None}]}
+        self.table = PolicyTable(policy_dictionary, user_role_dict)
+
+    def test_decisions(self):
+        table = self.table
+
+        roles_mask, owner_allowed, resources, roles = table.decisions[('hello', 'authenticated_op')]
+        self.assertEqual(roles_mask, ROLE_BITS['AUTHENTICATED'] | ROLE_BITS['ADMIN'])
+        self.assertEqual(owner_allowed, False)
+
+        roles_mask, owner_allowed, resources, roles = table.decisions[('hello', 'owner_op')]
+        self.assertEqual(roles_mask, ROLE_BITS['ADMIN'])
+        self.assertEqual(owner_allowed, True)
+        self.assertEqual(resources, {9:'resource_id'})
+
+        self.assertEqual(table.decisions.get(('hello', 'other_op')), None)
+
+    def test_user_masks(self):
+        table = self.table
+
+        self.assertEqual(table.user_mask('ANONYMOUS'), ROLE_BITS['ANONYMOUS'])
+        self.assertEqual(table.user_mask('user_id'), ROLE_BITS['ANONYMOUS'] | ROLE_BITS['AUTHENTICATED'])
+        self.assertTrue(table.user_mask('admin_id') & ROLE_BITS['ADMIN'])
+        self.assertTrue(table.user_mask('admin_id') & ROLE_BITS['DATA_PROVIDER'])
+
+        admin_mask, owner_allowed, resources, roles = table.decisions[('hello', 'admin_op')]
+        self.assertTrue(table.user_mask('admin_id') & admin_mask)
+        self.assertFalse(table.user_mask('user_id') & admin_mask)
+
+    def test_map_user_compiles(self):
+        table = policy.policy_table
+        subject = policy.user_role_dict['ADMIN'][0]['subject']
+        ooi_id = policy.user_role_dict['ADMIN'][0]['ooi_id']
+        try:
+            policy.map_ooi_id_to_subject_admin_role(subject, 'mapped_admin_id')
+            self.assertNotIdentical(policy.policy_table, table)
+            self.assertTrue(policy.user_has_admin_role('mapped_admin_id'))
+
+            # A reload keeps the mapping
+            policy.reload_policy()
+            self.assertTrue(policy.user_has_admin_role('mapped_admin_id'))
+        finally:
+            policy.map_ooi_id_to_subject_admin_role(subject, ooi_id)
+
+
+class FakeMessage(object):
+
+    def __init__(self, headers):
+        self.message_headers = headers
+
+
+class PolicyHeaderTest(unittest.TestCase):
+
+    def setUp(self):
+        policy_dictionary = policy.construct_policy_lists([
+            ('ADMIN', 'hello.admin_op', '*'),
+            ('OWNER', 'hello.owner_op', {9:'resource_id'}),
+            ])
+        self.patch(policy, 'policy_table', PolicyTable(policy_dictionary, {}))
+
+        self.phi = PolicyHeaderInterceptor('policy_header')
+        self.pi = PolicyInterceptor('policy')
+
+        # The ownership check of the content
+        self.owner_checks = []
+        def authorize_owner(msg, invocation, *owner_check):
+            self.owner_checks.append(owner_check)
+            return defer.succeed(invocation)
+        self.pi._authorize_owner = authorize_owner
+
+    def _invocation(self, op):
+        headers = {'performative':'request', 'user-id':'user_id', 'expiry':'0', 'receiver':'sys.hello', 'op':op}
+        # The content is not decoded yet
+        return Invocation(message=FakeMessage(headers), content=None)
+
+    def test_rejected_on_headers(self):
+        invocation = self.phi.before(self._invocation('admin_op'))
+        self.assertEqual(invocation.status, Invocation.STATUS_DROP)
+        self.assertEqual(invocation.code, Invocation.CODE_UNAUTHORIZED)
+
+    @defer.inlineCallbacks
+    def test_allowed_on_headers(self):
+        invocation = self.phi.before(self._invocation('other_op'))
+        self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+
+        invocation = yield self.pi.before(invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(self.owner_checks, [])
+
+    @defer.inlineCallbacks
+    def test_owner_check_after_codec(self):
+        invocation = self.phi.before(self._invocation('owner_op'))
+        self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(self.owner_checks, [])
+
+        invocation.content = {}
+        invocation = yield self.pi.before(invocation)
+        self.assertEqual(self.owner_checks, [('user_id', 0, 'hello', 'owner_op', {9:'resource_id'})])
+
+
+class OwnershipCacheTest(unittest.TestCase):
+
+    def test_get_put_invalidate(self):
+        cache = OwnershipCache(60, 100)
+
+        self.assertEqual(cache.get('user', 'res1'), None)
+
+        cache.put('user', 'res1', True)
+        cache.put('other', 'res1', False)
+        self.assertEqual(cache.get('user', 'res1'), True)
+        self.assertEqual(cache.get('other', 'res1'), False)
+
+        cache.invalidate('res1')
+        self.assertEqual(cache.get('user', 'res1'), None)
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['invalidations'], 1)
+
+    def test_expiry(self):
+        cache = OwnershipCache(-1, 100)
+        cache.put('user', 'res1', True)
+        self.assertEqual(cache.get('user', 'res1'), None)
+
+
+class CheckOwnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pi = PolicyInterceptor('policy')
+        self.pi.ownership_cache = OwnershipCache(60, 100)
+
+        # Answer the association service requests here - the set of resources owned by the user
+        self.owned = set()
+        self.requests = []
+        def associations_exist(user_id, uuid_list, process):
+            self.requests.append(list(uuid_list))
+            return defer.succeed([uuid in self.owned for uuid in uuid_list])
+        self.pi._associations_exist = associations_exist
+
+        # Already subscribed
+        def subscribe(process):
+            return defer.succeed(None)
+        self.pi.ownership_cache.subscribe = subscribe
+
+    @defer.inlineCallbacks
+    def test_batched_and_cached(self):
+        self.owned.update(['res1', 'res2'])
+
+        invocation = Invocation()
+        yield self.pi.check_owner('user', ['res1', 'res2', 'res1'], invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(self.requests, [['res1', 'res2']])
+
+        # Only the new resource is asked for
+        invocation = Invocation()
+        yield self.pi.check_owner('user', ['res1', 'res3'], invocation)
+        self.assertNotEqual(invocation.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(self.requests[1:], [['res3']])
+
+        # A cached refusal does not ask again
+        invocation = Invocation()
+        yield self.pi.check_owner('user', ['res3'], invocation)
+        self.assertNotEqual(invocation.status, Invocation.STATUS_PROCESS)
+        self.assertEqual(len(self.requests), 2)
+
+        # Until ownership of the resource changes
+        self.owned.add('res3')
+        self.pi.ownership_cache.invalidate('res3')
+        invocation = Invocation()
+        yield self.pi.check_owner('user', ['res3'], invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_PROCESS)
+
+        self.assertEqual(self.pi.ownership_cache.stats()['decisions'], 4)
+
+    @defer.inlineCallbacks
+    def test_short_reply_fails_closed(self):
+        self.owned.update(['res1', 'res2'])
+        def associations_exist(user_id, uuid_list, process):
+            return defer.succeed([True])
+        self.pi._associations_exist = associations_exist
+
+        invocation = Invocation()
+        yield self.pi.check_owner('user', ['res1', 'res2'], invocation)
+        self.assertEqual(invocation.status, Invocation.STATUS_DROP)
+        self.assertEqual(self.pi.ownership_cache.get('user', 'res1'), None)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/messaging/envelope.py
+@brief Binary envelope wire format of ION messages: the ION headers travel as
+AMQP application headers and the body carries only the message content. A
+packed GPB structure is sent as its raw bytes, so the headers can be read
+without decoding the body.
+
+The AMQP 0-8 field table holds strings and unsigned 32 bit integers only.
+Header values of any other type are packed together into one string header.
+"""
+
+import msgpack
+
+# Application header marking a message in the binary envelope, with the version of the format
+ENVELOPE_HEADER = 'ion-envelope'
+ENVELOPE_VERSION = 'binary-1'
+
+# Application header with the packed headers which are not strings or integers
+PACKED_HEADERS = 'ion-packed-headers'
+
+_MAX_TABLE_INT = 2**32 - 1
+
+
+def pack_headers(msg):
+    """
+    @brief Splits an ION message into its application headers and content
+    @param msg dict with the ION headers and the 'content'
+    @retval tuple of the application headers dict and the content
+    """
+    table = {ENVELOPE_HEADER:ENVELOPE_VERSION}
+    packed = {}
+    for key, value in msg.iteritems():
+        if key == 'content':
+            continue
+        value_type = type(value)
+        if value_type is str or (value_type in (int, long) and 0 <= value <= _MAX_TABLE_INT):
+            table[key] = value
+        else:
+            packed[key] = value
+
+    if packed:
+        table[PACKED_HEADERS] = msgpack.packb(packed)
+
+    return table, msg.get('content')
+
+
+def unpack_headers(table):
+    """
+    @brief Reads the ION headers from the application headers of a message
+    @param table the application headers of the AMQP message
+    @retval dict of the ION headers, None if the message is not in the binary envelope
+    """
+    if not table or table.get(ENVELOPE_HEADER) != ENVELOPE_VERSION:
+        return None
+
+    headers = dict(table)
+    del headers[ENVELOPE_HEADER]
+
+    packed = headers.pop(PACKED_HEADERS, None)
+    if packed is not None:
+        headers.update(msgpack.unpackb(packed))
+
+    return headers
@@ -21,6 +21,8 @@ class IONMessageInterceptor(EnvelopeInterceptor):
     """
     Interceptor that assembles the headers in the ION message format.
     """
+    synchronous = True
+
     def before(self, invocation):
         return invocation
 
@@ -15,6 +15,7 @@ from txamqp.client import Closed
 from txamqp.content import Content
 
 from ion.core.messaging import amqp
+from ion.core.messaging import envelope
 from ion.core.messaging import serialization
 from ion.core.exception import FatalError
 from ion.core.cc.store import Store
@@ -203,7 +204,7 @@ class ProcessExchangeSpace(ExchangeSpace):
         pub_config = {'routing_key' : str(to_name)}
         pub_config.update(publisher_config)
         publisher = yield Publisher.name(self, pub_config)
-        yield publisher.send(message_data)
+        yield publisher.send(message_data, **kwargs)
         publisher.close()
 
 
@@ -300,11 +301,29 @@ class Message(object):
                           ):
             setattr(self, attr_name.replace(' ', '_'),
                             amqp_message.content.properties.get(attr_name, None))
+        # ION headers of a message in the binary envelope, None for the dict format
+        self._envelope_headers = envelope.unpack_headers(self.headers)
+
     def decode(self):
         """Deserialize the message body, returning the original
-        python structure sent by the publisher."""
-        return serialization.decode(self.body, self.content_type,
-                                    self.content_encoding)
+        python structure sent by the publisher. A message in the binary
+        envelope is returned as the dict of its headers and content."""
+        content = serialization.decode(self.body, self.content_type,
+                                       self.content_encoding)
+        if self._envelope_headers is None:
+            return content
+        data = dict(self._envelope_headers)
+        data['content'] = content
+        return data
+
+    @property
+    def message_headers(self):
+        """The ION headers of the message. Read from the application
+        headers without decoding the body for a message in the binary
+        envelope, otherwise the decoded message."""
+        if self._envelope_headers is None:
+            return self.payload
+        return self._envelope_headers
 
     @property
     def payload(self):
@@ -392,6 +411,7 @@ class Consumer(object):
                              auto_delete=True,
                              no_ack=True,
                              binding_key=None,
+                             prefetch_count=1,
                              **kwargs): # **kwargs is a sloppy hack
         self.channel = chan
         self.queue = queue
@@ -402,6 +422,8 @@ class Consumer(object):
         self.exclusive = exclusive
         self.auto_delete = auto_delete
         self.no_ack = no_ack
+        # Number of unacknowledged messages the broker delivers to this consumer
+        self.prefetch_count = prefetch_count
         self.consumer_tag = uuid.uuid4().hex
         self.callback = None
         self._closed = False # Assuming we were given an open channel
@@ -457,7 +479,7 @@ class Consumer(object):
                                         routing_key=routing_key,
                                         arguments=arguments)
 
-        yield self.channel.basic_qos(prefetch_size=0, prefetch_count=1,
+        yield self.channel.basic_qos(prefetch_size=0, prefetch_count=self.prefetch_count,
                                                         global_=False)
 
         defer.returnValue(self)
@@ -575,7 +597,7 @@ class Publisher(object):
 
     def create_message(self, message_data, delivery_mode=None, priority=None,
                        content_type=None, content_encoding=None,
-                       serializer=None, reply_to=None):
+                       serializer=None, reply_to=None, headers=None):
         """With any data, serialize it and encapsulate it in a AMQP
         message with the proper headers set."""
 
@@ -603,6 +625,7 @@ class Publisher(object):
                                             priority=priority,
                                             content_type=content_type,
                                             content_encoding=content_encoding,
+                                            headers=headers,
                                             reply_to=reply_to)
 
     def prepare_message(self, message_data, delivery_mode, priority=None,
@@ -613,14 +636,13 @@ class Publisher(object):
         """Encapsulate data into a AMQP message.
         This method should be reconciled with interceptor functionality and
         the ion message format.
+        @param headers the AMQP application headers, a field table of string
+            and integer values. The property is left out when empty.
         """
-        if headers is None:
-            headers = {}
-
         properties = {
                   'content type':content_type,
                   'content encoding':content_encoding,
-                  'application headers':headers,
+                  'headers':headers or None,
                   'delivery mode':delivery_mode,
                   'priority':priority,
                   'correlation id':correlation_id,
@@ -663,7 +685,8 @@ class Publisher(object):
                                       content_type=content_type,
                                       content_encoding=content_encoding,
                                       serializer=serializer,
-                                      reply_to=reply_to)
+                                      reply_to=reply_to,
+                                      headers=headers)
         return self.channel.basic_publish(content=message,
                                         exchange=self.exchange,
                                         routing_key=routing_key,
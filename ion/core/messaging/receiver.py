@@ -8,6 +8,7 @@
 
 import os
 import types
+from collections import deque
 
 from zope.interface import implements, Interface
 from twisted.internet import defer, threads, reactor
@@ -18,6 +19,7 @@ log = ion.util.ionlog.getLogger(__name__)
 from ion.core import ioninit
 from ion.core.id import Id
 from ion.core.intercept.interceptor import Invocation
+from ion.core.messaging import envelope
 from ion.core.messaging import messaging
 from ion.util.state_object import BasicLifecycleObject
 import ion.util.procutils as pu
@@ -28,6 +30,22 @@ from ion.core.exception import IonError
 # Static entry point for "thread local" context storage during request
 # processing, eg. to retaining user-id from request message
 from ion.core.ioninit import request
+from ion.util.context import RequestContext
+
+CONF = ioninit.config(__name__)
+
+# The request context of each conversation started by a request sent from this container. Replies are received in
+# the context of the request which is waiting for them. This is the only reference to the context while the request
+# waits, so entries are removed explicitly: on the RPC reply, or by forget_conversation_context.
+_conversation_contexts = {}
+
+
+def forget_conversation_context(convid):
+    """
+    Stop receiving messages of a conversation in the context of the request which started it, e.g. after an RPC
+    timed out.
+    """
+    _conversation_contexts.pop(convid, None)
 
 
 class ReceiverError(IonError):
@@ -63,7 +81,7 @@ class Receiver(BasicLifecycleObject):
     rec_messages = {}
     rec_shutoff = False
 
-    def __init__(self, name, scope='global', label=None, xspace=None, process=None, group=None, handler=None, error_handler=None, raw=False, consumer_config=None, publisher_config=None):
+    def __init__(self, name, scope='global', label=None, xspace=None, process=None, group=None, handler=None, error_handler=None, raw=False, consumer_config=None, publisher_config=None, prefetch_count=None, max_concurrent_handlers=None):
         """
         @param label descriptive label for the receiver
         @param name the actual exchange name. Used for routing
@@ -76,6 +94,10 @@ class Receiver(BasicLifecycleObject):
         @param consumer_config  Additional Consumer configuration params. Used by _init_receiver, these params take precedence over any
                                 other config.
         @param publisher_config Additional Publisher configuration params, used by send()
+        @param prefetch_count the number of unacknowledged messages the broker delivers to the consumer. None for the
+                                configured default
+        @param max_concurrent_handlers the number of messages handled at once, further messages wait in the receiver.
+                                0 for no limit, None for the configured default
         """
         BasicLifecycleObject.__init__(self)
 
@@ -87,9 +109,25 @@ class Receiver(BasicLifecycleObject):
         self.process = process
         self.group = group
         self.raw = raw
-        self.consumer_config  = consumer_config if consumer_config is not None else {}
+        self.consumer_config  = dict(consumer_config) if consumer_config is not None else {}
         self.publisher_config = publisher_config if publisher_config is not None else {}
 
+        if prefetch_count is None:
+            prefetch_count = CONF.getValue('prefetch_count', 1)
+        self.consumer_config.setdefault('prefetch_count', prefetch_count)
+
+        if max_concurrent_handlers is None:
+            max_concurrent_handlers = CONF.getValue('max_concurrent_handlers', 0)
+        self.max_concurrent_handlers = max_concurrent_handlers
+
+        # Send the ION headers as AMQP application headers and only the content in the body
+        self.binary_envelope = CONF.getValue('binary_envelope', False)
+
+        # Messages received while max_concurrent_handlers are running, with the Deferred of each
+        self.pending_messages = deque()
+        self.handling = 0
+        self.max_pending = 0
+
         self.handlers = []
         self.error_handlers = []
         self.consumer = None
@@ -130,7 +168,7 @@ class Receiver(BasicLifecycleObject):
             raise RuntimeError("Messaging name undefined: "+self.xname)
 
         yield self._init_receiver(name_config)
-        log.debug("Receiver %s initialized (queue attached) cfg=%s" % (self.xname,name_config))
+        log.debug("Receiver %s initialized (queue attached) cfg=%s", self.xname,name_config)
 
     @defer.inlineCallbacks
     def _init_receiver(self, receiver_config, store_config=False):
@@ -154,7 +192,7 @@ class Receiver(BasicLifecycleObject):
         """
         #self.consumer.register_callback(self.receive)
         yield self.consumer.consume(self.receive)
-        log.debug("Receiver %s activated (consumer enabled)" % self.xname)
+        log.debug("Receiver %s activated (consumer enabled)", self.xname)
 
     #@defer.inlineCallbacks
     def on_deactivate(self, *args, **kwargs):
@@ -175,7 +213,7 @@ class Receiver(BasicLifecycleObject):
 
     def on_error(self, cause= None, *args, **kwargs):
         if cause:
-            log.error("Receiver error: %s" % cause)
+            log.error("Receiver error: %s", cause)
             pass
         else:
             raise RuntimeError("Illegal state change")
@@ -185,7 +223,7 @@ class Receiver(BasicLifecycleObject):
         if term_msg_id in self.processing_messages:
             del self.processing_messages[term_msg_id]
 
-        if len(self.processing_messages) == 0:
+        if len(self.processing_messages) == 0 and len(self.pending_messages) == 0:
             return
 
         return self.completion_deferred
@@ -199,7 +237,16 @@ class Receiver(BasicLifecycleObject):
     def add_error_handler(self, callback):
         self.error_handlers.append(callback)
 
-    @defer.inlineCallbacks
+    def stats(self):
+        """
+        @retval a dict with the number of messages in handling and waiting in the receiver
+        """
+        return {'handling':self.handling,
+                'pending':len(self.pending_messages),
+                'max_pending':self.max_pending,
+                'max_concurrent_handlers':self.max_concurrent_handlers,
+                'prefetch_count':self.consumer_config.get('prefetch_count')}
+
     def receive(self, msg):
         """
         @brief entry point for received messages; callback from Carrot. All
@@ -207,12 +254,50 @@ class Receiver(BasicLifecycleObject):
         @note is called from carrot as normal method; no return expected
         @param msg instance of carrot.backends.txamqp.Message
         """
+        if self.max_concurrent_handlers and self.handling >= self.max_concurrent_handlers:
+            d = defer.Deferred()
+            self.pending_messages.append((msg, d))
+            self.max_pending = max(self.max_pending, len(self.pending_messages))
+            log.debug('Receiver %s queued message, %d pending', self.xname, len(self.pending_messages))
+            return d
+
+        self.handling += 1
+        d = self._start_receive(msg)
+        d.addBoth(self._receive_done)
+        return d
+
+    def _receive_done(self, result):
+        self.handling -= 1
+
+        if self.pending_messages and (not self.max_concurrent_handlers or self.handling < self.max_concurrent_handlers):
+            msg, d = self.pending_messages.popleft()
+            self.receive(msg).chainDeferred(d)
+
+        return result
+
+    def _start_receive(self, msg):
+        if CONF.getValue('receive_in_thread', False):
+            # Wrapping the handler in a thread to allow thread-local context during message processing.
+            def do_receive_and_wait():
+                threads.blockingCallFromThread(reactor, self._do_receive, msg)
+
+            return threads.deferToThread(do_receive_and_wait)
+
+        # Process the message in the reactor thread in a request context of its own
+        headers = msg.message_headers
+        context = None
+        if isinstance(headers, dict) and headers.get('performative', None) != 'request':
+            convid = headers.get('conv-id', None)
+            if headers.get('protocol', None) == 'rpc':
+                # The one reply of the RPC
+                context = _conversation_contexts.pop(convid, None)
+            else:
+                context = _conversation_contexts.get(convid)
 
-        # Wrapping the handler in a thread to allow thread-local context during message processing.
-        def do_receive_and_wait():
-            threads.blockingCallFromThread(reactor, self._do_receive, msg)
+        if context is None:
+            context = RequestContext()
 
-        yield threads.deferToThread(do_receive_and_wait)
+        return request.run_in_context(context, self._do_receive, msg)
 
     @defer.inlineCallbacks
     def _do_receive(self, msg):
@@ -222,12 +307,14 @@ class Receiver(BasicLifecycleObject):
         @note is called from carrot as normal method; no return expected
         @param msg instance of carrot.backends.txamqp.Message
         """
-        log.info('Start Receiver.Receive on proc: %s' % str(self.process))
+        log.info('Start Receiver.Receive on proc: %s', self.process)
 
+        # The ION headers, read without decoding the body of a message in the binary envelope
+        headers = msg.message_headers
 
         if self.rec_shutoff:
             log.warn("MESSAGE RECEIVED AFTER SHUTOFF - DROPPED")
-            log.warn("Dropped message: "+str(msg.payload))
+            log.warn("Dropped message: %s", headers)
             # @todo ACK for now. Should be requeue.
             yield msg.ack()
             return
@@ -252,7 +339,7 @@ class Receiver(BasicLifecycleObject):
 
             # Interceptor failed message.  Call error handler(s)
             if inv1.status != Invocation.STATUS_PROCESS:
-                log.info("Message error! to=%s op=%s" % (data.get('receiver',None), data.get('op',None)))
+                log.info("Message error! to=%s op=%s", headers.get('receiver',None), headers.get('op',None))
                 try:
                     for error_handler in self.error_handlers:
                         yield defer.maybeDeferred(error_handler, data, msg, inv1.code)
@@ -262,10 +349,10 @@ class Receiver(BasicLifecycleObject):
 
 
                 # Extract message headers
-                convid = data.get('conv-id', None)
-                protocol = data.get('protocol', None)
-                performative = data.get('performative', None)
-                op = data.get('op', None)
+                convid = headers.get('conv-id', None)
+                protocol = headers.get('protocol', None)
+                performative = headers.get('performative', None)
+                op = headers.get('op', None)
 
                 if hasattr(self.process, 'workbench'):
                     workbench = self.process.workbench
@@ -282,24 +369,24 @@ class Receiver(BasicLifecycleObject):
 
 
                 log.debug( 'BEFORE YIELD to Message Handler')
-                log.debug('OP "%s"' % op)
-                log.debug('CONVID "%s"' %  convid)
-                log.debug('PERFORMATIVE "%s"' % performative)
-                log.debug('PROTOCOL "%s"' % protocol)
-                log.debug('Current Context "%s"' % str(current_context))
+                log.debug('OP "%s"', op)
+                log.debug('CONVID "%s"', convid)
+                log.debug('PERFORMATIVE "%s"', performative)
+                log.debug('PROTOCOL "%s"', protocol)
+                log.debug('Current Context "%s"', current_context)
 
                 #log.debug("WORKBENCH STATE before incoming message is added:\n%s" % str(workbench))
 
                 if protocol != 'rpc':
                     # if it is not an rpc conversation - set the context
 
-                    log.info('Setting NON RPC request workbench_context: %s, in Proc: %s ' % (convid, self.process))
+                    log.info('Setting NON RPC request workbench_context: %s, in Proc: %s ', convid, self.process)
                     current_context.append( convid)
                     request.workbench_context = current_context
 
                 elif performative == 'request':
                     # if it is an rpc request - set the context
-                    log.info('Setting RPC request workbench_context: %s, in Proc: %s ' % (convid, self.process))
+                    log.info('Setting RPC request workbench_context: %s, in Proc: %s ', convid, self.process)
 
                     current_context.append( convid)
                     request.workbench_context = current_context
@@ -308,7 +395,7 @@ class Receiver(BasicLifecycleObject):
 
 
                 # If this is a GPB message add it to the process workbench
-                encoding = data.get('encoding', None)
+                encoding = headers.get('encoding', None)
                 if encoding == ION_R1_GPB:
 
                     if workbench is None:
@@ -318,7 +405,7 @@ class Receiver(BasicLifecycleObject):
                     content = data.get('content')
                     workbench.put_repository(content.Repository)
 
-                    log.debug("WORKBENCH STATE after incoming message is added:\n%s" % str(workbench))
+                    log.debug("WORKBENCH STATE after incoming message is added:\n%s", workbench)
 
 
                 # Make the calls into the application code (e.g. process receive)
@@ -333,7 +420,7 @@ class Receiver(BasicLifecycleObject):
                     del self.rec_messages[id(msg)]
                     if id(org_msg) in self.processing_messages:
                         del self.processing_messages[id(org_msg)]
-                    if self.completion_deferred and len(self.processing_messages) == 0:
+                    if self.completion_deferred and len(self.processing_messages) == 0 and len(self.pending_messages) == 0:
                         self.completion_deferred.callback(None)
                         self.completion_deferred = None
 
@@ -342,20 +429,20 @@ class Receiver(BasicLifecycleObject):
                     if protocol != 'rpc':
                         # if it is not an rpc conversation - set the context
                         workbench_context = current_context.pop()
-                        log.info('Popping Non RPC request workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
+                        log.info('Popping Non RPC request workbench_context: %s, in Proc: %s ', workbench_context, self.process)
 
                     elif performative == 'request':
                         # if it is an rpc request - set the context
 
                         workbench_context = current_context.pop()
-                        log.info('Popping RPC request workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
+                        log.info('Popping RPC request workbench_context: %s, in Proc: %s ', workbench_context, self.process)
 
                         # if it is an RPC result message - do not set the context!
 
                     else:
                         # @TODO - SHOULD THIS BE HERE?
                         workbench_context = pu.get_last_or_default(current_context, 'No Context Set!')
-                        log.info('Using last workbench_context: %s, in Proc: %s ' % (workbench_context, self.process))
+                        log.info('Using last workbench_context: %s, in Proc: %s ', workbench_context, self.process)
                         #print 'CONVID:', convid
                         #print 'CONTEXT:', workbench_context
 
@@ -363,12 +450,12 @@ class Receiver(BasicLifecycleObject):
                     if hasattr(self.process, 'workbench'):
 
                         log.debug('AFTER YIELD to message handler')
-                        log.debug('OP "%s"' % op)
-                        log.debug('CONVID: %s' % convid)
+                        log.debug('OP "%s"', op)
+                        log.debug('CONVID: %s', convid)
                         log.debug('PERFORMATIVE: %s',performative)
-                        log.debug('PROTOCOL "%s"' % protocol)
-                        log.debug('Current CONTXT: %s' % current_context)
-                        log.debug('WORKBENCH CONTXT: %s' % workbench_context)
+                        log.debug('PROTOCOL "%s"', protocol)
+                        log.debug('Current CONTXT: %s', current_context)
+                        log.debug('WORKBENCH CONTXT: %s', workbench_context)
 
 
 
@@ -395,14 +482,14 @@ class Receiver(BasicLifecycleObject):
                                 if count > 0:
 
                                     # Print a warning if someone else is using the persistence tricks...
-                                    log.warn('The "%s" process is holding persistent state in %d repository objects!' % (pname, count))
+                                    log.warn('The "%s" process is holding persistent state in %d repository objects!', pname, count)
 
                             #log.debug("WORKBENCH STATE After Clear:\n%s" % str(self.process.workbench))
 
                         else:
                             log.debug('Workbench context does not match the Convid - Do not clear anything from the workbench!')
 
-        log.info( 'End Receiver.Receive on proc: %s' % str(self.process))
+        log.info('End Receiver.Receive on proc: %s', self.process)
 
     @defer.inlineCallbacks
     def send(self, **kwargs):
@@ -417,6 +504,13 @@ class Receiver(BasicLifecycleObject):
         """
         msg = kwargs
         msg['sender'] = msg.get('sender', self.xname)
+
+        convid = (msg.get('headers', None) or {}).get('conv-id', None)
+        context = request.active_context()
+        if convid and context is not None and msg.get('performative', None) == 'request' and msg.get('conversation', None) is not None:
+            # Receive the replies in the context of this request. A one-off send has no conversation and no replies
+            _conversation_contexts[convid] = context
+
         #log.debug("Send message op="+operation+" to="+str(recv))
         try:
             if not self.raw:
@@ -430,17 +524,21 @@ class Receiver(BasicLifecycleObject):
             # TODO fix this
             # For now, silently dropping message
             if inv1.status == Invocation.STATUS_DROP:
-                log.info("Message dropped! to=%s op=%s" % (msg.get('receiver',None), msg.get('op',None)))
+                log.info("Message dropped! to=%s op=%s", msg.get('receiver',None), msg.get('op',None))
             else:
                 # call flow: Container.send -> ExchangeManager.send -> ProcessExchangeSpace.send
-                yield ioninit.container_instance.send(msg.get('receiver'), msg, publisher_config=self.publisher_config)
+                if self.binary_envelope and not self.raw:
+                    headers, content = envelope.pack_headers(msg)
+                    yield ioninit.container_instance.send(msg.get('receiver'), content, publisher_config=self.publisher_config, headers=headers)
+                else:
+                    yield ioninit.container_instance.send(msg.get('receiver'), msg, publisher_config=self.publisher_config)
         except Exception, ex:
             log.exception("Send error")
         else:
             if inv1.status != Invocation.STATUS_DROP:
-                log.info("===Message SENT! >>>> %s -> %s: %s:%s:%s===" % (msg.get('sender',None),
+                log.info("===Message SENT! >>>> %s -> %s: %s:%s:%s===", msg.get('sender',None),
                                 msg.get('receiver',None), msg.get('protocol',None),
-                                msg.get('performative',None), msg.get('op',None)))
+                                msg.get('performative',None), msg.get('op',None))
                 defer.returnValue(msg)
                 #log.debug("msg"+str(msg))
 
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/messaging/test/test_envelope.py
+@test ion.core.messaging.envelope binary envelope wire format
+"""
+
+from twisted.trial import unittest
+
+from ion.core.messaging import envelope
+from ion.core.messaging.messaging import Message, Publisher
+
+
+class FakeAMQPMessage(object):
+
+    def __init__(self, content, delivery_tag=1):
+        self.content = content
+        self.delivery_tag = delivery_tag
+
+
+class EnvelopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.msg = {'sender':'test.sender',
+                    'receiver':'test.receiver',
+                    'conv-id':'conv#1',
+                    'conv-seq':1,
+                    'performative':'request',
+                    'op':'hello',
+                    'encoding':'ION R1 GPB',
+                    'status':None,
+                    'seq':-1,
+                    'flags':['one', 'two'],
+                    'content':'\x0a\x00\xff packed bytes'}
+
+    def _message(self, headers, content):
+        publisher = Publisher(None)
+        amqp_content = publisher.create_message(content, headers=headers)
+        return Message(None, FakeAMQPMessage(amqp_content))
+
+    def test_pack_unpack_headers(self):
+        table, content = envelope.pack_headers(self.msg)
+        self.assertEqual(content, self.msg['content'])
+        self.assertEqual(table['op'], 'hello')
+        self.assertEqual(table['conv-seq'], 1)
+        self.assertFalse('content' in table)
+
+        # Only strings and unsigned integers fit in an AMQP field table
+        for value in table.values():
+            self.assertTrue(type(value) in (str, int, long) and not value < 0)
+        self.assertFalse('seq' in table)
+        self.assertFalse('status' in table)
+
+        headers = envelope.unpack_headers(table)
+        expected = dict(self.msg)
+        del expected['content']
+        headers['flags'] = list(headers['flags'])
+        self.assertEqual(headers, expected)
+
+        self.assertEqual(envelope.unpack_headers(None), None)
+        self.assertEqual(envelope.unpack_headers({'op':'hello'}), None)
+
+    def test_binary_envelope_message(self):
+        table, content = envelope.pack_headers(self.msg)
+        message = self._message(table, content)
+
+        # The raw content is the body, the headers are read without it
+        self.assertEqual(message.body, self.msg['content'])
+        self.assertEqual(message.message_headers['op'], 'hello')
+        self.assertEqual(message._decoded_cache, None)
+
+        payload = message.payload
+        self.assertEqual(payload['content'], self.msg['content'])
+        self.assertEqual(payload['conv-id'], 'conv#1')
+        self.assertEqual(payload['seq'], -1)
+
+    def test_dict_message(self):
+        message = self._message(None, self.msg)
+
+        self.assertEqual(message.headers, None)
+        self.assertEqual(message.message_headers['op'], 'hello')
+        self.assertEqual(message.payload['content'], self.msg['content'])
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/messaging/test/test_receiver.py
+@test ion.core.messaging.receiver flow control of received messages
+"""
+
+import gc
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+from ion.core import ioninit
+from ion.core.ioninit import request
+from ion.core.messaging import receiver as receiver_module
+from ion.core.messaging.receiver import Receiver
+from ion.util.context import RequestContext
+
+
+class ReceiverFlowControlTest(unittest.TestCase):
+
+    def _receiver(self, max_concurrent_handlers):
+        receiver = Receiver('test_receiver', prefetch_count=5, max_concurrent_handlers=max_concurrent_handlers)
+
+        # Replace the message processing with Deferreds fired by the test
+        self.started = []
+        def start_receive(msg):
+            d = defer.Deferred()
+            self.started.append((msg, d))
+            return d
+        receiver._start_receive = start_receive
+
+        return receiver
+
+    def test_max_concurrent_handlers(self):
+
+        receiver = self._receiver(2)
+        self.assertEqual(receiver.consumer_config['prefetch_count'], 5)
+
+        done = [receiver.receive(msg) for msg in ['m1', 'm2', 'm3', 'm4']]
+
+        self.assertEqual([msg for msg, d in self.started], ['m1', 'm2'])
+        stats = receiver.stats()
+        self.assertEqual(stats['handling'], 2)
+        self.assertEqual(stats['pending'], 2)
+        self.assertEqual(stats['max_pending'], 2)
+
+        # Finishing a message starts the next one in the order received
+        self.started[0][1].callback('r1')
+        self.assertEqual([msg for msg, d in self.started], ['m1', 'm2', 'm3'])
+        self.assertEqual(receiver.stats()['pending'], 1)
+
+        for msg, d in self.started[1:]:
+            d.callback('r' + msg[1])
+        self.started[3][1].callback('r4')
+
+        results = []
+        for d in done:
+            d.addCallback(results.append)
+        self.assertEqual(results, ['r1', 'r2', 'r3', 'r4'])
+
+        stats = receiver.stats()
+        self.assertEqual(stats['handling'], 0)
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['max_pending'], 2)
+
+    def test_no_limit(self):
+
+        receiver = self._receiver(0)
+
+        for msg in ['m1', 'm2', 'm3']:
+            receiver.receive(msg)
+
+        self.assertEqual(len(self.started), 3)
+        self.assertEqual(receiver.stats()['pending'], 0)
+        self.assertEqual(receiver.stats()['handling'], 3)
+
+
+class FakeMessage(object):
+
+    def __init__(self, **headers):
+        self.message_headers = headers
+
+
+class FakeContainer(object):
+    """
+    Passes sent messages through an empty interceptor stack and keeps them.
+    """
+
+    def __init__(self):
+        self.interceptor_system = self
+        self.sent = []
+
+    def process(self, invocation):
+        return defer.succeed(invocation)
+
+    def send(self, name, msg, **kwargs):
+        self.sent.append(msg)
+        return defer.succeed(None)
+
+
+class ReceiverContextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = Receiver('test_receiver')
+        self.contexts = []
+        def do_receive(msg):
+            self.contexts.append(request.active_context())
+            return defer.succeed(None)
+        self.receiver._do_receive = do_receive
+
+    def test_rpc_reply_context(self):
+        context = RequestContext()
+        receiver_module._conversation_contexts['conv#1'] = context
+
+        # The reply is received in the request's context, once
+        self.receiver._start_receive(FakeMessage(performative='inform_result', protocol='rpc', **{'conv-id':'conv#1'}))
+        self.assertIdentical(self.contexts[0], context)
+        self.assertFalse('conv#1' in receiver_module._conversation_contexts)
+
+        self.receiver._start_receive(FakeMessage(performative='inform_result', protocol='rpc', **{'conv-id':'conv#1'}))
+        self.assertNotIdentical(self.contexts[1], context)
+
+    def test_forget_conversation_context(self):
+        context = RequestContext()
+        receiver_module._conversation_contexts['conv#2'] = context
+        receiver_module.forget_conversation_context('conv#2')
+        self.assertFalse('conv#2' in receiver_module._conversation_contexts)
+
+        # A request gets a context of its own
+        self.receiver._start_receive(FakeMessage(performative='request', protocol='rpc', **{'conv-id':'conv#2'}))
+        self.assertNotIdentical(self.contexts[0], context)
+        self.assertNotIdentical(self.contexts[0], None)
+
+    @defer.inlineCallbacks
+    def test_context_held_until_reply(self):
+        container = FakeContainer()
+        self.patch(ioninit, 'container_instance', container)
+
+        @defer.inlineCallbacks
+        def send_request():
+            request.user_id = 'alice'
+            yield self.receiver.send(recipient='other', content='', performative='request', conversation=object(),
+                                     headers={'conv-id':'conv#3'})
+
+        # Nothing outside the receiver holds the context of the request while it waits for the reply
+        yield request.run_in_context(RequestContext(), send_request)
+        self.assertEqual(len(container.sent), 1)
+        gc.collect()
+
+        self.receiver._start_receive(FakeMessage(performative='inform_result', protocol='rpc', **{'conv-id':'conv#3'}))
+        self.assertEqual(self.contexts[0].get('user_id'), 'alice')
+        self.assertFalse('conv#3' in receiver_module._conversation_contexts)
+
+    @defer.inlineCallbacks
+    def test_one_off_send_not_held(self):
+        self.patch(ioninit, 'container_instance', FakeContainer())
+
+        def send_message():
+            return self.receiver.send(recipient='other', content='', performative='request', headers={'conv-id':'conv#4'})
+
+        yield request.run_in_context(RequestContext(), send_message)
+        self.assertFalse('conv#4' in receiver_module._conversation_contexts)
@@ -11,8 +11,13 @@ from twisted.internet import defer
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
 from ion.core.intercept.interceptor import EnvelopeInterceptor
 from google.protobuf.internal import decoder
+from google.protobuf.internal import encoder
+from google.protobuf.internal import wire_format
 
 from ion.core.object import gpb_wrapper
 from ion.core.object import repository
@@ -39,12 +44,14 @@ class ObjectCodecInterceptor(EnvelopeInterceptor):
     The object returned is the root of a repository structure. It is not yet added to the workbench and completely
     separate from the process until it finishes the interceptor stack!
     """
+    synchronous = True
+
     def before(self, invocation):
 
         # Only mess with ION_R1_GPB encoded objects...
         if isinstance(invocation.content, dict) and ION_R1_GPB == invocation.content['encoding']:
             raw_content = invocation.content['content']
-            unpacked_content = unpack_structure(raw_content)
+            unpacked_content = unpack_structure(raw_content, lazy=CONF.getValue('lazy_unpack', False))
                 
             if hasattr(unpacked_content, 'ObjectType') and unpacked_content.ObjectType == ION_MESSAGE_TYPE:
                 # If this content should be returned in a Message Instance
@@ -94,94 +101,116 @@ def pack_structure(content):
         comment='Commiting to send message with wrapper object'
         repo.commit(comment=comment)
 
-    # only put StructureElements in this, please.
-    obj_set=set()
-
     # Get the serialized root object
     root_obj = repo.root_object
     root_obj_se = repo.index_hash.get(root_obj.MyId)
 
-    items = set([root_obj])
-
     # extract the excluded_object_types list if we have one!
     excluded_object_types = []
     if hasattr(content, 'excluded_object_types') and len(content.excluded_object_types) > 0:
-        log.debug("Codec pack_structure has %d excluded_object_types" % len(content.excluded_object_types))
+        log.debug("Codec pack_structure has %d excluded_object_types", len(content.excluded_object_types))
         excluded_object_types = [x.GPBMessage for x in content.excluded_object_types]
 
-    # Recurse through the DAG and add the keys to a set - obj_set.
-    while len(items) > 0:
-        child_items = set()
-        for item in items:
+    # Walk the DAG of structure elements to find the ones to send
+    elements = _find_structure_elements(repo, root_obj_se, excluded_object_types)
 
-            # Add this item to the set we are sending
-            if item not in obj_set:
+    serialized = _serialize_container(root_obj_se, elements)
 
-                for link in item.ChildLinks:
+    log.debug('pack_structure: Packing Complete!')
 
-                    # if this link's key is not in the index_hash, then its type must be in the excluded_type list we
-                    # pull out of the message above. if not, we have an error.
+    return serialized
 
-                    hashobj = repo.index_hash.get(link.key, None)
-                    if hashobj is None:
-                        # link is a CASRef to a GPBType
-                        if link.GPBMessage.type not in excluded_object_types:
-                            raise CodecError("Hashed CREF not found (and not excluded)! Please call David")
-                    else:
-                        # store the object we just pulled out of the index_hash for passing to the _pack_container method
-                        obj_set.add(hashobj)
 
-                        # load this object so we can examine its childlinks - should be simple extraction from
-                        # repo._workspace, but use the public method.
-                        subobj = repo.get_linked_object(link)
-                        child_items.add(subobj)
+def _find_structure_elements(repo, root_se, excluded_object_types):
+    """
+    Walk the DAG below a structure element using the child keys stored on each element - no wrappers are created
+    unless an element does not know its child keys yet.
+    Returns a list of the structure elements below the root.
+    """
+    index_hash = repo.index_hash
 
-        items = child_items
+    seen = set([root_se.key])
+    elements = []
+    stack = [root_se]
 
-    container_structure = _pack_container(root_obj_se, obj_set)
-    serialized = container_structure.SerializeToString()
+    while stack:
+        se = stack.pop()
 
-    log.debug('pack_structure: Packing Complete!')
+        if not se.isleaf and len(se.ChildLinks) == 0:
+            # The child keys are recorded when an element is committed or loaded - load it to find them
+            repo._load_element(se)
 
-    return serialized
+        for key in se.ChildLinks:
+
+            if key in seen:
+                continue
+            seen.add(key)
 
-def _pack_container(head, objects):
+            child_se = index_hash.get(key, None)
+            if child_se is None:
+                # if this link's key is not in the index_hash, then its type must be in the excluded_type list
+                _check_excluded(repo, se, key, excluded_object_types)
+                continue
+
+            elements.append(child_se)
+            stack.append(child_se)
+
+    return elements
+
+
+def _check_excluded(repo, parent_se, key, excluded_object_types):
     """
-    Helper for the sender to pack message content into a container in order
+    Raise an error unless the link from parent_se to key is a CASRef to one of the excluded object types. The type is
+    only held in the link, so the parent must be loaded to find it.
     """
-    log.debug('_pack_container: Packing container head and object_keys!')
-    # An unwrapped GPB Structure message to put stuff into!
-    cs = object_utils.get_gpb_class_from_type_id(STRUCTURE_TYPE)()
+    if excluded_object_types:
+        parent = repo._load_element(parent_se)
+        for link in parent.ChildLinks:
+            if link.key == key and link.GPBMessage.type in excluded_object_types:
+                return
 
+    raise CodecError("Hashed CREF not found (and not excluded)! Please call David")
 
-    cs.head.key = head.key
 
-    cs.head.type.object_id =  head.type.object_id
-    cs.head.type.version =  head.type.version
+def _serialize_container(head, objects):
+    """
+    Helper for the sender to serialize message content as a container. The serialized structure elements are
+    written as the head and items fields of the container without copying them into a container message first.
+    """
+    fields = _container_fields()
 
-    cs.head.isleaf = head.isleaf
-    cs.head.value = head.value
+    parts = [fields['head'], encoder._VarintBytes(head._element.ByteSize()), head.serialize()]
 
+    items_tag = fields['items']
     for item in objects:
+        parts.append(items_tag)
+        parts.append(encoder._VarintBytes(item._element.ByteSize()))
+        parts.append(item.serialize())
 
-        se = cs.items.add()
+    return ''.join(parts)
 
-        # Can not set the pointer directly... must set the components
-        se.key = item.key
-        se.isleaf = item.isleaf
-        se.type.object_id = item.type.object_id
-        se.type.version = item.type.version
 
-        # @TODO - How can we measure memory usage here to make sure this is the okay?
-        se.value = item.value # Let python's object manager keep track of the pointer to the big things!
+_CONTAINER_FIELDS = {}
 
+def _container_fields():
+    """
+    The encoded tags of the head and items fields of the container structure, from its descriptor.
+    """
+    if not _CONTAINER_FIELDS:
+        cls = object_utils.get_gpb_class_from_type_id(STRUCTURE_TYPE)
+        for name in ('head', 'items'):
+            field = cls.DESCRIPTOR.fields_by_name[name]
+            _CONTAINER_FIELDS[name] = encoder.TagBytes(field.number, wire_format.WIRETYPE_LENGTH_DELIMITED)
 
-    log.debug('_pack_container: Packed container!')
-    return cs
+    return _CONTAINER_FIELDS
 
-def unpack_structure(serialized_container):
+def unpack_structure(serialized_container, lazy=False):
     """
     Take a serialized container object and load a repository with its contents
+
+    If lazy is True only the root object is loaded. The linked objects are loaded from the repository's index hash
+    when they are first accessed and the commit which records the state of the message is made when the repository
+    is first modified or its commits are needed.
     """
     log.debug('unpack_structure: Unpacking Structure!')
     head, obj_dict = _unpack_container(serialized_container)
@@ -201,11 +230,12 @@ def unpack_structure(serialized_container):
     # attempt to extract a list of excluded objects, if the message contains the field 'excluded_object_types'
     excluded_types = []
     if hasattr(root_obj, 'message_object') and hasattr(root_obj.message_object, 'excluded_object_types'):
-        log.debug("Codec unpack_structure has %d excluded_object_types set in field" % len(root_obj.message_object.excluded_object_types))
+        log.debug("Codec unpack_structure has %d excluded_object_types set in field", len(root_obj.message_object.excluded_object_types))
         excluded_types = [x.GPBMessage for x in root_obj.message_object.excluded_object_types]
 
-    # Now load the rest of the linked objects - down to the leaf nodes.
-    repo.load_links(root_obj, excluded_types)
+    if not lazy:
+        # Now load the rest of the linked objects - down to the leaf nodes.
+        repo.load_links(root_obj, excluded_types)
 
     # append the excluded object types in the repo (load links no longer does this)
     for extype in excluded_types:
@@ -213,7 +243,10 @@ def unpack_structure(serialized_container):
             repo.excluded_types.append(extype)
 
     # Create a commit to record the state when the message arrived
-    cref = repo.commit(comment='Message for you Sir!')
+    if lazy:
+        repo.defer_commit(comment='Message for you Sir!')
+    else:
+        cref = repo.commit(comment='Message for you Sir!')
 
 
     log.debug('unpack_structure: returning root_obj')
@@ -235,7 +268,7 @@ def _unpack_container(serialized_container):
     try:
         cs.ParseFromString(serialized_container)
     except decoder._DecodeError, de:
-        log.debug('Received invalid content - decode error: "%s"' % str(de))
+        log.debug('Received invalid content - decode error: "%s"', de)
         raise CodecError('Could not decode message content as a GPB container structure!')
 
     # Return arguments
@@ -250,6 +283,6 @@ def _unpack_container(serialized_container):
 
         obj_dict[wse.key] = wse
 
-    log.debug('_unpack_container: returning head and dictionary of %d objects' % len(obj_dict))
+    log.debug('_unpack_container: returning head and dictionary of %d objects', len(obj_dict))
 
     return head, obj_dict
\ No newline at end of file
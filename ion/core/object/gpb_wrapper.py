@@ -12,6 +12,7 @@ from ion.core.object.object_utils import get_type_from_obj, sha1bin, sha1hex,\
     sha1_to_hex, ObjectUtilException, create_type_identifier, get_gpb_class_from_type_id, OOIObjectError
 
 import StringIO
+import logging
 
 from ion.core.object.object_utils import CDM_GROUP_TYPE, CDM_DATASET_TYPE, CDM_ATTRIBUTE_TYPE, CDM_DIMENSION_TYPE, CDM_VARIABLE_TYPE
 
@@ -31,6 +32,7 @@ from ion.core.object.cdm_methods import group
 from ion.core.object.cdm_methods import attribute_merge
 
 import ion.util.ionlog
+from ion.util.ionlog import lazy
 from ion.core import ioninit
 
 CONF = ioninit.config(__name__)
@@ -728,7 +730,7 @@ class Wrapper(object):
                 raise OOIObjectError('Can not invalidate by passing a wrapper from another repository')
 
             if other.Invalid:
-                log.error('Error while invalidating self - other is invalid too!\nSelf: %s\nOther: %s'% (self.Debug(), other.Debug()))
+                log.error('Error while invalidating self - other is invalid too!\nSelf: %s\nOther: %s', lazy(self.Debug), lazy(other.Debug))
                 raise OOIObjectError('Can not invalidate self with other when other is already invalid')
 
         else:
@@ -775,7 +777,7 @@ class Wrapper(object):
                     raise OOIObjectError('The back door property getter failed!')
 
 
-                log.debug('Invalidating message property: %s' % prop.name)
+                log.debug('Invalidating message property: %s', prop.name)
                 if isinstance(self_obj, ContainerWrapper):
                     # Make sure to get the derive object not what it links to!
                     for gpb_item_self, gpb_item_other in zip(self_obj._gpbcontainer, other_obj._gpbcontainer):
@@ -969,25 +971,57 @@ class Wrapper(object):
     @GPBSource
     def RecurseCommit(self, structure):
         """
-        Recursively build up the serialized structure elements which are needed
-        to commit this wrapper and reset all the links using its CAS name.
+        Build up the serialized structure elements which are needed to commit this wrapper and reset all the links
+        using its CAS name. The modified objects below this one are found with an explicit stack and committed in
+        post order - children before their parents - so that each parent is serialized with the keys of its children.
         """
 
         # Should this error if called on a non root object?
         if not self.IsRoot:
             raise OOIObjectError('Can not call Recurse Commit on a non root object wrapper.')
 
-        self.recurse_count.count += 1
-        local_cnt = self.recurse_count.count
-        log.debug('Entering Recurse Commit: recurse counter - %d, Object Type - %s, child links - %d, objects to commit - %d' %
-              (local_cnt, type(self), len(self.ChildLinks), len(structure)))
+        debug = log.getEffectiveLevel() <= logging.DEBUG
+        repo = self.Repository
 
-        if not  self.Modified:
-            # This object is already committed!
-            log.debug('Exiting Recurse Commit: recurse counter - %d' % local_cnt)
+        # Each entry is a wrapper and whether its modified children are already committed
+        stack = [(self, False)]
+        expanded = set()
 
-            return
+        while stack:
+            obj, children_committed = stack.pop()
+
+            if children_committed:
+                obj._commit_structure_element(structure, debug)
+                continue
+
+            obj.recurse_count.count += 1
+            if debug:
+                log.debug('Entering Recurse Commit: recurse counter - %d, Object Type - %s, child links - %d, objects to commit - %d',
+                      obj.recurse_count.count, type(obj), len(obj.ChildLinks), len(structure))
+
+            if not obj.Modified or id(obj) in expanded:
+                # This object is already committed or will be!
+                continue
+            expanded.add(id(obj))
+
+            stack.append((obj, True))
+
+            for link in obj.ChildLinks:
 
+                # Test to see if it is already serialized!
+                if repo.index_hash.has_key(link.key) or link.key in structure:
+                    continue
+
+                child = repo.get_linked_object(link)
+                if child.Modified:
+                    stack.append((child, False))
+
+    @GPBSource
+    def _commit_structure_element(self, structure, debug):
+        """
+        Create the structure element for a modified object once all of its children are committed, and reset the
+        links to it using its CAS name.
+        """
         # Create the Structure Element in which the binary blob will be stored
         se = StructureElement()
         repo = self.Repository
@@ -996,21 +1030,19 @@ class Wrapper(object):
 
             if link.Invalid:
                 log.error('Link in child links is invalid!')
-                log.debug('Current Wrapper: %s' % self.Debug())
-                log.debug('Invalid Link %s' % link.Debug())
+                if debug:
+                    log.debug('Current Wrapper: %s', lazy(self.Debug))
+                    log.debug('Invalid Link %s', lazy(link.Debug))
 
-            # Test to see if it is already serialized!
+            # The children are already committed
             child_se = repo.index_hash.get(link.key, structure.get(link.key, None))
-            #child_se = repo.index_hash.get(link.key, None)
 
-            #print 'Setting child Link:', child_se
             if  child_se is not None:
                 # Set the links is leaf property
                 link.isleaf = child_se.isleaf
 
             else:
-                #print 'SE for child not found - determining number of child links'
-
+                # An unmodified child which is not in the hashed elements
                 child = repo.get_linked_object(link)
 
                 # Determine whether this is a leaf node
@@ -1019,10 +1051,6 @@ class Wrapper(object):
                 else:
                     link.isleaf = False
 
-
-                #print 'Calling Recurse Commit on child'
-                child.RecurseCommit(structure)
-
             # Save the link info as a convience for sending!
             se.ChildLinks.add(link.key)
 
@@ -1035,6 +1063,7 @@ class Wrapper(object):
         # Calculate the sha1 from the serialized value and type!
         # Sha1 is a property - not a method...
         se.key = se.sha1
+        se.verified = True
 
         # Determine whether I am a leaf
         if len(self.ChildLinks) is 0:
@@ -1043,8 +1072,9 @@ class Wrapper(object):
             se.isleaf = False
 
         # Done setting up the Structure Element
-        structure[se.key] = se
-        # It does not matter if we are replacing an existing se with the same key - the content - including the child links must be identical!
+        # An identical subtree may already be committed in this pass - the content, including the child links, must be
+        # identical so keep the one we have.
+        se = structure.setdefault(se.key, se)
 
 
         # This will be true for any object which is not a core object such as a commit
@@ -1062,12 +1092,8 @@ class Wrapper(object):
                 # Get the other object with the same name that is already committed...
                 other = repo._workspace[se.key]
 
-                #print "Self Plinks:",self.ParentLinks
-                #print "Other Plinks:",other.ParentLinks
                 other.ParentLinks.update(self.ParentLinks)
 
-                #print "Other Plinks After:",other.ParentLinks
-
                 # Invalidate ourself
                 self.Invalidate(other)
 
@@ -1083,27 +1109,20 @@ class Wrapper(object):
         # Set the key value for parent links!
         # This will only be reached once for a given child object. Set all parents
         # now and the child will return as unmodified when the other parents ask it
-        # to recurse commit.
-
-        #log.debug('Current Wrapper: %s' % self.Debug())
-
-        #cnt = 1
-        #for link in self.ParentLinks:
-        #    log.debug('Parrent Link # %d \n%s' % (cnt, link.Debug()))
-        #    cnt += 1
-
-
+        # to commit.
         for link in self.ParentLinks:
             if link.Invalid:
                 log.error('Link in parent links is invalid!')
-                log.debug('Current Wrapper: %s' % self.Debug())
-                log.debug('Invalid Link %s' % link.Debug())
+                if debug:
+                    log.debug('Current Wrapper: %s', lazy(self.Debug))
+                    log.debug('Invalid Link %s', lazy(link.Debug))
 
 
             if link.key != se.key:
                 link.key = se.key
 
-        log.debug('Exiting Recurse Commit: recurse counter - %d' % local_cnt)
+        if debug:
+            log.debug('Exiting Recurse Commit: Object Type - %s', type(self))
 
 
     @GPBSource
@@ -1188,11 +1207,15 @@ class Wrapper(object):
             # If it has already been modified we are done.
             return
         else:
-            self.Modified = True
-
             # Get the repository
             repo = self.Repository
 
+            # A lazily unpacked repository records the state it arrived in before the workspace is first modified
+            if repo._deferred_commit is not None and self.Root is repo._workspace_root:
+                repo._make_deferred_commit()
+
+            self.Modified = True
+
             new_id = repo.new_id()
             repo._workspace[new_id] = self.Root
 
@@ -1464,7 +1487,7 @@ class Wrapper(object):
                 try:
                     field_val = field.__get__(self)
                 except KeyError, ke:
-                    log.debug('KeyError during get field: %s' % ke)
+                    log.debug('KeyError during get field: %s', ke)
 
                     fid.write('''%s{Field Name - "%s" : Field Type - %s : %s} \n''' % (
                     offset, name, field.field_type, 'KeyError - object not found in local workbench'))
@@ -1474,7 +1497,7 @@ class Wrapper(object):
                     try:
                         val = 'Field Value - \n%s \n%s' % (field_val.PPrint(offset=offset + '  '), offset)
                     except AttributeError, ae:
-                        log.debug('Unset CasRef Field Name: %s: Catching Attribute Error: %s ' % (name, ae))
+                        log.debug('Unset CasRef Field Name: %s: Catching Attribute Error: %s ', name, ae)
                         val = 'Field Value - None'
                     except Exception, ex:
                         log.exception('Unexpected state in a WrappedMessageProperty.')
@@ -1743,11 +1766,11 @@ class ContainerWrapper(object):
                     fid.write('''%s%s# %i - %s  \n''' % (offset, name, i, val))
 
                 except AttributeError, ae:
-                    log.debug('Attribute error while calling pprint on repeated composite: %s' % ae)
+                    log.debug('Attribute error while calling pprint on repeated composite: %s', ae)
                     fid.write('''%s%s# %i - %s  \n''' % (offset, name, i, 'Repeated Link Not Set!'))
 
                 except KeyError, ke:
-                    log.debug('KeyError while calling pprint on repeated composite: %s' % ke)
+                    log.debug('KeyError while calling pprint on repeated composite: %s', ke)
                     fid.write('''%s%s# %i - %s  \n''' % (offset, name, i, 'Repeated Link object not found!!'))
 
                 except Exception, ex:
@@ -1961,6 +1984,9 @@ class StructureElement(object):
             self._element = get_gpb_class_from_type_id(STRUCTURE_ELEMENT_TYPE)()
         self.ChildLinks = set()
 
+        # True once the key is known to match the sha1 of the value and type - cleared if any of them are set
+        self.verified = False
+
     @classmethod
     def parse_structure_element(cls, blob):
         se = get_gpb_class_from_type_id(STRUCTURE_ELEMENT_TYPE)()
@@ -1973,6 +1999,7 @@ class StructureElement(object):
                       'Element key %s, Calculated key %s' % (sha1_to_hex(instance.key), sha1_to_hex(instance.sha1)))
             raise StructureElementError('Error reading serialized structure element. Sha1 value does not match.')
 
+        instance.verified = True
         return instance
 
     @property
@@ -2020,6 +2047,7 @@ class StructureElement(object):
     def _set_type(self, obj_type):
         self._element.type.object_id = obj_type.object_id
         self._element.type.version = obj_type.version
+        self.verified = False
 
     type = property(_get_type, _set_type)
 
@@ -2030,6 +2058,7 @@ class StructureElement(object):
     #@value.setter
     def _set_value(self, value):
         self._element.value = value
+        self.verified = False
 
     value = property(_get_value, _set_value)
 
@@ -2041,6 +2070,7 @@ class StructureElement(object):
     #@key.setter
     def _set_key(self, value):
         self._element.key = value
+        self.verified = False
 
     key = property(_get_key, _set_key)
 
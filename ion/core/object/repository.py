@@ -24,10 +24,17 @@ from ion.core.object import association_manager
 from ion.core.exception import ApplicationError, ReceivedApplicationError, ReceivedContainerError
 
 from ion.util import procutils as pu
+from ion.util.cache import LRUDict
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
+# If True the sha1 of every structure element is checked each time it is loaded, not just the first time
+STRICT_VERIFY = CONF.getValue('STRICT_VERIFY', False)
+
 COMMIT_TYPE = object_utils.create_type_identifier(object_id=8, version=1)
 MUTABLE_TYPE = object_utils.create_type_identifier(object_id=6, version=1)
 BRANCH_TYPE = object_utils.create_type_identifier(object_id=5, version=1)
@@ -49,15 +56,21 @@ class IndexHash(dict):
     A dictionary class to contain the objects owned by a repository. All repository objects are accessible by other
     repositories via the workbench which maintains a cache of all the local objects. Clean up is the responsibility of
     each repository.
+
+    The size of the objects is kept up to date as they are added and removed, in total and by object type.
     """
     def __init__(self, *args, **kwargs):
-        dict.__init__(self, *args, **kwargs)
+        dict.__init__(self)
 
         self._workbench_cache = None
         self._has_cache = False
 
         self._size = 0
 
+        self._type_sizes = {}
+
+        self.update(*args, **kwargs)
+
     def _set_cache(self,cache):
         assert isinstance(cache, weakref.WeakValueDictionary), 'Invalid object passed as the cache for a repository.'
         self._workbench_cache = cache
@@ -86,6 +99,47 @@ class IndexHash(dict):
     def __sizeof__(self):
         return self._size
 
+    def size_by_type(self):
+        """
+        Return a dictionary of (object_id, version) to the size of the objects of that type in the index hash.
+        """
+        return self._type_sizes.copy()
+
+    def size_of_type(self, obj_type):
+        """
+        Return the size of the objects of a type, given as a type identifier, in the index hash.
+        """
+        return self._type_sizes.get((obj_type.object_id, obj_type.version), 0)
+
+    def _add_size(self, val):
+        size = val.__sizeof__()
+        self._size += size
+
+        tp = getattr(val, 'type', None)
+        if tp is not None:
+            tp = (tp.object_id, tp.version)
+        self._type_sizes[tp] = self._type_sizes.get(tp, 0) + size
+
+    def _remove_size(self, val):
+        size = val.__sizeof__()
+        self._size -= size
+
+        tp = getattr(val, 'type', None)
+        if tp is not None:
+            tp = (tp.object_id, tp.version)
+        remaining = self._type_sizes.get(tp, 0) - size
+        if remaining > 0:
+            self._type_sizes[tp] = remaining
+        else:
+            self._type_sizes.pop(tp, None)
+
+    def _own(self, key, val):
+        """
+        Add an object from the cache to the objects owned by this index hash.
+        """
+        dict.__setitem__(self, key, val)
+        self._add_size(val)
+
 
     def __getitem__(self, key):
 
@@ -94,20 +148,28 @@ class IndexHash(dict):
 
         elif self.has_cache:
             # You get it - you own it!
-            val = self.cache[key]
+            if isinstance(self.cache, BlobCache):
+                val = self.cache.take(key)
+                if val is None:
+                    raise KeyError(key)
+            else:
+                val = self.cache[key]
             # If it does not raise a KeyError - add it
-            dict.__setitem__(self, key, val)
+            self._own(key, val)
             return val
         else:
             raise KeyError('Key not found in index hash!')
 
 
     def __setitem__(self, key, val):
+        if dict.has_key(self, key):
+            self._remove_size(dict.__getitem__(self, key))
+
         dict.__setitem__(self, key, val)
         if self.has_cache:
             self.cache[key]=val
 
-        self._size += val.__sizeof__()
+        self._add_size(val)
 
 
     def copy(self):
@@ -130,10 +192,13 @@ class IndexHash(dict):
 
         elif self.has_cache:
             # You get it - you own it!
-            val = self.cache.get(key,d)
+            if isinstance(self.cache, BlobCache):
+                val = self.cache.take(key, d)
+            else:
+                val = self.cache.get(key,d)
 
             if val != d:
-                dict.__setitem__(self, key, val)
+                self._own(key, val)
 
             return val
         else:
@@ -152,26 +217,34 @@ class IndexHash(dict):
         D.update(E, **F) -> None.  Update D from E and F: for k in E: D[k] = E[k]
         (if E has keys else: for (k, v) in E: D[k] = v) then: for k in F: D[k] = F[k]
         """
-        dict.update(self, *args, **kwargs)
-        if self.has_cache:
-            self.cache.update(*args, **kwargs)
+        if args and isinstance(args[0], dict) and not kwargs:
+            items = args[0]
+        else:
+            items = dict(*args, **kwargs)
+
+        for key, val in items.iteritems():
+            if dict.has_key(self, key):
+                self._remove_size(dict.__getitem__(self, key))
+            self._add_size(val)
 
-        # For now - don't bother parsing args just recount
-        size = 0
-        for item in self.itervalues():
-            size += item.__sizeof__()
-        self._size = size
+        dict.update(self, items)
+        if self.has_cache:
+            self.cache.update(items)
 
     def clear(self):
+        # Keep the elements warm in the workbench cache after this repository lets go of them
+        if self.has_cache and isinstance(self.cache, BlobCache):
+            self.cache.retain(self.itervalues())
+
         dict.clear(self)
 
         self._size=0
+        self._type_sizes.clear()
 
     def __delitem__(self, key):
 
-        item = self.get(key)
-        if key is not None:
-            self._size -= item.__sizeof__()
+        item = self[key]
+        self._remove_size(item)
 
         dict.__delitem__(self,key)
 
@@ -179,6 +252,114 @@ class IndexHash(dict):
 
 
 
+class BlobCache(weakref.WeakValueDictionary):
+    """
+    The cache of hashed elements shared by the repositories in a workbench. The weak tier holds every element which
+    is owned by a repository. Elements which a repository lets go of are kept in a strongly referenced LRU tier, up to
+    a limit in bytes, so that they do not have to be fetched again if they are needed soon after. An element found in
+    the strong tier moves back to the weak tier only when a repository takes it (see take); a plain lookup leaves it
+    in the strong tier.
+    """
+
+    def __init__(self, strong_size):
+        weakref.WeakValueDictionary.__init__(self)
+
+        self.strong = LRUDict(strong_size, use_size=True)
+
+        self.weak_hits = 0
+        self.strong_hits = 0
+        self.misses = 0
+        self.retained = 0
+
+    def _lookup(self, key, take=False):
+        val = weakref.WeakValueDictionary.get(self, key, None)
+
+        if key in self.strong:
+            if take:
+                # A repository is taking it back - no need to hold it here too
+                val = self.strong.pop(key)
+                weakref.WeakValueDictionary.__setitem__(self, key, val)
+            else:
+                val = self.strong[key]
+            self.strong_hits += 1
+        elif val is not None:
+            self.weak_hits += 1
+        else:
+            self.misses += 1
+
+        return val
+
+    def __getitem__(self, key):
+        val = self._lookup(key)
+        if val is None:
+            raise KeyError(key)
+        return val
+
+    def get(self, key, default=None):
+        val = self._lookup(key)
+        if val is None:
+            return default
+        return val
+
+    def take(self, key, default=None):
+        """
+        Get an element for a repository which takes ownership of it, moving it from the strong to the weak tier.
+        """
+        val = self._lookup(key, take=True)
+        if val is None:
+            return default
+        return val
+
+    def has_key(self, key):
+        return weakref.WeakValueDictionary.has_key(self, key) or key in self.strong
+
+    __contains__ = has_key
+
+    def keys(self):
+        return list(set(weakref.WeakValueDictionary.keys(self)).union(self.strong.keys()))
+
+    def retain(self, elements):
+        """
+        Hold on to elements which a repository no longer owns, up to the byte limit of the strong tier.
+        """
+        for element in elements:
+            # An element larger than the whole tier would only empty it
+            if element.__sizeof__() > self.strong.limit:
+                continue
+            self.strong[element.key] = element
+            self.retained += 1
+
+    def clear(self):
+        weakref.WeakValueDictionary.clear(self)
+        self.strong.clear()
+
+    def stats(self):
+        """
+        @returns    A dictionary of the counters and usage of each tier.
+        """
+        weak_bytes = 0
+        for element in weakref.WeakValueDictionary.values(self):
+            weak_bytes += element.__sizeof__()
+
+        return {'weak':{'hits':self.weak_hits,
+                        'items':weakref.WeakValueDictionary.__len__(self),
+                        'bytes':weak_bytes},
+                'strong':{'hits':self.strong_hits,
+                          'retained':self.retained,
+                          'items':len(self.strong.keys()),
+                          'bytes':self.strong.total_size,
+                          'limit':self.strong.limit},
+                'misses':self.misses}
+
+
+class HashCounter(object):
+    """
+    Class used to count the structure elements loaded without recomputing their sha1
+    """
+    count = 0
+    bytes_avoided = 0
+
+
 class ObjectContainer(object):
     """
     Base class for the repository and merge container
@@ -186,6 +367,8 @@ class ObjectContainer(object):
 
     DefaultExcludedTypes = [ARRAY_STRUCTURE_TYPE,]
 
+    hash_counter = HashCounter()
+
     def __init__(self):
 
 
@@ -228,6 +411,11 @@ class ObjectContainer(object):
         The list of currently excluded object types
         """
 
+        self._deferred_commit = None
+        """
+        The comment and date of a commit which is made only when the repository is modified or its commits are needed
+        """
+
 
     @property
     def root_object(self):
@@ -369,13 +557,21 @@ class ObjectContainer(object):
 
     def load_links(self, obj, excluded_types=None):
         """
-        Load the child objects into the work space recursively
+        Load the child objects into the work space - walks the structure with an explicit stack, loading each
+        object once.
         """
         excluded_types = excluded_types or []
-        for link in obj.ChildLinks:
-            if not link.type.GPBMessage in excluded_types:
-                child = self.get_linked_object(link)
-                self.load_links(child, excluded_types)
+
+        loaded = set([id(obj)])
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            for link in item.ChildLinks:
+                if not link.type.GPBMessage in excluded_types:
+                    child = self.get_linked_object(link)
+                    if id(child) not in loaded:
+                        loaded.add(id(child))
+                        stack.append(child)
 
     def _checkout_local_commit(self, commit, excluded_types):
 
@@ -475,11 +671,16 @@ class ObjectContainer(object):
 
     def _load_element(self, element):
 
-        # check that the calculated value in element.sha1 matches the stored value
-        if not element.key == element.sha1:
-            #@TODO Consider removing this somewhat costly check - it is already done when an object is read from a message
+        # check that the calculated value in element.sha1 matches the stored value - once, unless strict checking is on
+        if element.verified and not STRICT_VERIFY:
+            self.hash_counter.count += 1
+            self.hash_counter.bytes_avoided += len(element.value)
+
+        elif not element.key == element.sha1:
             raise RepositoryError('The sha1 key does not match the value. The data is corrupted! \n' +\
             'Element key %s, Calculated key %s' % (object_utils.sha1_to_hex(element.key), object_utils.sha1_to_hex(element.sha1)))
+        else:
+            element.verified = True
 
         cls = object_utils.get_gpb_class_from_type_id(element.type)
 
@@ -746,6 +947,7 @@ class Repository(ObjectContainer):
         self.index_hash.clear()
         self._commit_index.clear()
         self._current_branch = None
+        self._deferred_commit = None
         self.branchnicknames.clear()
         self._stash.clear()
         self.upstream = None
@@ -761,6 +963,8 @@ class Repository(ObjectContainer):
         """
         Fill in a IDREF Object using the current state of the repository
         """
+        self._make_deferred_commit()
+
         # Don't worry about type checking here.... will cause an attribute error if incorrect
         id_ref.key = self.repository_key
         id_ref.branch = self._current_branch.branchkey
@@ -788,6 +992,8 @@ class Repository(ObjectContainer):
         """
         Convenience method to access the current commit
         """
+        self._make_deferred_commit()
+
         if self._detached_head:
             log.warn('This repository is currently a detached head. The current commit is not at the head of a branch.')
 
@@ -805,6 +1011,8 @@ class Repository(ObjectContainer):
         """
         Convenience method to get a list of the current head commits
         """
+        self._make_deferred_commit()
+
         heads = []
 
         for branch in self.branches:
@@ -829,6 +1037,8 @@ class Repository(ObjectContainer):
         """
         @brief Create a new branch from the current commit and switch the workspace to the new branch.
         """
+        self._make_deferred_commit()
+
         ## Need to check and then clear the workspace???
         #if not self.status == self.UPTODATE:
         #    raise Exception, 'Can not create new branch while the workspace is dirty'
@@ -918,6 +1128,8 @@ class Repository(ObjectContainer):
         Specify a branch, a branch and commit_id or a date
         Branch can be either a local nick name or a global branch key
         """
+        self._make_deferred_commit()
+
 
         if excluded_types is None:
             excluded_types = self.excluded_types or self.DefaultExcludedTypes[:]
@@ -1148,6 +1360,8 @@ class Repository(ObjectContainer):
 
     def purge_workspace(self):
 
+        self._make_deferred_commit()
+
         if self.status == self.MODIFIED:
 
             #@TODO consider changing this to a warning rather than an exception
@@ -1168,11 +1382,28 @@ class Repository(ObjectContainer):
         self.associations_as_subject.predicate_sorted_associations.clear()
 
         
-    def commit(self, comment=''):
+    def defer_commit(self, comment=''):
+        """
+        Record the current state of the workspace with a commit, but do not make the commit until the workspace is
+        modified or the commits of the repository are needed. Used when a message is unpacked lazily.
+        """
+        self._deferred_commit = (comment, pu.currenttime())
+
+    def _make_deferred_commit(self):
+        """
+        Make the commit recorded by defer_commit, if there is one.
+        """
+        if self._deferred_commit is not None:
+            comment, date = self._deferred_commit
+            self._deferred_commit = None
+            self.commit(comment=comment, date=date)
+
+    def commit(self, comment='', date=None):
         """
         Commit the current workspace structure
         """
-        
+        self._make_deferred_commit()
+
         # If the repo is in a valid state - make the commit even if it is up to date
         if self.status == self.MODIFIED or self.status == self.UPTODATE:
             structure={}
@@ -1182,7 +1413,7 @@ class Repository(ObjectContainer):
 
             self._workspace_root.RecurseCommit(structure)
 
-            cref = self._create_commit_ref(comment=comment)
+            cref = self._create_commit_ref(comment=comment, date=date)
 
 
             # Add the CRef to the hashed elements
@@ -1275,6 +1506,8 @@ class Repository(ObjectContainer):
         It simply adds the parent ref to the repositories merged from list!
         
         """
+        self._make_deferred_commit()
+
         
         if self.status == self.MODIFIED:
             log.warn('Merging while the workspace is dirty better to make a new commit first!')
@@ -1357,7 +1590,9 @@ class Repository(ObjectContainer):
         return retval
         
     def log_commits(self,branchname=None):
-        
+
+        self._make_deferred_commit()
+
         if branchname is None:
             branchname = self._current_branch.branchkey
         
@@ -1379,6 +1614,8 @@ class Repository(ObjectContainer):
 
     def list_parent_commits(self,branchname=None):
 
+        self._make_deferred_commit()
+
         if branchname is None:
             branchname = self._current_branch.branchkey
 
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/test/benchmark_codec.py
+@brief Compares codec.pack_structure with the wrapper based breadth first walk it replaced.
+"""
+
+from ion.test.iontest import IonTestCase
+from ion.test.benchmark import best_time
+
+from ion.core.object import codec
+from ion.core.object import workbench
+from ion.core.object import object_utils
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+PERSON_TYPE = object_utils.create_type_identifier(object_id=20001, version=1)
+ADDRESSLINK_TYPE = object_utils.create_type_identifier(object_id=20003, version=1)
+
+
+def legacy_pack_structure(content):
+    """
+    The pack_structure walk from before the structure element walk, kept here for comparison only.
+    """
+    repo = content.Repository
+
+    if not repo.status == repo.UPTODATE:
+        repo.commit(comment='Commiting to send message with wrapper object')
+
+    obj_set=set()
+
+    root_obj = repo.root_object
+    root_obj_se = repo.index_hash.get(root_obj.MyId)
+
+    items = set([root_obj])
+
+    while len(items) > 0:
+        child_items = set()
+        for item in items:
+            if item not in obj_set:
+                for link in item.ChildLinks:
+                    hashobj = repo.index_hash.get(link.key, None)
+                    if hashobj is None:
+                        raise codec.CodecError("Hashed CREF not found!")
+                    else:
+                        obj_set.add(hashobj)
+                        subobj = repo.get_linked_object(link)
+                        child_items.add(subobj)
+
+        items = child_items
+
+    cs = object_utils.get_gpb_class_from_type_id(codec.STRUCTURE_TYPE)()
+
+    cs.head.key = root_obj_se.key
+    cs.head.type.object_id = root_obj_se.type.object_id
+    cs.head.type.version = root_obj_se.type.version
+    cs.head.isleaf = root_obj_se.isleaf
+    cs.head.value = root_obj_se.value
+
+    for item in obj_set:
+        se = cs.items.add()
+        se.key = item.key
+        se.isleaf = item.isleaf
+        se.type.object_id = item.type.object_id
+        se.type.version = item.type.version
+        se.value = item.value
+
+    return cs.SerializeToString()
+
+
+def make_structure(size, shared=10):
+    """
+    An address book DAG with size people. Every shared'th entry links to the previous person again, so some nodes
+    have more than one parent.
+    """
+    wb = workbench.WorkBench('Codec Benchmark')
+    repo = wb.create_repository(ADDRESSLINK_TYPE)
+    ab = repo.root_object
+
+    p = None
+    for x in xrange(size):
+        if p is None or x % shared != 0:
+            p = repo.create_object(PERSON_TYPE)
+            p.name = 'Person %d' % x
+            p.id = x
+            p.email = 'p%d@ooici.net' % x
+
+        link = ab.person.add()
+        link.SetLink(p)
+
+    ab.owner = p
+
+    repo.commit('Benchmark structure')
+    return ab
+
+
+class CodecBenchmark(IonTestCase):
+
+    repeats = 3
+    sizes = (10, 100, 1000, 10000, 100000)
+
+    def test_pack_structure(self):
+
+        log.info("%8s %12s %12s %12s" % ('nodes', 'legacy (s)', 'packed (s)', 'bytes'))
+        for size in self.sizes:
+            content = make_structure(size)
+
+            legacy = best_time(self.repeats, legacy_pack_structure, content)[0]
+            packed, serialized = best_time(self.repeats, codec.pack_structure, content)
+
+            log.info("%8d %12.6f %12.6f %12d" % (size, legacy, packed, len(serialized)))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/test/benchmark_commit.py
+@brief Compares Wrapper.RecurseCommit with the recursive commit it replaced on a dataset with many bounded arrays.
+"""
+
+from ion.test.iontest import IonTestCase
+from ion.test.benchmark import time_call
+
+from ion.core.object import gpb_wrapper
+from ion.core.object import workbench
+from ion.core.object import object_utils
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+DATASET_TYPE = object_utils.create_type_identifier(object_id=10001, version=1)
+GROUP_TYPE = object_utils.create_type_identifier(object_id=10020, version=1)
+VARIABLE_TYPE = object_utils.create_type_identifier(object_id=10024, version=1)
+ARRAY_STRUCTURE_TYPE = object_utils.create_type_identifier(object_id=10025, version=1)
+BOUNDED_ARRAY_TYPE = object_utils.create_type_identifier(object_id=10021, version=1)
+FLOAT32ARRAY_TYPE = object_utils.create_type_identifier(object_id=10013, version=1)
+
+
+def legacy_recurse_commit(wrapper, structure):
+    """
+    The recursive commit from before the explicit stack, kept here for comparison only.
+    """
+    if not wrapper.Modified:
+        return
+
+    se = gpb_wrapper.StructureElement()
+    repo = wrapper.Repository
+
+    for link in wrapper.ChildLinks:
+        child_se = repo.index_hash.get(link.key, structure.get(link.key, None))
+        if child_se is not None:
+            link.isleaf = child_se.isleaf
+        else:
+            child = repo.get_linked_object(link)
+            link.isleaf = len(child.ChildLinks) == 0
+            legacy_recurse_commit(child, structure)
+
+        se.ChildLinks.add(link.key)
+
+    se.value = wrapper.SerializeToString()
+    se.type = wrapper.ObjectType
+    se.key = se.sha1
+    se.isleaf = len(wrapper.ChildLinks) == 0
+    structure[se.key] = se
+
+    if repo._workspace.has_key(wrapper.MyId):
+        del repo._workspace[wrapper.MyId]
+        if se.key in repo._workspace:
+            other = repo._workspace[se.key]
+            other.ParentLinks.update(wrapper.ParentLinks)
+            wrapper.Invalidate(other)
+        else:
+            repo._workspace[se.key] = wrapper
+
+    if wrapper.MyId != se.key:
+        wrapper.MyId = se.key
+        wrapper.Modified = False
+
+    for link in wrapper.ParentLinks:
+        if link.key != se.key:
+            link.key = se.key
+
+
+def stack_recurse_commit(wrapper, structure):
+    wrapper.RecurseCommit(structure)
+
+
+def make_dataset(num_bas, values=10):
+    """
+    A dataset with one variable whose content is split into num_bas bounded arrays.
+    """
+    wb = workbench.WorkBench('Commit Benchmark')
+    repo = wb.create_repository(DATASET_TYPE)
+    dataset = repo.root_object
+
+    group = repo.create_object(GROUP_TYPE)
+    group.name = 'benchmark'
+    dataset.root_group = group
+
+    var = repo.create_object(VARIABLE_TYPE)
+    var.name = 'data'
+    group.variables.add()
+    group.variables[0] = var
+
+    var.content = repo.create_object(ARRAY_STRUCTURE_TYPE)
+    for x in xrange(num_bas):
+        ba = repo.create_object(BOUNDED_ARRAY_TYPE)
+        bounds = ba.bounds.add()
+        bounds.origin = x * values
+        bounds.size = values
+
+        ba.ndarray = repo.create_object(FLOAT32ARRAY_TYPE)
+        ba.ndarray.value.extend([float(x * values + i) for i in xrange(values)])
+
+        link = var.content.bounded_arrays.add()
+        link.SetLink(ba)
+
+    return repo
+
+
+def best_commit_time(repeats, commit, num_bas):
+    """
+    Each commit needs a new dataset, which is not part of the time.
+    """
+    times = []
+    for x in xrange(repeats):
+        repo = make_dataset(num_bas)
+        structure = {}
+        seconds, result = time_call(commit, repo.root_object, structure)
+        times.append((seconds, len(structure)))
+    return min(times)
+
+
+class CommitBenchmark(IonTestCase):
+
+    repeats = 3
+    sizes = (1000, 10000, 50000)
+
+    def test_recurse_commit(self):
+
+        log.info("%10s %12s %12s %10s" % ('arrays', 'legacy (s)', 'stack (s)', 'elements'))
+        for size in self.sizes:
+            legacy, legacy_count = best_commit_time(self.repeats, legacy_recurse_commit, size)
+            stack, count = best_commit_time(self.repeats, stack_recurse_commit, size)
+
+            self.assertEqual(count, legacy_count)
+
+            log.info("%10d %12.6f %12.6f %10d" % (size, legacy, stack, count))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""
+@file ion/core/object/test/benchmark_index_hash.py
+@brief Compares loading a repository index hash in batches with the size recount it used to do on each update.
+"""
+
+from ion.test.iontest import IonTestCase
+from ion.test.benchmark import best_time
+
+from ion.core.object import gpb_wrapper
+from ion.core.object import object_utils
+from ion.core.object import repository
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+PERSON_TYPE = object_utils.create_type_identifier(object_id=20001, version=1)
+ADDRESSLINK_TYPE = object_utils.create_type_identifier(object_id=20003, version=1)
+
+
+class LegacyIndexHash(repository.IndexHash):
+    """
+    The update from before the incremental size accounting, kept here for comparison only.
+    """
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        if self.has_cache:
+            self.cache.update(*args, **kwargs)
+
+        size = 0
+        for item in self.itervalues():
+            size += item.__sizeof__()
+        self._size = size
+
+
+def make_elements(num_elements):
+    elements = []
+    for x in xrange(num_elements):
+        se = gpb_wrapper.StructureElement()
+        if x % 10 == 0:
+            se.type = ADDRESSLINK_TYPE
+        else:
+            se.type = PERSON_TYPE
+        se.value = 'element %d' % x
+        se.key = se.sha1
+        elements.append(se)
+    return elements
+
+
+def load(cls, elements, batch):
+    ih = cls()
+    for x in xrange(0, len(elements), batch):
+        ih.update([(se.key, se) for se in elements[x:x + batch]])
+    return ih.__sizeof__()
+
+
+class IndexHashBenchmark(IonTestCase):
+
+    repeats = 3
+    num_elements = 100000
+    batch = 1000
+
+    def test_batch_load(self):
+
+        elements = make_elements(self.num_elements)
+
+        log.info("%10s %8s %12s %12s %12s" % ('elements', 'batch', 'legacy (s)', 'new (s)', 'bytes'))
+        num = 1000
+        while num <= self.num_elements:
+            legacy, legacy_size = best_time(self.repeats, load, LegacyIndexHash, elements[:num], self.batch)
+            new, size = best_time(self.repeats, load, repository.IndexHash, elements[:num], self.batch)
+
+            # The size accounting must match the recount
+            self.assertEqual(size, legacy_size)
+
+            log.info("%10d %8d %12.6f %12.6f %12d" % (num, self.batch, legacy, new, size))
+            num *= 10
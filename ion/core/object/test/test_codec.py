@@ -75,6 +75,49 @@ class CodecTest(unittest.TestCase):
         self.assertEqual(res.person[0],self.ab.person[0])
 
 
+    def test_lazy_unpack(self):
+
+        serialized = codec.pack_structure(self.ab)
+
+        res = codec.unpack_structure(serialized, lazy=True)
+        repo = res.Repository
+
+        # Only the root object is loaded and the commit is not made yet
+        self.assertEqual(len(repo._workspace), 1)
+        self.assertEqual(len(repo._current_branch.commitrefs), 0)
+
+        self.assertEqual(res, self.ab)
+        self.assertEqual(res.person[0], self.ab.person[0])
+        self.assertEqual(res.person[1].name, 'John')
+
+        # Asking for the commit makes it
+        cref = repo.commit_head
+        self.assertEqual(cref.GetLink('objectroot').key, self.ab.MyId)
+        self.assertEqual(repo.status, repo.UPTODATE)
+
+    def test_lazy_unpack_modify(self):
+
+        serialized = codec.pack_structure(self.ab)
+
+        res = codec.unpack_structure(serialized, lazy=True)
+        repo = res.Repository
+
+        res.person[1].name = 'Jon'
+        self.assertEqual(repo.status, repo.MODIFIED)
+
+        # The state of the message was committed before it was modified
+        self.assertEqual(repo.commit_head.GetLink('objectroot').key, self.ab.MyId)
+
+        repo.commit('Changed a name')
+        cref = repo.commit_head
+        self.assertNotEqual(cref.GetLink('objectroot').key, self.ab.MyId)
+        self.assertEqual(cref.parentrefs[0].commitref.GetLink('objectroot').key, self.ab.MyId)
+
+        # Packing the modified repository sends the new state
+        res2 = codec.unpack_structure(codec.pack_structure(res), lazy=True)
+        self.assertEqual(res2.person[1].name, 'Jon')
+        self.assertEqual(res2.person[0], self.ab.person[0])
+
     def test_unpack_error(self):
 
         self.assertRaises(codec.CodecError,codec.unpack_structure,'junk that is not a serialized container!')
@@ -128,3 +171,24 @@ class CodecTest(unittest.TestCase):
 
 
 
+
+
+    def test_pack_container(self):
+
+        serialized = codec.pack_structure(self.ab)
+
+        # The container written from the serialized elements must parse as an ordinary container structure
+        cs = object_utils.get_gpb_class_from_type_id(codec.STRUCTURE_TYPE)()
+        cs.ParseFromString(serialized)
+
+        self.assertEqual(cs.head.key, self.ab.MyId)
+
+        # The two people - the owner is the same object as the first person
+        item_keys = [se.key for se in cs.items]
+        self.assertEqual(len(item_keys), 2)
+
+        child_keys = set([link.key for link in self.ab.ChildLinks])
+        self.assertEqual(set(item_keys), child_keys)
+
+        for se in cs.items:
+            self.assertEqual(se.SerializeToString(), self.repo.index_hash.get(se.key).serialize())
@@ -42,6 +42,17 @@ class DummyClass(object):
 
             return 10
 
+class TypedDummyClass(DummyClass):
+
+        def __init__(self, size, obj_type):
+
+            self.size = size
+            self.type = obj_type
+
+        def __sizeof__(self):
+
+            return self.size
+
 class IndexHashTest(unittest.TestCase):
 
     def setUp(self):
@@ -172,6 +183,44 @@ class IndexHashTest(unittest.TestCase):
         self.assertEqual(dict.__len__(ih2),2)
 
 
+    def test_size_accounting(self):
+
+        ih = repository.IndexHash()
+        ih.cache = self.cache
+
+        a = TypedDummyClass(5, PERSON_TYPE)
+        b = TypedDummyClass(7, ADDRESSLINK_TYPE)
+        ih.update({'a':a, 'b':b})
+        self.assertEqual(ih.__sizeof__(), 12)
+        self.assertEqual(ih.size_of_type(PERSON_TYPE), 5)
+        self.assertEqual(ih.size_of_type(ADDRESSLINK_TYPE), 7)
+
+        # Overwrite an item
+        ih['a'] = TypedDummyClass(3, PERSON_TYPE)
+        self.assertEqual(ih.__sizeof__(), 10)
+        self.assertEqual(ih.size_of_type(PERSON_TYPE), 3)
+
+        ih.update({'a':a, 'c':DummyClass()})
+        self.assertEqual(ih.__sizeof__(), 22)
+        self.assertEqual(ih.size_by_type(), {(20001, 1):5, (20003, 1):7, None:10})
+
+        # Delete an item
+        del ih['b']
+        self.assertEqual(ih.__sizeof__(), 15)
+        self.assertEqual(ih.size_of_type(ADDRESSLINK_TYPE), 0)
+        self.assertEqual(ih.size_by_type(), {(20001, 1):5, None:10})
+
+        # Items taken from the cache are owned
+        ih2 = repository.IndexHash()
+        ih2.cache = self.cache
+        ih2.get('a')
+        self.assertEqual(ih2.__sizeof__(), 5)
+
+        ih.clear()
+        self.assertEqual(ih.__sizeof__(), 0)
+        self.assertEqual(ih.size_by_type(), {})
+
+
     def test_add_cache_later(self):
 
         ih1 = repository.IndexHash()
@@ -257,6 +306,75 @@ class IndexHashTest(unittest.TestCase):
 
 
 
+class KeyedDummyClass(DummyClass):
+
+        def __init__(self, key, size=10):
+
+            self.key = key
+            self.size = size
+
+        def __sizeof__(self):
+
+            return self.size
+
+
+class BlobCacheTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.cache = repository.BlobCache(25)
+
+    def test_retain(self):
+
+        ih = repository.IndexHash()
+        ih.cache = self.cache
+
+        ih.update({'a':KeyedDummyClass('a'), 'b':KeyedDummyClass('b'), 'c':KeyedDummyClass('c')})
+        self.assertIsInstance(self.cache.get('a'), KeyedDummyClass)
+        self.assertEqual(self.cache.weak_hits, 1)
+
+        # Only two fit in the strong tier once the index hash lets go
+        ih.clear()
+        stats = self.cache.stats()
+        self.assertEqual(stats['strong']['items'], 2)
+        self.assertEqual(stats['strong']['bytes'], 20)
+        self.assertEqual(len(self.cache.keys()), 2)
+
+        # A second index hash takes one back from the strong tier
+        ih2 = repository.IndexHash()
+        ih2.cache = self.cache
+        key = self.cache.keys()[0]
+        self.assertEqual(ih2.get(key).key, key)
+        self.assertEqual(self.cache.strong_hits, 1)
+        self.assertEqual(self.cache.stats()['strong']['items'], 1)
+        self.assertEqual(self.cache.stats()['weak']['items'], 2)
+
+        self.assertEqual(ih2.get('d'), None)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_lookup_keeps_strong_tier(self):
+
+        self.cache.retain([KeyedDummyClass('a')])
+
+        # A peek at the cache leaves the element in the strong tier
+        self.assertEqual(self.cache.get('a').key, 'a')
+        self.assertEqual(self.cache['a'].key, 'a')
+        self.assertEqual(self.cache.stats()['strong']['items'], 1)
+        self.assertEqual(self.cache.strong_hits, 2)
+
+        ih = repository.IndexHash()
+        ih.cache = self.cache
+        self.assertEqual(ih['a'].key, 'a')
+        self.assertEqual(self.cache.stats()['strong']['items'], 0)
+        self.assertEqual(self.cache.stats()['weak']['items'], 1)
+
+    def test_retain_too_large(self):
+
+        self.cache.retain([KeyedDummyClass('a', 30)])
+        self.assertEqual(self.cache.has_key('a'), False)
+        self.assertEqual(self.cache.stats()['strong']['items'], 0)
+
+
 class RepositoryTest(unittest.TestCase):
 
     def setUp(self):
@@ -856,6 +974,100 @@ class RepositoryTest(unittest.TestCase):
             self.assertIdentical(item(),None)
             
             
+    def test_commit_identical_objects(self):
+
+        repo, ab = self.wb.init_repository(ADDRESSLINK_TYPE)
+
+        for x in range(2):
+            p = repo.create_object(PERSON_TYPE)
+            p.name = 'David'
+            p.id = 5
+            ab.person.add()
+            ab.person[x] = p
+
+        repo.commit('Two identical people')
+
+        # Both links point to one element
+        self.assertEqual(ab.person.GetLink(0).key, ab.person.GetLink(1).key)
+        people = [se for se in repo.index_hash.itervalues() if se.type.object_id == PERSON_TYPE.object_id]
+        self.assertEqual(len(people), 1)
+        self.assertEqual(people[0].verified, True)
+
+        # The root element lists its child
+        root_se = repo.index_hash.get(ab.MyId)
+        self.assertEqual(root_se.ChildLinks, set([people[0].key]))
+        self.assertEqual(ab.person[1].name, 'David')
+
+    def test_commit_children_first(self):
+
+        repo, ab = self.wb.init_repository(ADDRESSLINK_TYPE)
+
+        p = repo.create_object(PERSON_TYPE)
+        p.name = 'David'
+        ab.owner = p
+        repo.commit('First')
+
+        # Modify the child only - the parent is committed again with the new key of the child
+        ab.owner.name = 'John'
+        repo.commit('Second')
+
+        owner_key = ab.GetLink('owner').key
+        self.assertEqual(repo.index_hash.get(owner_key).key, ab.owner.MyId)
+        self.assertEqual(repo.index_hash.get(ab.MyId).ChildLinks, set([owner_key]))
+        self.assertEqual(repo.status, repo.UPTODATE)
+
+    def _committed_addressbook(self):
+        repo, ab = self.wb.init_repository(ADDRESSLINK_TYPE)
+
+        p = repo.create_object(PERSON_TYPE)
+        p.name = 'David'
+        ab.owner = p
+        repo.commit('Commit to serialize elements')
+
+        return repo, ab
+
+    def test_load_verified_element(self):
+
+        repo, ab = self._committed_addressbook()
+
+        element = repo.index_hash.get(ab.MyId)
+        # The element was hashed when it was committed
+        self.assertEqual(element.verified, True)
+
+        count = repo.hash_counter.count
+        bytes_avoided = repo.hash_counter.bytes_avoided
+
+        obj = repo._load_element(element)
+        self.assertEqual(obj, ab)
+        self.assertEqual(repo.hash_counter.count, count + 1)
+        self.assertEqual(repo.hash_counter.bytes_avoided, bytes_avoided + len(element.value))
+
+        # An element from a message is verified the first time it is loaded
+        se = gpb_wrapper.StructureElement(element._element)
+        self.assertEqual(se.verified, False)
+        repo._load_element(se)
+        self.assertEqual(se.verified, True)
+        self.assertEqual(repo.hash_counter.count, count + 1)
+
+        # Setting the value clears the flag
+        se.value = se.value + 'corrupt'
+        self.assertEqual(se.verified, False)
+        self.assertRaises(repository.RepositoryError, repo._load_element, se)
+
+    def test_load_element_strict(self):
+
+        repo, ab = self._committed_addressbook()
+
+        element = repo.index_hash.get(ab.MyId)
+
+        # Corrupt the element without going through the wrapper
+        element._element.value = element.value + 'corrupt'
+        repo._load_element(element)
+
+        self.patch(repository, 'STRICT_VERIFY', True)
+        self.assertRaises(repository.RepositoryError, repo._load_element, element)
+
+
 class MergeContainerTest(unittest.TestCase):
     
     def setUp(self):
@@ -906,9 +1118,3 @@ class MergeContainerTest(unittest.TestCase):
         yield mr.load_root(excluded_types=[])
 
         self.assertEqual(mr.root_object, self.ab)
-
-    
-    
-    
-    
-    
\ No newline at end of file
@@ -534,6 +534,46 @@ class WorkBenchProcessTest(IonTestCase):
         self.assertEqual(self.repo1.root_object, repo2.root_object)
 
 
+    @defer.inlineCallbacks
+    def test_pull_update_negotiated(self):
+
+        # Must make the repo persistent to compare the result
+        self.repo1.persistent = True
+
+        # Record the blobs requested by the pulls
+        requested = []
+        rpc_send = self.proc2.rpc_send
+        def recording_rpc_send(recv, operation, content, *args, **kwargs):
+            if operation == 'fetch_blobs':
+                requested.extend(content.blob_keys)
+            return rpc_send(recv, operation, content, *args, **kwargs)
+        self.patch(self.proc2, 'rpc_send', recording_rpc_send)
+
+        result = yield self.proc2.workbench.pull(self.proc1.id.full, self.repo1.repository_key, negotiate=True)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        # A clone gets the head content with the commits in a plain pull
+        self.assertEqual(requested, [])
+
+        repo2 = self.proc2.workbench.get_repository(self.repo1.repository_key)
+        ab = yield repo2.checkout('master')
+        self.assertEqual(self.repo1.root_object, repo2.root_object)
+
+        # update and commit an new head object
+        self.repo1.root_object.title = 'New Addressbook'
+        self.repo1.commit('An updated addressbook')
+
+        result = yield self.proc2.workbench.pull(self.proc1.id.full, self.repo1.repository_key, negotiate=True)
+        self.assertEqual(result.MessageResponseCode, result.ResponseCodes.OK)
+
+        # Only the new root object was missing - the people did not change
+        self.assertEqual(requested, [self.repo1.root_object.MyId])
+
+        ab = yield repo2.checkout('master')
+        self.assertEqual(self.repo1.commit_head, repo2.commit_head)
+        self.assertEqual(self.repo1.root_object, repo2.root_object)
+
+
     @defer.inlineCallbacks
     def test_pull_branch(self):
 
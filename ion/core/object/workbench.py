@@ -10,6 +10,7 @@ Caching mechanisms are now in place. Consider changing the cache size test to lo
 but throw out repositories from the _repo_cache to clear it - that would be better!
 """
 import base64
+import json
 
 from twisted.internet import defer
 
@@ -39,6 +40,9 @@ from ion.util.cache import LRUDict
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 
+from ion.core import ioninit
+CONF = ioninit.config(__name__)
+
 
 STRUCTURE_ELEMENT_TYPE = object_utils.create_type_identifier(object_id=1, version=1)
 STRUCTURE_TYPE = object_utils.create_type_identifier(object_id=2, version=1)
@@ -83,7 +87,7 @@ class WorkBenchError(ApplicationError):
 
 class WorkBench(object):
     
-    def __init__(self, process, cache_size=10**7):
+    def __init__(self, process, cache_size=10**7, blob_cache_size=None):
     
         self._process = process
 
@@ -98,9 +102,12 @@ class WorkBench(object):
 
 
         """
-        A cache - shared between repositories for hashed objects
-        """  
-        self._workbench_cache = weakref.WeakValueDictionary()
+        A cache - shared between repositories for hashed objects. Objects no repository holds are kept up to
+        blob_cache_size bytes.
+        """
+        if blob_cache_size is None:
+            blob_cache_size = CONF.getValue('blob_cache_size', 10**7)
+        self._workbench_cache = repository.BlobCache(int(blob_cache_size))
 
         #@TODO Consider using an index store in the Workbench to keep a cache of associations and keep track of objects
 
@@ -109,7 +116,11 @@ class WorkBench(object):
         Debugging string method.
         '''
         retstr = "/ ==== Workbench info (id:%s) ==========\n" % id(self)
+        blob_stats = self._workbench_cache.stats()
         retstr += "++ Workbench Blob Cache, (len:%d)\n" % len(self._workbench_cache)
+        retstr += "\tweak tier: items %(items)d, bytes %(bytes)d, hits %(hits)d\n" % blob_stats['weak']
+        retstr += "\tstrong tier: items %(items)d, bytes %(bytes)d, limit %(limit)d, hits %(hits)d, retained %(retained)d\n" % blob_stats['strong']
+        retstr += "\tmisses %d\n" % blob_stats['misses']
         #for k,v in self._workbench_cache.iteritems():
         #    retstr += "\t%s: %s\n" % (base64.encodestring(k)[0:-1], '')
 
@@ -117,7 +128,7 @@ class WorkBench(object):
         for k, v in self._repos.iteritems():
             retstr += "\t%s: ih %d, cached %s, persistent %s, conv %s\n" %(k, len(v.index_hash), v.cached, v.persistent, v.convid_context)
 
-        retstr += "++ LRU RepoCache, (len:%d)\n" % len(self._repo_cache.keys())
+        retstr += "++ LRU RepoCache, (len:%d, bytes %d, limit %d)\n" % (len(self._repo_cache.keys()), self._repo_cache.total_size, self._repo_cache.limit)
         for k, v in self._repo_cache.iteritems():
             retstr += "\t%s: ih %d, cached %s, persistent %s,conv %s\n" %(k, len(v.index_hash), v.cached, v.persistent, v.convid_context)
 
@@ -243,6 +254,31 @@ class WorkBench(object):
 
         return repo
         
+    def holds_repository(self, key):
+        """
+        True if a repository for the key is in use in the workbench. The repositories kept in the LRU repository
+        cache after a request are not in use.
+        """
+        rkey = self._repository_nicknames.get(key, key)
+        return rkey in self._repos
+
+    def cache_stats(self):
+        """
+        @returns    A dictionary of the counters and usage of the blob cache tiers and the repository cache.
+        """
+        stats = self._workbench_cache.stats()
+        stats['repositories'] = {'items':len(self._repo_cache.keys()),
+                                 'bytes':self._repo_cache.total_size,
+                                 'limit':self._repo_cache.limit,
+                                 'persistent':len(self._repos)}
+        return stats
+
+    def op_get_workbench_stats(self, request, headers, msg):
+        """
+        Replies with the dictionary of workbench cache counters from cache_stats.
+        """
+        return self._process.reply_ok(msg, self.cache_stats())
+
     def list_repositories(self):
         """
         Simple list tool for repository names - not sure this will exist?
@@ -454,9 +490,13 @@ class WorkBench(object):
 
 
     @defer.inlineCallbacks
-    def pull(self, origin, repo_name, get_head_content=True, excluded_types=None):
+    def pull(self, origin, repo_name, get_head_content=True, excluded_types=None, negotiate=None):
         """
         Pull the current state of the repository
+
+        If negotiate is True (default from the pull_negotiation config value) and the repository is already in this
+        workbench, the head content is not sent with the commits. Only the objects below the heads which are not
+        already held in this workbench are fetched.
         """
 
         log.info('pull - start')
@@ -489,13 +529,18 @@ class WorkBench(object):
         if excluded_types is not None:
             repo.excluded_types = excluded_types        # @TODO: update instead of replace?
 
+        if negotiate is None:
+            negotiate = CONF.getValue('pull_negotiation', False)
+        # Nothing is held for a new repository - get all the head content with the commits
+        negotiate = get_head_content and negotiate and not cloning
+
         # Create pull message
         pullmsg = yield self._process.message_client.create_instance(PULL_MESSAGE_TYPE)
         pullmsg.repository_key = repo.repository_key
-        pullmsg.get_head_content = get_head_content
+        pullmsg.get_head_content = get_head_content and not negotiate
         pullmsg.commit_keys.extend(commit_list)
 
-        if get_head_content:
+        if pullmsg.get_head_content:
             for extype in repo.excluded_types:
                 exobj = pullmsg.excluded_types.add()
                 exobj.object_id = extype.object_id
@@ -530,39 +575,224 @@ class WorkBench(object):
             raise WorkBenchError('Invalid response to pull request. Bad Message Type!')
         
 
-        if result.IsFieldSet('blob_elements') and not get_head_content:
+        if result.IsFieldSet('blob_elements') and not pullmsg.get_head_content:
             raise WorkBenchError('Unexpected response to pull request: included blobs but I did not ask for them.')
 
 
+        self._merge_pull_response(repo, result)
+
+        # Where to get objects not yet transfered.
+        repo.upstream = targetname
+
+        if negotiate:
+            yield self._fetch_head_content(repo, targetname)
+
+        log.info('pull - complete')
+
+        defer.returnValue(result)
+
+    def _merge_pull_response(self, repo, response):
+        """
+        Move the commits and blobs of a pull response into the repository and update it to the new head.
+        """
         # Add any new content to the repository:
-        for se in result.commit_elements:
+        for se in response.commit_elements:
 
             # Move over new commits
             element = gpb_wrapper.StructureElement(se.GPBMessage)
 
             repo.index_hash[element.key] = element
 
-        for se in result.blob_elements:
+        for se in response.blob_elements:
             # Move over any blobs
             element = gpb_wrapper.StructureElement(se.GPBMessage)
             repo.index_hash[element.key] = element
 
         # Move over the new head object
-        head_element = gpb_wrapper.StructureElement(result.repo_head_element.GPBMessage)
+        head_element = gpb_wrapper.StructureElement(response.repo_head_element.GPBMessage)
+        self._merge_head_element(repo, head_element)
+
+    def _merge_head_element(self, repo, head_element):
+        """
+        Load a serialized repository head and merge it into the state of the repository.
+        """
         new_head = repo._load_element(head_element)
         new_head.Modified = True
         new_head.MyId = repo.new_id()
-        
+
         # Now merge the state!
         self._update_repo_to_head(repo,new_head)
 
+    def load_repository(self, repository_key, head_element, elements, upstream=None):
+        """
+        Create a repository in the workbench from a serialized head (see serialize_mutable) and the structure
+        elements of its commits and content. A repository with the same key in the repository cache is replaced, but
+        one in use is not - it may be held by a caller and have changes which would be lost.
+        @param elements an iterable of the structure elements
+        @param upstream where to get objects which are not in elements
+        """
+        if self.holds_repository(repository_key):
+            raise WorkBenchError('Can not load repository "%s" - the workbench holds it in use' % repository_key)
 
-        # Where to get objects not yet transfered.
-        repo.upstream = targetname
+        if repository_key in self._repo_cache:
+            del self._repo_cache[repository_key]
 
-        log.info('pull - complete')
+        repo = repository.Repository(repository_key=repository_key, cached=True)
+        self.put_repository(repo)
 
-        defer.returnValue(result)
+        for element in elements:
+            repo.index_hash[element.key] = element
+
+        self._merge_head_element(repo, head_element)
+
+        repo.upstream = upstream
+
+        return repo
+
+    @defer.inlineCallbacks
+    def multi_pull(self, origin, repo_names, excluded_types=None):
+        """
+        Pull the current state of several repositories with one request. Objects shared by the repositories are only
+        sent once.
+        @param excluded_types the types not to pull - applied to all of the repositories
+        @retval a dictionary of the repository keys which could not be pulled and the reason
+        """
+        log.info('multi_pull - start')
+
+        if excluded_types is not None and not hasattr(excluded_types, '__iter__'):
+            raise WorkBenchError('Invalid excluded_types argument passed to multi_pull')
+
+        targetname = self._process.get_scoped_name('system', origin)
+
+        request = yield self._process.message_client.create_instance(BLOBS_MESSAGE_TYPE)
+
+        repos = []
+        cloned = set()
+        for repo_name in repo_names:
+            if not isinstance(repo_name, (str, unicode)):
+                raise TypeError('Invalid argument (repo_names) type to workbench multi_pull. Should be a list of strings, received: "%s"' % type(repo_name))
+
+            repo = self.get_repository(repo_name)
+
+            commit_list = []
+            if repo is None:
+                repo = repository.Repository(repository_key=repo_name, cached=True)
+                self.put_repository(repo)
+                cloned.add(repo_name)
+            else:
+                commit_list = self.list_repository_commits(repo)
+
+            if excluded_types is not None:
+                repo.excluded_types = excluded_types
+
+            pullmsg = request.CreateObject(PULL_MESSAGE_TYPE)
+            pullmsg.repository_key = repo.repository_key
+            pullmsg.get_head_content = True
+            pullmsg.commit_keys.extend(commit_list)
+
+            for extype in repo.excluded_types:
+                exobj = pullmsg.excluded_types.add()
+                exobj.object_id = extype.object_id
+                exobj.version = extype.version
+
+            link = request.blob_elements.add()
+            link.SetLink(pullmsg)
+
+            repos.append(repo)
+
+        try:
+            result, headers, msg = yield self._process.rpc_send(targetname, 'multi_pull', request)
+        except ReceivedApplicationError, re:
+
+            log.info('ReceivedApplicationError: %s', re)
+
+            for repo in repos:
+                if repo.repository_key in cloned:
+                    self.clear_repository(repo)
+
+            raise WorkBenchError('Multi Pull Operation failed "%s"' % str(re))
+
+        if not hasattr(result, 'MessageType') or result.MessageType != BLOBS_MESSAGE_TYPE:
+            raise WorkBenchError('Invalid response to multi pull request. Bad Message Type!')
+
+        if len(result.blob_elements) != len(repos):
+            raise WorkBenchError('Invalid response to multi pull request. Expected %d pull responses, received %d!' % (len(repos), len(result.blob_elements)))
+
+        # The datastore reports why each repository could not be pulled
+        errors = {}
+        if result.MessageResponseBody:
+            try:
+                errors = json.loads(result.MessageResponseBody)
+            except ValueError:
+                log.warn('multi_pull - could not read the errors in the response: "%s"', result.MessageResponseBody)
+
+        failed = {}
+        for repo, response in zip(repos, result.blob_elements):
+
+            if not response.IsFieldSet('repo_head_element'):
+                failed[repo.repository_key] = str(errors.get(repo.repository_key, 'Repository Key Not Found!'))
+                if repo.repository_key in cloned:
+                    self.clear_repository(repo)
+                continue
+
+            self._merge_pull_response(repo, response)
+
+            # Where to get objects not yet transfered.
+            repo.upstream = targetname
+
+        log.info('multi_pull - complete: %d repositories, %d failed', len(repos), len(failed))
+
+        defer.returnValue(failed)
+
+    @defer.inlineCallbacks
+    def _fetch_head_content(self, repo, address):
+        """
+        Fetch the objects below the head commits of a repository which are not held in this workbench. The held
+        objects are walked through all levels of the structure before the missing ones are requested, so there is
+        one request per level of missing objects rather than per level of the structure. Objects of the
+        repository's excluded types are not fetched.
+        """
+        excluded_types = repo.excluded_types
+        pending = [cref.GetLink('objectroot').key for cref in repo.current_heads()]
+        found = set(pending)
+        fetched_count = 0
+
+        def add_children(element):
+            if element.isleaf:
+                return
+            for link in repo._load_element(element).ChildLinks:
+                if link.key not in found and link.type.GPBMessage not in excluded_types:
+                    found.add(link.key)
+                    pending.append(link.key)
+
+        while pending:
+
+            missing = []
+            while pending:
+                key = pending.pop()
+                element = repo.index_hash.get(key)
+                if element is None:
+                    missing.append(key)
+                else:
+                    # Walk down the held content now - its missing children go in the same request
+                    add_children(element)
+
+            if not missing:
+                break
+
+            blobs_request = yield self._process.message_client.create_instance(BLOBS_REQUSET_MESSAGE_TYPE)
+            blobs_request.blob_keys.extend(missing)
+
+            blobs_msg, headers, msg = yield self._process.rpc_send(address, 'fetch_blobs', blobs_request)
+
+            for se in blobs_msg.blob_elements:
+                element = gpb_wrapper.StructureElement(se.GPBMessage)
+                repo.index_hash[element.key] = element
+                add_children(element)
+
+            fetched_count += len(missing)
+
+        log.info('Fetched %d of %d head content objects for repository "%s"', fetched_count, len(found), repo.repository_key)
 
 
 
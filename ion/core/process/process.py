@@ -17,13 +17,14 @@ import StringIO
 
 import logging
 import ion.util.ionlog
+from ion.util.ionlog import lazy
 log = ion.util.ionlog.getLogger(__name__)
 
 from ion.core import ioninit
 from ion.core.exception import ReceivedError, ApplicationError, ReceivedApplicationError, ReceivedContainerError
 from ion.core.id import Id
 from ion.core.intercept.interceptor import Interceptor
-from ion.core.messaging.receiver import ProcessReceiver
+from ion.core.messaging.receiver import ProcessReceiver, forget_conversation_context
 from ion.core.messaging.message_client import MessageClient, MessageInstance
 
 from ion.core.process.cprocess import IContainerProcess, ContainerProcess
@@ -144,11 +145,14 @@ class Process(BasicLifecycleObject):
                                     group=self.proc_group,
                                     process=self,
                                     handler=self.receive,
-                                    error_handler=self.receive_error)
+                                    error_handler=self.receive_error,
+                                    prefetch_count=self.spawn_args.get('prefetch_count', None),
+                                    max_concurrent_handlers=self.spawn_args.get('max_concurrent_handlers', None))
 
         # Create a backend receiver for outgoing RPC process interactions.
         # Needed to avoid deadlock when processing incoming messages
-        # because only one message can be consumed before ACK.
+        # because only one message can be consumed before ACK. Replies are
+        # never held back by a limit on concurrent handlers.
         self.backend_id = Id(self.id.local+"b", self.id.container)
         self.backend_receiver = ProcessReceiver(
                                     label=self.proc_name,
@@ -156,7 +160,8 @@ class Process(BasicLifecycleObject):
                                     group=self.proc_group,
                                     process=self,
                                     handler=self.receive,
-                                    error_handler=self.receive_error)
+                                    error_handler=self.receive_error,
+                                    max_concurrent_handlers=0)
 
         # Dict of all receivers of this process. Key is the name
         self.receivers = {}
@@ -191,8 +196,8 @@ class Process(BasicLifecycleObject):
         self._plcc_pub = ProcessLifecycleEventPublisher(origin=self.id.full, process=self)
         self.add_life_cycle_object(self._plcc_pub)
 
-        log.debug("NEW Process instance [%s]: id=%s, sup-id=%s, sys-name=%s" % (
-                self.proc_name, self.id, self.proc_supid, self.sys_name))
+        log.debug("NEW Process instance [%s]: id=%s, sup-id=%s, sys-name=%s",
+                self.proc_name, self.id, self.proc_supid, self.sys_name)
 
     # --- Life cycle management
     # Categories:
@@ -222,7 +227,7 @@ class Process(BasicLifecycleObject):
         @retval Deferred for the Id of the process (self.id)
         """
         assert not self.backend_receiver.consumer, "Process already initialized"
-        log.debug('Process [%s] id=%s initialize()' % (self.proc_name, self.id))
+        log.debug('Process [%s] id=%s initialize()', self.proc_name, self.id)
 
         # Create queue only for process receiver
         yield self.receiver.initialize()
@@ -242,9 +247,9 @@ class Process(BasicLifecycleObject):
         try:
             #import pdb; pdb.set_trace()
             yield defer.maybeDeferred(self.plc_init)
-            log.info('Process [%s] id=%s: INIT OK' % (self.proc_name, self.id))
+            log.info('Process [%s] id=%s: INIT OK', self.proc_name, self.id)
         except Exception, ex:
-            log.exception('----- Process %s INIT ERROR -----' % (self.id))
+            log.exception('----- Process %s INIT ERROR -----', self.id)
             raise ex
 
         if len(self._registered_life_cycle_objects) > pre_init_lco_len:
@@ -281,7 +286,7 @@ class Process(BasicLifecycleObject):
         LifeCycleObject callback for activate
         @retval Deferred
         """
-        log.debug('Process [%s] id=%s activate()' % (self.proc_name, self.id))
+        log.debug('Process [%s] id=%s activate()', self.proc_name, self.id)
 
         # Create consumer for process receiver
         yield self.receiver.activate()
@@ -297,7 +302,7 @@ class Process(BasicLifecycleObject):
         try:
             yield defer.maybeDeferred(self.plc_activate)
         except Exception, ex:
-            log.exception('----- Process %s ACTIVATE ERROR -----' % (self.id))
+            log.exception('----- Process %s ACTIVATE ERROR -----', self.id)
             raise ex
 
         if len(self._registered_life_cycle_objects) > pre_active_lco_len:
@@ -314,7 +319,7 @@ class Process(BasicLifecycleObject):
         """
 
     def shutdown(self):
-        log.debug("[%s] shutdown()" % self.proc_name)
+        log.debug("[%s] shutdown()", self.proc_name)
         return self.terminate()
 
     @defer.inlineCallbacks
@@ -375,7 +380,7 @@ class Process(BasicLifecycleObject):
         yield self.shutdown_child_procs()
 
         yield defer.maybeDeferred(self.plc_terminate)
-        log.info('----- Process %s TERMINATED -----' % (self.proc_name))
+        log.info('----- Process %s TERMINATED -----', self.proc_name)
 
     def plc_terminate(self):
         """
@@ -397,7 +402,7 @@ class Process(BasicLifecycleObject):
                 log.debug("Error terminating registered LCOs, ignoring...")
 
         if cause:
-            log.error("Process error: %s" % cause)
+            log.error("Process error: %s", cause)
             pass
         else:
             raise RuntimeError("Illegal process state change")
@@ -496,7 +501,7 @@ class Process(BasicLifecycleObject):
         transitions = [BasicStates.E_INITIALIZE,    BasicStates.E_ACTIVATE,     BasicStates.E_TERMINATE]
 
         curidx = states.index(curstate)
-        log.debug("_advance_lco owning process (%s) is in state %s" % (self.id.full, curstate))
+        log.debug("_advance_lco owning process (%s) is in state %s", self.id.full, curstate)
 
         @defer.inlineCallbacks
         def helper(idx, lco):
@@ -507,12 +512,12 @@ class Process(BasicLifecycleObject):
             LCOs that happen to be later in the registered list.
             """
             lcoidx = states.index(lco._get_state())
-            log.debug("_advance_lco cur lco #%d is in state %s" % (idx, lco._get_state()))
+            log.debug("_advance_lco cur lco #%d is in state %s", idx, lco._get_state())
 
             for i in range(lcoidx, curidx):
                 input = transitions[i]
 
-                log.debug("_advance_lco cur lco #%d about to put transition %s to %s" % (idx, input, str(lco)))
+                log.debug("_advance_lco cur lco #%d about to put transition %s to %s", idx, input, lco)
                 try:
                     yield defer.maybeDeferred(lco._so_process, input)
 
@@ -520,10 +525,10 @@ class Process(BasicLifecycleObject):
                     # @TODO: should not be catching this exception.
                     # This should cause the deferred gen'd by inlineCallbacks to errback, which then gets wrapped
                     # nicely by the deferred list. It should not throw an exception in the state object?!?
-                    log.debug("Exception occured in transition! Leaving this LCO as is. Ex: %s" % str(ex))
+                    log.debug("Exception occured in transition! Leaving this LCO as is. Ex: %s", ex)
                     break
 
-                log.debug("lco #%d is now at %s" % (idx, lco._get_state()))
+                log.debug("lco #%d is now at %s", idx, lco._get_state())
 
             defer.returnValue(None)
 
@@ -556,7 +561,7 @@ class Process(BasicLifecycleObject):
                 request.user_id = payload.get('user-id')
                 _action = 'set user_id'
             else:
-                log.debug('[%s] receive(): payload anonymous request' % (self.proc_name))
+                log.debug('[%s] receive(): payload anonymous request', self.proc_name)
                 if request.get('user_id', 'Not set') == 'Not set':
                     request.user_id = 'ANONYMOUS'
                     _action = 'set ANONYMOUS user_id'
@@ -576,15 +581,15 @@ class Process(BasicLifecycleObject):
                     _action = _action + "/keep stashed expiry='%s'" % request.get('expiry')
             _post_exp = request.get('expiry')
 
-            log.debug("[%s] receive(): IN:user-id='%s',expiry='%s' ACTION:%s SET:user-id='%s',expiry='%s'" % (
-                self.proc_name, _pre_uid, _pre_exp, _action, _post_uid, _post_exp))
+            log.debug("[%s] receive(): IN:user-id='%s',expiry='%s' ACTION:%s SET:user-id='%s',expiry='%s'",
+                self.proc_name, _pre_uid, _pre_exp, _action, _post_uid, _post_exp)
 
             # Extract some headers and make log statement.
             fromname = payload['sender']
             if 'sender-name' in payload:
                 fromname = payload['sender-name']   # Legible sender alias
-            log.info('>>> [%s] receive(): Message from [%s] ... >>>' % (
-                     self.proc_name, fromname))
+            log.info('>>> [%s] receive(): Message from [%s] ... >>>',
+                     self.proc_name, fromname)
             convid = payload.get('conv-id', None)
             protocol = payload.get('protocol', None)
 
@@ -674,8 +679,8 @@ class Process(BasicLifecycleObject):
             # In case of an application error - do not terminate the process!
             if log.getEffectiveLevel() <= logging.INFO:    # only output all this stuff when debugging
                 log.exception("*****Non Conversation Application error in message processing*****")
-                log.error('*** Message Payload which cause the error: \n%s' % pu.pprint_to_string(payload))
-                log.error('*** Message Content: \n%s' % str(payload.get('content', '## No Content! ##')))
+                log.error('*** Message Payload which cause the error: \n%s', pu.pprint_to_string(payload))
+                log.error('*** Message Content: \n%s', payload.get('content', '## No Content! ##'))
                 log.error("*****End Non Conversation Application error in message processing*****")
 
             # @todo Should we send an err or rather reject the msg?
@@ -687,9 +692,9 @@ class Process(BasicLifecycleObject):
             # *** PROBLEM. Here the conversation is in ERROR state
 
             log.exception("*****Non Conversation Application error in message processing*****")
-            log.error('*** Message Payload which cause the error: \n%s' % pu.pprint_to_string(payload))
+            log.error('*** Message Payload which cause the error: \n%s', pu.pprint_to_string(payload))
             if log.getEffectiveLevel() <= logging.WARN:
-                log.error('*** Message Content: \n%s' % str(payload.get('content', '## No Content! ##')))
+                log.error('*** Message Content: \n%s', payload.get('content', '## No Content! ##'))
             log.error("*****End Non Conversation Application error in message processing*****")
 
             # @todo Should we send an err or rather reject the msg?
@@ -740,7 +745,7 @@ class Process(BasicLifecycleObject):
         """
         The method called if operation callback handler is not existing
         """
-        log.error('Process does not define op=%s' % headers.get('op',None))
+        log.error('Process does not define op=%s', headers.get('op',None))
 
     # --- Standard conversation type support: RPC, Request
 
@@ -752,8 +757,8 @@ class Process(BasicLifecycleObject):
         rpc_conv.bind_role_local(RpcType.ROLE_INITIATOR.role_id, self)
         rpc_conv.bind_role(RpcType.ROLE_PARTICIPANT.role_id, recv)
 
-        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s" % (
-                self.proc_name, rpc_conv.protocol, recv))
+        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s",
+                self.proc_name, rpc_conv.protocol, recv)
 
         if headers is None:
             headers = {}
@@ -777,8 +782,8 @@ class Process(BasicLifecycleObject):
         req_conv.bind_role_local(RequestType.ROLE_INITIATOR.role_id, self)
         req_conv.bind_role(RequestType.ROLE_PARTICIPANT.role_id, receiver)
 
-        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s" % (
-                self.proc_name, req_conv.protocol, receiver))
+        log.debug("[%s] request(): NEW conversation type=%s as initiator -> participant=%s",
+                self.proc_name, req_conv.protocol, receiver)
 
         if headers is None:
             headers = {}
@@ -805,17 +810,22 @@ class Process(BasicLifecycleObject):
 
         # Create a new deferred that the caller can yield on to wait for RPC
         conv.blocking_deferred = defer.Deferred()
+        # Replies are received in the context of the request until the conversation is done or timed out
+        def _forget_context(result):
+            forget_conversation_context(conv.conv_id)
+            return result
+        conv.blocking_deferred.addBoth(_forget_context)
         # Timeout handling
         timeout = float(kwargs.get('timeout', CF_rpc_timeout))
         def _timeoutf():
-            log.warn("Process %s RPC conv-id=%s timed out! " % (self.proc_name,conv.conv_id))
-            p_headers = pu.pprint_to_string(headers)
-            p_content = pu.pprint_to_string(content)
+            log.warn("Process %s RPC conv-id=%s timed out! ", self.proc_name,conv.conv_id)
+            p_headers = lazy(pu.pprint_to_string, headers)
+            p_content = lazy(pu.pprint_to_string, content)
 
-            log.info('Timedout Message Receive: %s' % recv)
-            log.info('Timedout Message Headers: %s' % p_headers)
-            log.info('Timedout Message Operation: %s' % operation)
-            log.info('Timedout Message Content: %s' % p_content)
+            log.info('Timedout Message Receive: %s', recv)
+            log.info('Timedout Message Headers: %s', p_headers)
+            log.info('Timedout Message Operation: %s', operation)
+            log.info('Timedout Message Content: %s', p_content)
 
             # Remove RPC. Delayed result will go to catch operation
             conv.timeout = str(pu.currenttime_ms())
@@ -864,14 +874,14 @@ class Process(BasicLifecycleObject):
 
         if not 'user-id' in msgheaders:
             msgheaders['user-id'] = request.get('user_id', 'ANONYMOUS')
-            log.debug('[%s] send(): set user id in msgheaders from stashed user_id [%s]' % (self.proc_name, msgheaders['user-id']))
+            log.debug('[%s] send(): set user id in msgheaders from stashed user_id [%s]', self.proc_name, msgheaders['user-id'])
         else:
-            log.debug('[%s] send(): using user id from msgheaders [%s]' % (self.proc_name, msgheaders['user-id']))
+            log.debug('[%s] send(): using user id from msgheaders [%s]', self.proc_name, msgheaders['user-id'])
         if not 'expiry' in msgheaders:
             msgheaders['expiry'] = request.get('expiry', '0')
-            log.debug('[%s] send(): set expiry in msgheaders from stashed expiry [%s]' % (self.proc_name, msgheaders['expiry']))
+            log.debug('[%s] send(): set expiry in msgheaders from stashed expiry [%s]', self.proc_name, msgheaders['expiry'])
         else:
-            log.debug('[%s] send(): using expiry from msgheaders [%s]' % (self.proc_name, msgheaders['expiry']))
+            log.debug('[%s] send(): using expiry from msgheaders [%s]', self.proc_name, msgheaders['expiry'])
 
         if quiet:
             msgheaders['quiet'] = True
@@ -915,7 +925,7 @@ class Process(BasicLifecycleObject):
 
             res = res1
         except Exception, ex:
-            log.exception("ERROR [%s] send() in FSM - Message not sent" % self.proc_name)
+            log.exception("ERROR [%s] send() in FSM - Message not sent", self.proc_name)
             raise ex
 
         defer.returnValue(res)
@@ -1092,13 +1102,13 @@ class Process(BasicLifecycleObject):
     @defer.inlineCallbacks
     def shutdown_child_procs(self):
         if len(self.child_procs) > 0:
-            log.info("Shutting down %s child processes" % (len(self.child_procs)))
+            log.info("Shutting down %s child processes", len(self.child_procs))
         while len(self.child_procs) > 0:
             child = self.child_procs.pop()
             try:
                 res = yield self.shutdown_child(child)
             except Exception, ex:
-                log.exception("Error terminating child %s" % child.proc_id)
+                log.exception("Error terminating child %s", child.proc_id)
 
 
     def shutdown_child(self, childproc):
@@ -1267,7 +1277,7 @@ class ProcessDesc(BasicLifecycleObject):
                 node=self.proc_node,
                 activate=activate)
 
-        log.info("Process %s ID: %s" % (self.proc_class, self.proc_id))
+        log.info("Process %s ID: %s", self.proc_class, self.proc_id)
 
         defer.returnValue(self.proc_id)
 
@@ -1293,7 +1303,7 @@ class ProcessDesc(BasicLifecycleObject):
 
     def on_error(self, cause=None, *args, **kwargs):
         if cause:
-            log.error("ProcessDesc error: %s" % cause)
+            log.error("ProcessDesc error: %s", cause)
             pass
         else:
             raise RuntimeError("Illegal state change for ProcessDesc")
@@ -54,6 +54,11 @@ class ServiceProcess(Process):
         self.svc_name = self.spawn_args.get('servicename', default_svcname)
         assert self.svc_name, "Service must have a declare with a valid name"
 
+        # Flow control of the service name receiver - spawn args take precedence
+        # over the service declaration, None uses the receiver configuration
+        prefetch_count = self.spawn_args.get('prefetch_count', self.declare.get('prefetch_count', None))
+        max_concurrent_handlers = self.spawn_args.get('max_concurrent_handlers', self.declare.get('max_concurrent_handlers', None))
+
         # Create a receiver (inbound queue consumer) for service name
         self.svc_receiver = ServiceWorkerReceiver(
                 label=self.svc_name+'.'+self.receiver.label,
@@ -62,7 +67,9 @@ class ServiceProcess(Process):
                 group=self.receiver.group,
                 process=self, # David added this - is it a good idea?
                 handler=self.receive,
-                error_handler=self.receive_error)
+                error_handler=self.receive_error,
+                prefetch_count=prefetch_count,
+                max_concurrent_handlers=max_concurrent_handlers)
         self.add_receiver(self.svc_receiver)
 
     @defer.inlineCallbacks
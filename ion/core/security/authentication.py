@@ -53,6 +53,34 @@ class Authentication(object):
         sig = pkey.sign_final()
         return sig
 
+    def load_private_key(self, rsa_private_key):
+        """
+        parse a PEM private key, for sign_digest
+        """
+        return EVP.load_key_string(rsa_private_key).get_rsa()
+
+    def load_certificate_key(self, certificate):
+        """
+        parse the public key of a PEM certificate, for verify_digest
+        """
+        return X509.load_cert_string(certificate).get_pubkey().get_rsa()
+
+    def sign_digest(self, digest, rsa_key):
+        """
+        take the SHA1 digest of a message and a parsed private key, and return the binary signature sign_message
+        makes of the message
+        """
+        return rsa_key.sign(digest, 'sha1')
+
+    def verify_digest(self, digest, rsa_public_key, signed_message):
+        """
+        verify the signature of a message given its SHA1 digest and the parsed public key of the certificate
+        """
+        try:
+            return rsa_public_key.verify(digest, signed_message, 'sha1') == 1
+        except RSA.RSAError:
+            return False
+
     def verify_message_hex(self, message, certificate, signed_message_hex):
         """
         verify a hex encoded signature for a message
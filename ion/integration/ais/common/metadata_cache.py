@@ -70,6 +70,11 @@ LCS = 'lcs'
 UPDATE_INTERVAL_SECONDS = 'update_interval_seconds'
 VISUALIZATION_URL = 'visualization_url'
 
+#
+# Number of resources pulled from the datastore per request when loading the cache
+#
+GET_INSTANCES_BATCH_SIZE = 50
+
 class MetadataCache(object):
     
     #
@@ -117,13 +122,17 @@ class MetadataCache(object):
         log.debug('Found ' + str(numDSets) + ' datasets.')
 
         yield self.__lockCache()
-        
-        i = 0
-        while (i < numDSets):
-            yield self.__putDSetMetadata(dSetResults.idrefs[i].key)
-            i = i + 1
 
-        self.__unlockCache()
+        try:
+            # Get the datasets from the datastore in batches
+            dSets, errors = yield self.__getInstances([idref.key for idref in dSetResults.idrefs])
+            for dSetID, error in errors.items():
+                log.error('Error getting dataset instance for datasetID: %s: %s', dSetID, error)
+
+            for dSet in dSets.values():
+                yield self.__loadDSetMetadata(dSet)
+        finally:
+            self.__unlockCache()
             
         defer.returnValue(True)
 
@@ -149,16 +158,44 @@ class MetadataCache(object):
         log.debug('Found ' + str(numDSources) + ' datasources.')
 
         yield self.__lockCache()
-        
-        i = 0
-        while (i < numDSources):
-            yield self.__putDSourceMetadata(dSourceResults.idrefs[i].key)
-            i = i + 1
 
-        self.__unlockCache()
+        try:
+            # Get the datasources from the datastore in batches
+            dSources, errors = yield self.__getInstances([idref.key for idref in dSourceResults.idrefs])
+            for dSourceID, error in errors.items():
+                log.error('Error getting datasource instance for datasourceID: %s: %s', dSourceID, error)
+
+            for dSource in dSources.values():
+                self.__loadDSourceMetadata(dSource)
+        finally:
+            self.__unlockCache()
             
         defer.returnValue(True)
 
+    @defer.inlineCallbacks
+    def __getInstances(self, resourceIDs):
+        """
+        Get resource instances with one request per GET_INSTANCES_BATCH_SIZE
+        resources. A batch which fails is reported as an error for each of
+        its resources; the other batches are still loaded.
+        """
+        instances = {}
+        errors = {}
+        for start in range(0, len(resourceIDs), GET_INSTANCES_BATCH_SIZE):
+            batch = resourceIDs[start:start + GET_INSTANCES_BATCH_SIZE]
+            try:
+                batchInstances, batchErrors = yield self.rc.get_instances(batch)
+            except ResourceClientError, ex:
+                for resourceID in batch:
+                    errors[resourceID] = str(ex)
+                continue
+
+            instances.update(batchInstances)
+            errors.update(batchErrors)
+
+        defer.returnValue((instances, errors))
+
+
     @defer.inlineCallbacks
     def getDSet(self, dSetID):
         """
@@ -10,6 +10,7 @@ there but resource types are not...
 
 """
 import math
+import json
 from ion.core.object.object_utils import CDM_ARRAY_INT32_TYPE, CDM_ARRAY_INT64_TYPE, CDM_ARRAY_UINT64_TYPE, CDM_ARRAY_FLOAT32_TYPE, CDM_ARRAY_FLOAT64_TYPE, CDM_ARRAY_STRING_TYPE, CDM_ARRAY_OPAQUE_TYPE, CDM_ARRAY_UINT32_TYPE, ARRAY_STRUCTURE_TYPE
 from ion.util.cache import LRUDict
 
@@ -17,12 +18,19 @@ import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 from twisted.internet import defer
 
+try:
+    import numpy
+except ImportError:
+    # numpy is optional - op_extract_data falls back to plain python lists without it
+    numpy = None
+
 import ion.util.procutils as pu
 from ion.core.process.process import ProcessFactory
 from ion.core.process.service_process import ServiceProcess, ServiceClient
 from ion.core.exception import ReceivedError, ApplicationError
 
 from ion.services.coi.resource_registry import resource_client
+from ion.services.coi.hyperslab import HyperslabPlan
 
 from types import FunctionType
 
@@ -34,6 +42,9 @@ from ion.core.data import cassandra
 #from ion.core.data import cassandra_bootstrap
 from ion.core.data.store import Query
 
+from ion.services.dm.distribution.events import DatastorePushEventPublisher, OwnershipChangeEventPublisher
+from ion.services.dm.distribution.publisher_subscriber import PublisherFactory
+
 
 from ion.core.data.storage_configuration_utility import BLOB_CACHE, COMMIT_CACHE
 from ion.core.data.storage_configuration_utility import COMMIT_INDEXED_COLUMNS
@@ -69,13 +80,30 @@ RESOURCE_TYPE = object_utils.create_type_identifier(object_id=1102, version=1)
 
 CDM_BOUNDED_ARRAY_TYPE = object_utils.create_type_identifier(object_id=10021, version=1)
 
+# Map from the object_id of the fixed width CDM array types to the numpy dtype used to extract them.
+# String and opaque arrays are not in the map and are always extracted as python lists.
+NUMPY_DTYPES = {}
+if numpy is not None:
+    NUMPY_DTYPES = {CDM_ARRAY_INT32_TYPE.object_id : numpy.int32,
+                    CDM_ARRAY_UINT32_TYPE.object_id : numpy.uint32,
+                    CDM_ARRAY_INT64_TYPE.object_id : numpy.int64,
+                    CDM_ARRAY_UINT64_TYPE.object_id : numpy.uint64,
+                    CDM_ARRAY_FLOAT32_TYPE.object_id : numpy.float32,
+                    CDM_ARRAY_FLOAT64_TYPE.object_id : numpy.float64}
+
+def ndarray_bytes(bounds, itembytes):
+    """
+    Calculates the size in bytes of an ndarray from the bounds of its bounded array.
+    """
+    return reduce(lambda x,y:x*y, [x.size for x in bounds], 1) * itembytes
+
 class NDArrayWrap(object):
     """
     Helper object which wraps an ndarray GPB object.
     The NDArrayWrap is designed to be stored in an LRUDict, as it exposes __sizeof__, clear, and
     a property to load/retrieve the ndarray's value.
     """
-    def __init__(self, key, repo, bounds, itembytes, getblobs):
+    def __init__(self, key, repo, bounds, itembytes, getblobs, dtype=None, buffer_cache=None):
         """
         Constructor. Needs references to several pieces of information to correctly get an ndarray
         and calculate its size.
@@ -85,19 +113,29 @@ class NDArrayWrap(object):
         @param  bounds      The bounds of the ndarray. Used to calc size.
         @param  itembytes   Number of bytes per item. Based on the array's data type.
         @param  getblobs    A reference to the workbench's _get_blobs callable.
+        @param  dtype       The numpy dtype used to decode the ndarray for the buffer property. Optional.
+        @param  buffer_cache    An NDArrayBufferCache of decoded buffers shared across requests. Optional.
         """
         self._key = key
         self._repo = repo
         self._getblobs = getblobs
+        self._dtype = dtype
+        self._buffer_cache = buffer_cache
 
         self._ndarray = None
-        self._size = reduce(lambda x,y:x*y, [x.size for x in bounds]) * itembytes
+        self._buffer = None
+        self._size = ndarray_bytes(bounds, itembytes)
+
+        # deferreds waiting on a load in progress
+        self._loading = None
 
     def __sizeof__(self):
         """
-        Returns the calculated size of this ndarray.
+        Returns the calculated size of this ndarray, and of its decoded buffer once there is one.
         """
-        return self._size
+        if self._buffer is None:
+            return self._size
+        return self._size + self._buffer.nbytes
 
     def clear(self):
         """
@@ -109,22 +147,78 @@ class NDArrayWrap(object):
         if self._repo.index_hash.has_key(self._key):
             del self._repo.index_hash[self._key]
 
+    def load(self):
+        """
+        Starts loading the ndarray from the datastore, unless it is already loaded or loading.
+        Concurrent callers share a single fetch.
+
+        @returns    A deferred which fires with the loaded ndarray object.
+        """
+        if self._ndarray is not None:
+            return defer.succeed(self._ndarray)
+
+        waiter = defer.Deferred()
+        if self._loading is None:
+            self._loading = [waiter]
+
+            d = self._getblobs(self._repo, [self._key], lambda x: True)
+            d.addCallback(self._load_complete)
+            d.addErrback(self._load_failed)
+        else:
+            self._loading.append(waiter)
+
+        return waiter
+
+    def _load_complete(self, ndblobs):
+        self._repo.index_hash.update(ndblobs)
+        self._ndarray = self._repo._load_element(self._repo.index_hash[self._key])
+
+        waiting, self._loading = self._loading, None
+        for waiter in waiting:
+            waiter.callback(self._ndarray)
+
+    def _load_failed(self, failure):
+        # a later load will try again
+        waiting, self._loading = self._loading, None
+        for waiter in waiting:
+            waiter.errback(failure)
+
     @defer.inlineCallbacks
     def _get_value(self):
         """
         Loads/retrieves an ndarray. Lazy-loads the ndarray from the datastore. Access this via
         the value property.
         """
-        if self._ndarray is None:
-            ndblobs = yield self._getblobs(self._repo, [self._key], lambda x: True)
-            self._repo.index_hash.update(ndblobs)
-
-            self._ndarray = self._repo._load_element(self._repo.index_hash[self._key])
+        ndarray = yield self.load()
 
-        defer.returnValue(self._ndarray.value)
+        defer.returnValue(ndarray.value)
 
     value = property(_get_value)
 
+    @defer.inlineCallbacks
+    def _get_buffer(self):
+        """
+        Loads/retrieves the ndarray decoded into a typed numpy buffer. The GPB content is decoded only
+        once, later calls and later requests sharing the buffer cache return the same buffer. Access this
+        via the buffer property.
+        """
+        if self._buffer is None and self._buffer_cache is not None:
+            self._buffer = self._buffer_cache.get_buffer(self._key)
+
+        if self._buffer is None:
+            ndarray = yield self.load()
+
+            # decode straight from the GPB repeated field - no intermediate list
+            values = ndarray.GPBMessage.value
+            self._buffer = numpy.fromiter(values, dtype=self._dtype, count=len(values))
+
+            if self._buffer_cache is not None:
+                self._buffer_cache.put_buffer(self._key, self._buffer)
+
+        defer.returnValue(self._buffer)
+
+    buffer = property(_get_buffer)
+
 class NDArrayLRUDict(LRUDict):
     """
     Custom least-recently-used dictionary cache object for holding NDarrays.
@@ -133,31 +227,241 @@ class NDArrayLRUDict(LRUDict):
     Should only store NDArrayWrap objects. This derived class is mainly to provide a
     helper method to get an ndarray whether it exists in the cache, is loaded, anything.
     """
-    def __init__(self, limit, repo):
+    def __init__(self, limit, repo, buffer_cache=None):
         """
         Constructor. Sets repo ref, initializes LRUDict with use_size set to true.
+
+        @param  buffer_cache    An NDArrayBufferCache of decoded buffers shared across requests. Optional.
         """
         self._repo = repo
+        self._buffer_cache = buffer_cache
 
         LRUDict.__init__(self, limit, use_size=True)
 
-    @defer.inlineCallbacks
-    def get_ndarray_value(self, key, bounds, itembytes, getblobs):
+    def _get_wrap(self, key, bounds, itembytes, getblobs, dtype=None):
         """
-        Gets an ndarray's value, whether that ndarray is loaded, in the cache, or what have you.
-        Even if the ndarray is actually too large to store in the cache, it will still give you
-        back the ndarray object to work with this one time.
+        Gets the NDArrayWrap for a key, creating it and adding it to the cache if needed.
         """
         if not self.has_key(key):
-            ndarray = NDArrayWrap(key, self._repo, bounds, itembytes, getblobs)
+            ndarray = NDArrayWrap(key, self._repo, bounds, itembytes, getblobs, dtype, self._buffer_cache)
             self[key] = ndarray
             log.debug("LRUDict loading, item size %d, lru now %d items %d bytes total" % (ndarray._size, len(self.keys()), self.total_size))
         else:
             ndarray = self.get(key)
+            if ndarray._dtype is None:
+                ndarray._dtype = dtype
+
+        return ndarray
+
+    def prefetch(self, key, bounds, itembytes, getblobs, dtype=None, reserved=0):
+        """
+        Starts loading an ndarray into the cache without waiting for it.
+
+        @param  reserved    Bytes of the cache that must not be evicted to make room for this ndarray.
+        @returns            False if the ndarray does not fit in the cache next to the reserved bytes.
+        """
+        if self.has_key(key):
+            # touch it so it is not the next thing evicted
+            self.get(key)
+            return True
+
+        if self._buffer_cache is not None and self._buffer_cache.has_key(key):
+            # already decoded by an earlier request - nothing to load
+            return True
+
+        if reserved + ndarray_bytes(bounds, itembytes) > self.limit:
+            return False
+
+        ndarray = self._get_wrap(key, bounds, itembytes, getblobs, dtype)
+
+        def prefetch_failed(failure):
+            # not fatal - the extraction loads it again when it gets there and reports the error then
+            log.warn('Prefetch of ndarray failed: %s' % failure.getErrorMessage())
+
+        ndarray.load().addErrback(prefetch_failed)
+        return True
+
+    @defer.inlineCallbacks
+    def get_ndarray_value(self, key, bounds, itembytes, getblobs):
+        """
+        Gets an ndarray's value, whether that ndarray is loaded, in the cache, or what have you.
+        Even if the ndarray is actually too large to store in the cache, it will still give you
+        back the ndarray object to work with this one time.
+        """
+        ndarray = self._get_wrap(key, bounds, itembytes, getblobs)
 
         value = yield ndarray.value
         defer.returnValue(value)
 
+    @defer.inlineCallbacks
+    def get_ndarray_buffer(self, key, bounds, itembytes, getblobs, dtype):
+        """
+        Same as get_ndarray_value, but gives back the ndarray decoded into a numpy buffer of the given dtype.
+        """
+        ndarray = self._get_wrap(key, bounds, itembytes, getblobs, dtype)
+
+        buf = yield ndarray.buffer
+
+        # the size of an ndarray grows by its buffer - put it back to count it
+        if self.has_key(key) and self.d[key].size != ndarray.__sizeof__():
+            self[key] = ndarray
+
+        defer.returnValue(buf)
+
+class NDArrayBlockCache(LRUDict):
+    """
+    Service wide least-recently-used cache of ndarray structure elements, bounded by size in bytes.
+    Shared by all extract_data and get_object requests to the datastore.
+
+    Keys are the sha1 of the element content, so an entry can never go stale and nothing is ever invalidated.
+    Elements bigger than max_fraction of the cache are not admitted so one huge array can not flush everything else.
+    """
+
+    # object ids of the CDM array types which are held in the cache
+    NDARRAY_TYPE_IDS = set([CDM_ARRAY_INT32_TYPE.object_id,
+                            CDM_ARRAY_UINT32_TYPE.object_id,
+                            CDM_ARRAY_INT64_TYPE.object_id,
+                            CDM_ARRAY_UINT64_TYPE.object_id,
+                            CDM_ARRAY_FLOAT32_TYPE.object_id,
+                            CDM_ARRAY_FLOAT64_TYPE.object_id,
+                            CDM_ARRAY_STRING_TYPE.object_id,
+                            CDM_ARRAY_OPAQUE_TYPE.object_id])
+
+    def __init__(self, limit, max_fraction=0.25):
+        """
+        @param  limit           Size of the cache in bytes.
+        @param  max_fraction    Largest element admitted to the cache, as a fraction of limit.
+        """
+        LRUDict.__init__(self, limit, use_size=True)
+
+        self.max_item_size = int(self.limit * max_fraction)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def purge(self):
+        count = len(self.d)
+        LRUDict.purge(self)
+        self.evictions += count - len(self.d)
+
+    def lookup(self, key):
+        """
+        Gets an element from the cache, counting a hit if it is there.
+        A miss is only counted when an ndarray fetched from the store is offered to the cache.
+
+        @returns    The StructureElement or None.
+        """
+        element = self.get(key)
+        if element is not None:
+            self.hits += 1
+        return element
+
+    def offer(self, element):
+        """
+        Offers an element fetched from the blob store to the cache. Only ndarrays within the admission size are kept.
+
+        @returns    True if the element was added to the cache.
+        """
+        if element.type.object_id not in self.NDARRAY_TYPE_IDS:
+            return False
+
+        self.misses += 1
+
+        if element.__sizeof__() > self.max_item_size:
+            self.rejections += 1
+            return False
+
+        self[element.key] = element
+        return True
+
+    def stats(self):
+        """
+        @returns    A dictionary of the cache counters and usage.
+        """
+        return {'hits':self.hits,
+                'misses':self.misses,
+                'evictions':self.evictions,
+                'rejections':self.rejections,
+                'items':len(self.d),
+                'bytes':self.total_size,
+                'limit':self.limit}
+
+class NDArrayBufferCache(LRUDict):
+    """
+    Service wide least-recently-used cache of ndarrays decoded into numpy buffers, bounded by size in bytes.
+    Shared by all extract_data requests so an array read by many requests is only decoded once.
+
+    Keys are the sha1 of the ndarray element, so an entry can never go stale. The buffers are shared and made
+    read only. Buffers bigger than max_fraction of the cache are not admitted.
+    """
+
+    class Entry(object):
+        __slots__ = ['buffer']
+
+        def __init__(self, buffer):
+            self.buffer = buffer
+
+        def __sizeof__(self):
+            return self.buffer.nbytes
+
+    def __init__(self, limit, max_fraction=0.25):
+        """
+        @param  limit           Size of the cache in bytes.
+        @param  max_fraction    Largest buffer admitted to the cache, as a fraction of limit.
+        """
+        LRUDict.__init__(self, limit, use_size=True)
+
+        self.max_item_size = int(self.limit * max_fraction)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def purge(self):
+        count = len(self.d)
+        LRUDict.purge(self)
+        self.evictions += count - len(self.d)
+
+    def get_buffer(self, key):
+        """
+        @returns    The decoded buffer of the ndarray or None.
+        """
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.buffer
+
+    def put_buffer(self, key, buffer):
+        """
+        Offers a decoded buffer to the cache.
+
+        @returns    True if the buffer was added to the cache.
+        """
+        if buffer.nbytes > self.max_item_size:
+            self.rejections += 1
+            return False
+
+        buffer.setflags(write=False)
+        self[key] = self.Entry(buffer)
+        return True
+
+    def stats(self):
+        """
+        @returns    A dictionary of the cache counters and usage.
+        """
+        return {'hits':self.hits,
+                'misses':self.misses,
+                'evictions':self.evictions,
+                'rejections':self.rejections,
+                'items':len(self.d),
+                'bytes':self.total_size,
+                'limit':self.limit}
+
 class DataStoreWorkBenchError(WorkBenchError):
     """
     An Exception class for errors in the data store workbench
@@ -166,13 +470,27 @@ class DataStoreWorkBenchError(WorkBenchError):
 class DataStoreWorkbench(WorkBench):
 
 
-    def __init__(self, process, blob_store, commit_store, cache_size=10**8):
+    def __init__(self, process, blob_store, commit_store, cache_size=10**8, ndarray_cache_size=5*10**7, ndarray_cache_max_fraction=0.25, ndarray_buffer_cache_size=5*10**7):
 
         WorkBench.__init__(self, process, cache_size)
 
         self._blob_store = blob_store
         self._commit_store = commit_store
 
+        # ndarray blocks shared across requests
+        self._ndarray_cache = NDArrayBlockCache(ndarray_cache_size, ndarray_cache_max_fraction)
+
+        # ndarrays decoded by extract_data, shared across requests
+        self._buffer_cache = None
+        if numpy is not None:
+            self._buffer_cache = NDArrayBufferCache(ndarray_buffer_cache_size, ndarray_cache_max_fraction)
+
+        # Set by the service to publish an event for each repository which receives new commits in a push
+        self.push_publisher = None
+
+        # Set by the service to publish an event for each resource whose ownership associations change in a push
+        self.ownership_publisher = None
+
 
     def pull(self, *args, **kwargs):
 
@@ -204,12 +522,18 @@ class DataStoreWorkbench(WorkBench):
         while len(keys_to_get) > 0:
             new_links_to_get = set()
 
-            def_list = []
+            fetch_keys = []
             #@TODO - put some error checking here so that we don't overflow due to a stupid request!
             for key in keys_to_get:
                 # Short cut if we have already got it!
                 wse = repo.index_hash.get(key)
 
+                if wse is None:
+                    # Next best thing - a popular ndarray from the shared cache
+                    wse = self._ndarray_cache.lookup(key)
+                    if wse is not None:
+                        repo.index_hash[wse.key] = wse
+
                 if wse:
                     blobs[wse.key]=wse
                     # get the object
@@ -218,21 +542,24 @@ class DataStoreWorkbench(WorkBench):
                     # only add new items to get if they meet our criteria, meaning they are not in the excluded type list
                     new_links_to_get.update(obj.ChildLinks)
                 else:
-                    def_list.append(self._blob_store.get(key))
+                    fetch_keys.append(key)
 
 
-            result_list = []
-            if def_list:
-                result_list = yield defer.DeferredList(def_list)
+            fetched = {}
+            if fetch_keys:
+                # One batched round trip for this level of the tree
+                fetched = yield self._blob_store.multi_get(fetch_keys)
 
-            for result, blob in result_list:
-                assert result==True, 'Error getting link from blob store!'
+            for key, blob in fetched.iteritems():
+                assert blob is not None, 'Error getting link from blob store!'
                 wse = gpb_wrapper.StructureElement.parse_structure_element(blob)
                 blobs[wse.key]=wse
 
                 # Add it to the repository index
                 repo.index_hash[wse.key] = wse
 
+                self._ndarray_cache.offer(wse)
+
                 # load the object so we can find its children
                 obj = repo._load_element(wse)
 
@@ -245,9 +572,21 @@ class DataStoreWorkbench(WorkBench):
 
         defer.returnValue(blobs)
 
+    def op_get_cache_stats(self, request, headers, msg):
+        """
+        Replies with a dictionary of the shared ndarray cache counters. The counters of the decoded buffer cache have
+        the prefix 'buffer_', they are missing without numpy.
+        """
+        stats = self._ndarray_cache.stats()
+        if self._buffer_cache is not None:
+            for name, value in self._buffer_cache.stats().items():
+                stats['buffer_' + name] = value
+        return self._process.reply_ok(msg, stats)
+
     @defer.inlineCallbacks
-    def _resolve_repo_state(self, repository_key, fail_if_not_found=True):
+    def _resolve_repo_state(self, repository_key, fail_if_not_found=True, request=None):
         """
+        @param request the request message, required if fail_if_not_found - its NOT_FOUND response code is raised
         @returns Repo.
         """
 
@@ -276,7 +615,7 @@ class DataStoreWorkbench(WorkBench):
 
         if fail_if_not_found and len(rows) == 0:
             self.clear_repository(repo)
-            raise DataStoreWorkBenchError('Repository Key "%s" not found in Datastore' % repository_key, 404)   # @TODO: constant
+            raise DataStoreWorkBenchError('Repository Key "%s" not found in Datastore' % repository_key, request.ResponseCodes.NOT_FOUND)
 
         log.debug('Found %d commits in the store' % len(rows))
 
@@ -348,12 +687,25 @@ class DataStoreWorkbench(WorkBench):
         if not hasattr(request, 'MessageType') or request.MessageType != PULL_MESSAGE_TYPE:
             raise DataStoreWorkBenchError('Invalid pull request. Bad Message Type!', request.ResponseCodes.BAD_REQUEST)
 
-        repo = yield self._resolve_repo_state(request.repository_key)
+        repo = yield self._resolve_repo_state(request.repository_key, request=request)
         repo.cached = True
 
-        ####
-        # Back to boiler plate op_pull
-        ####
+        response = yield self._process.message_client.create_instance(PULL_RESPONSE_MESSAGE_TYPE)
+
+        yield self._fill_pull_response(repo, request, response, response)
+
+        yield self._process.reply_ok(msg, content=response)
+
+        log.info('op_pull: Complete!')
+
+
+    @defer.inlineCallbacks
+    def _fill_pull_response(self, repo, request, response, message):
+        """
+        Set the head, the commits the puller needs and the head content requested in a pull response.
+        @param message the message which holds the response
+        """
+        message_repository = message.Repository
 
         my_commits = self.list_repository_commits(repo)
 
@@ -361,21 +713,19 @@ class DataStoreWorkbench(WorkBench):
 
         puller_needs = set(my_commits).difference(puller_has)
 
-        response = yield self._process.message_client.create_instance(PULL_RESPONSE_MESSAGE_TYPE)
-
         # Create a structure element and put the serialized content in the response
         head_element = self.serialize_mutable(repo._dotgit)
         # Pull out the structure element and use it as the linked object in the message.
-        obj = response.Repository._wrap_message_object(head_element._element)
+        obj = message_repository._wrap_message_object(head_element._element)
 
         response.repo_head_element = obj
 
         for commit_key in puller_needs:
             commit_element = repo.index_hash.get(commit_key)
             if commit_element is None:
-                raise DataStoreWorkBenchError('Repository commit object not found in op_pull', request.ResponseCodes.NOT_FOUND)
+                raise DataStoreWorkBenchError('Repository commit object not found in op_pull', message.ResponseCodes.NOT_FOUND)
             link = response.commit_elements.add()
-            obj = response.Repository._wrap_message_object(commit_element._element)
+            obj = message_repository._wrap_message_object(commit_element._element)
             link.SetLink(obj)
 
         if request.get_head_content:
@@ -389,17 +739,63 @@ class DataStoreWorkbench(WorkBench):
                 """
                 return (x.type not in request.excluded_types)
 
-            blobs = yield self._get_blobs(response.Repository, keys, filtermethod)
+            blobs = yield self._get_blobs(message_repository, keys, filtermethod)
 
             for element in blobs.values():
                 link = response.blob_elements.add()
-                obj = response.Repository._wrap_message_object(element._element)
+                obj = message_repository._wrap_message_object(element._element)
 
                 link.SetLink(obj)
 
+    @defer.inlineCallbacks
+    def op_multi_pull(self, request, headers, msg):
+        """
+        The operation which responds to a pull of several repositories. The request is a blobs message which links a
+        pull message for each repository, the reply links a pull response for each in the same order. Objects
+        shared by the repositories are only sent once. The response for a repository which could not be pulled is
+        left empty and the reason is reported in the response body, a json map from repository key to error.
+        """
+
+        log.info('op_multi_pull!')
+
+        if not hasattr(request, 'MessageType') or request.MessageType != BLOBS_MESSAGE_TYPE:
+            raise DataStoreWorkBenchError('Invalid multi pull request. Bad Message Type!', request.ResponseCodes.BAD_REQUEST)
+
+        response = yield self._process.message_client.create_instance(BLOBS_MESSAGE_TYPE)
+
+        errors = {}
+        for pullmsg in request.blob_elements:
+
+            if pullmsg.ObjectType != PULL_MESSAGE_TYPE:
+                raise DataStoreWorkBenchError('Invalid multi pull request. Bad Pull Message Type!', request.ResponseCodes.BAD_REQUEST)
+
+            pull_response = response.CreateObject(PULL_RESPONSE_MESSAGE_TYPE)
+            try:
+                repo = yield self._resolve_repo_state(pullmsg.repository_key, request=request)
+                repo.cached = True
+
+                yield self._fill_pull_response(repo, pullmsg, pull_response, response)
+
+            except DataStoreWorkBenchError, ex:
+                log.info('op_multi_pull: could not pull repository "%s": %s', pullmsg.repository_key, ex)
+                errors[pullmsg.repository_key] = str(ex)
+                pull_response = response.CreateObject(PULL_RESPONSE_MESSAGE_TYPE)
+
+            except Exception, ex:
+                # Only this repository fails, the others are still pulled
+                log.exception('op_multi_pull: error pulling repository "%s"', pullmsg.repository_key)
+                errors[pullmsg.repository_key] = str(ex)
+                pull_response = response.CreateObject(PULL_RESPONSE_MESSAGE_TYPE)
+
+            link = response.blob_elements.add()
+            link.SetLink(pull_response)
+
+        if errors:
+            response.MessageResponseBody = json.dumps(errors)
+
         yield self._process.reply_ok(msg, content=response)
 
-        log.info('op_pull: Complete!')
+        log.info('op_multi_pull: Complete!')
 
 
 
@@ -560,24 +956,28 @@ class DataStoreWorkbench(WorkBench):
             self._update_repo_to_head(repo,new_head)
 
         # Put any new blobs
-        def_list = []
+        new_blobs = {}
         for key in new_blob_keys:
 
             element = self._workbench_cache.get(key)
 
-            def_list.append(self._blob_store.put(key, element.serialize()))
-        yield defer.DeferredList(def_list)
-        # @TODO - check the results - for what?
+            new_blobs[key] = element.serialize()
+        yield self._blob_store.batch_put(new_blobs)
 
 
         # now put any new commits that are not at the head
-        def_list = []
+        commit_values = {}
+        commit_attributes = {}
 
         # list of the keys which are no longer heads
         clear_head_list=[]
 
-        # list of the new heads to push at the same time
-        new_head_list=[]
+        # the resources whose ownership associations have new commits
+        owned_resources = set()
+
+        # the new heads to push at the same time
+        new_head_values = {}
+        new_head_attributes = {}
         for repo_key, commit_keys in new_commits.items():
             # Get the updated repository
             repo = self.get_repository(repo_key)
@@ -627,6 +1027,9 @@ class DataStoreWorkbench(WorkBench):
                     attributes[OBJECT_BRANCH] = cref.objectroot.object.branch
                     attributes[OBJECT_COMMIT] = cref.objectroot.object.commit
 
+                    if attributes[PREDICATE_KEY] == OWNED_BY_ID:
+                        owned_resources.add(attributes[SUBJECT_KEY])
+
                 elif root_type == RESOURCE_TYPE:
 
 
@@ -643,10 +1046,8 @@ class DataStoreWorkbench(WorkBench):
 
                 if key not in head_keys:
 
-                    defd = self._commit_store.put(key = key,
-                                       value = wse.serialize(),
-                                       index_attributes = attributes)
-                    def_list.append(defd)
+                    commit_values[key] = wse.serialize()
+                    commit_attributes[key] = attributes
 
                 else:
 
@@ -662,7 +1063,8 @@ class DataStoreWorkbench(WorkBench):
 
 
 
-                    new_head_list.append({'key':key, 'value':wse.serialize(), 'index_attributes':attributes})
+                    new_head_values[key] = wse.serialize()
+                    new_head_attributes[key] = attributes
 
             # Get the current head list
             q = Query()
@@ -678,16 +1080,9 @@ class DataStoreWorkbench(WorkBench):
                     # Any commit which is currently a head will have the correct branch names set.
                     # Just delete the branch names for the ones that are no longer heads.
 
-        yield defer.DeferredList(def_list)
-        #@TODO - check the return vals?
-
-        def_list = []
-        for new_head in new_head_list:
-
-            def_list.append(self._commit_store.put(**new_head))
+        yield self._commit_store.batch_put(commit_values, commit_attributes)
 
-        yield defer.DeferredList(def_list)
-        #@TODO - check the return vals?
+        yield self._commit_store.batch_put(new_head_values, new_head_attributes)
 
         def_list = []
         for key in clear_head_list:
@@ -700,6 +1095,21 @@ class DataStoreWorkbench(WorkBench):
         #print 'After update to heads'
         #pprint.pprint(self._commit_store.kvs)
 
+        if self.push_publisher is not None:
+            # Tell the association service (and anyone else listening) which repositories have new heads
+            def_list = []
+            for repo_key, commit_keys in new_commits.items():
+                if commit_keys:
+                    def_list.append(self.push_publisher.create_and_publish_event(origin=repo_key))
+            yield defer.DeferredList(def_list)
+
+        if self.ownership_publisher is not None:
+            # Tell the policy interceptors which resources may have a new owner
+            def_list = []
+            for resource_key in owned_resources:
+                def_list.append(self.ownership_publisher.create_and_publish_event(origin=resource_key))
+            yield defer.DeferredList(def_list)
+
 
         response = yield self._process.message_client.create_instance(MessageContentTypeID=None)
         response.MessageResponseCode = response.ResponseCodes.OK
@@ -714,11 +1124,11 @@ class DataStoreWorkbench(WorkBench):
         if not hasattr(request, 'MessageType') or request.MessageType != BLOBS_MESSAGE_TYPE:
             raise DataStoreWorkBenchError('Invalid put blobs request. Bad Message Type!', request.ResponseCodes.BAD_REQUEST)
 
-        def_list = []
+        blobs = {}
         for blob in request.blob_elements:
-            def_list.append(self._blob_store.put(blob.key, blob.SerializeToString() ))
+            blobs[blob.key] = blob.SerializeToString()
 
-        yield defer.DeferredList(def_list)
+        yield self._blob_store.batch_put(blobs)
 
         yield self._process.reply_ok(message)
         log.info("op_put_blobs: Complete!")
@@ -737,7 +1147,7 @@ class DataStoreWorkbench(WorkBench):
 
         response = yield self._process.message_client.create_instance(BLOBS_MESSAGE_TYPE)
 
-        def_list = []
+        fetch_keys = []
         for key in request.blob_keys:
             element = self._workbench_cache.get(key)
 
@@ -749,11 +1159,13 @@ class DataStoreWorkbench(WorkBench):
 
                 continue
 
-            def_list.append(self._blob_store.get(key))
+            fetch_keys.append(key)
 
-        res_list = yield defer.DeferredList(def_list)
+        fetched = {}
+        if fetch_keys:
+            fetched = yield self._blob_store.multi_get(fetch_keys)
 
-        for result, blob in res_list:
+        for blob in fetched.itervalues():
 
             if blob is None:
                 raise DataStoreWorkBenchError('Invalid fetch objects request. Key Not Found!', request.ResponseCodes.NOT_FOUND)
@@ -802,10 +1214,15 @@ class DataStoreWorkbench(WorkBench):
         """
 
         # This is simpler than a push - all of these are guaranteed to be new objects!
-        def_list = []
+        blobs = {}
         for key, element in repo.index_hash.items():
 
-            def_list.append(self._blob_store.put(key, element.serialize()))
+            blobs[key] = element.serialize()
+
+        def_list = [self._blob_store.batch_put(blobs)]
+
+        commit_values = {}
+        commit_attributes = {}
 
 
         # any objects in the data structure that were transmitted have already
@@ -861,14 +1278,7 @@ class DataStoreWorkbench(WorkBench):
             wse = self._workbench_cache.get(key)
 
 
-            if key not in head_keys:
-
-                defd = self._commit_store.put(key = key,
-                                   value = wse.serialize(),
-                                   index_attributes = attributes)
-                def_list.append(defd)
-
-            else:
+            if key in head_keys:
 
                 # We know it is a head - but we need to get the branch name again
                 for branch in  repo.branches:
@@ -880,12 +1290,11 @@ class DataStoreWorkbench(WorkBench):
                         else:
                             attributes[BRANCH_NAME] = ','.join([attributes[BRANCH_NAME],branch.branchkey])
 
+            commit_values[key] = wse.serialize()
+            commit_attributes[key] = attributes
 
-                # Now commit it!
-                defd = self._commit_store.put(key = key,
-                                   value = wse.serialize(),
-                                   index_attributes = attributes)
-                def_list.append(defd)
+        # Now commit them all!
+        def_list.append(self._commit_store.batch_put(commit_values, commit_attributes))
         return defer.DeferredList(def_list)
 
 
@@ -900,7 +1309,7 @@ class DataStoreWorkbench(WorkBench):
         q = Query()
         q.add_predicate_eq(REPOSITORY_KEY, repo_key)
 
-        rows = yield self._commit_store.query(q)
+        rows = yield self._commit_store.query(q, limit=1)
 
         defer.returnValue(len(rows)>0)
 
@@ -1045,292 +1454,205 @@ class DataStoreWorkbench(WorkBench):
         # @TODO: not needed for R1
 
         # ===================================================================
-        # STEP 3: Generate a list of matching strips from each BA
+        # STEP 3: Plan the extraction - one strided box per matching BA
         # ===================================================================
-        striplist = []
         strides = [x.stride or 1 for x in request.request_bounds]
 
-        for batuple in bounded_includes_list:
-            ba, targetranges, srcranges = batuple
-
-            # is this a scalar? is there anything to slice?
-            if len(targetshape) == 0:
-                striplist.append((ba, (0, 1), (0, 1), 1, 1))
-            else:
-                # get slices out of it
-                # get dims of this bounded array
-                ba_shape = [x.size for x in ba.bounds]
-
-                for targetslice, srcslice, laststridelen in self._get_slices(targetshape, ba_shape, targetranges, srcranges, strides):
-                    striplist.append((ba, targetslice, srcslice, targetslice[1]-targetslice[0], laststridelen))
-
-        log.debug("Number of uncompressed strips: %d" % len(striplist))
-
-        # ===================================================================
-        # STEP 4: Sort that list of matching strips by start index in target array to start index + length
-        # ===================================================================
-
-        sorted_striplist = sorted(striplist, lambda x, y: x[1][1] < y[1][0])
-
-        # ===================================================================
-        # STEP 5: Compress any contiguous strips from the same BAs
-        # ===================================================================
-        compressed_striplist = []
-        accumstrip = None
-        for stripitem in sorted_striplist:
-            ba, targetslice, srcslice, leng, laststridelen = stripitem
-
-            # check for end condition
-            if accumstrip and ba != accumstrip[0]:
-                # push current strip into compressed striplist
-                compressed_striplist.append(accumstrip)
-                accumstrip = None
-
-            # brand new strip, either after we just pushed or starting this loop
-            if accumstrip is None:
-                accumstrip = stripitem[:]
-                continue
-
-            # see if we have a contiguous strip
-            # - current item's source slice start index is the same as the accumulated strip's source end index
-            # - strides are the same (should always be, this is more sanity check)
-            # - the possible accumulated strip's total length is over the max size for chunking messages
-            if srcslice[0] == accumstrip[2][1] and \
-               laststridelen == accumstrip[4] and \
-               accumstrip[3] + leng <= CHUNK_FACTOR:
-                # update accumstrip
-                accumstrip = (accumstrip[0], (accumstrip[1][0], targetslice[1]), (accumstrip[2][0], srcslice[1]), srcslice[1] - accumstrip[2][0], accumstrip[4])
-            else:
-                # not contiguous?  push into list and forget it
-                compressed_striplist.append(accumstrip)
-                accumstrip = stripitem[:]
-
-        # catch the last one
-        if accumstrip is not None:
-            compressed_striplist.append(accumstrip)
+        plan = HyperslabPlan(targetshape, strides)
+        for ba, targetranges, srcranges in bounded_includes_list:
+            plan.add_bounded_array(ba, [x.size for x in ba.bounds], targetranges, srcranges)
 
-        log.debug("Number of compressed strips: %d" % len(compressed_striplist))
+        num_chunks = plan.chunk_count(CHUNK_FACTOR)
+        log.debug("Extraction plan: %d boxes, %d elements, %d chunks" % (len(plan.boxes), plan.size, num_chunks))
 
         # ===================================================================
-        # STEP 6: Generate a list of extractions using heuristics, an "extraction plan"
+        # STEP 4: Perform extractions, one chunk of contiguous target strips at a time
         # ===================================================================
 
-        # list of [list of indicies into compressed_striplist]
-        extraction_plan = []
-
-        # simple: relying on the LRU cache to free up BAs when done, and that datasets will be laid out in a sane
-        # variety fastest varying dimension will never be broken up over multiple BAs unless dimensionality is one,
-        # we can just assemble each step of the plan to be the maximum chunk size we can fit.
-        curstep = []
-        curlen = 0
-        for csidx, cstrip in enumerate(compressed_striplist):
+        # create a least-recently-used cache for ndarrays, using 5mb as the default max size
+        ndarray_cache = NDArrayLRUDict(LRU_DICT_LIMIT, repo, self._buffer_cache)
 
-            # always need at least one strip
-            if len(curstep) == 0:
-                curstep.append(csidx)
-                curlen += cstrip[3]
-                continue
+        # fixed width types are extracted with numpy, string and opaque arrays fall back to python lists
+        np_dtype = None
+        if len(bounded_includes_list) > 0:
+            np_dtype = NUMPY_DTYPES.get(bounded_includes_list[0][0].GetLink('ndarray').type.object_id)
+
+        # number of chunk messages that may be in flight at once, and how many ndarrays to load ahead of the
+        # chunk being extracted. A window of 1 and 0 gives the fully serial behavior.
+        SEND_WINDOW = max(int(CONF.getValue('extract_send_window', 4)), 1)
+        PREFETCH_WINDOW = int(CONF.getValue('extract_prefetch_window', 2))
+
+        # the ndarrays in the order the extraction first needs them
+        prefetch_list = []
+        prefetch_index = {}
+        for box in sorted(plan.boxes, key=lambda x: x.target_start):
+            ndarray_key = box.ba.GetLink('ndarray').key
+            if ndarray_key not in prefetch_index:
+                prefetch_index[ndarray_key] = len(prefetch_list)
+                prefetch_list.append((ndarray_key, box.ba.bounds))
+        prefetch_pos = 0
+
+        # deferreds of chunk messages which are still being sent
+        inflight = []
 
-            # can we fit the new strip?
-            if curlen + cstrip[3] <= CHUNK_FACTOR:
-                curstep.append(csidx)
-            else:
-                extraction_plan.append(curstep)
-                curstep = [csidx]
-                curlen = cstrip[3]
+        try:
+            for exidx, (targetstartidx, curstrips) in enumerate(plan.chunks(CHUNK_FACTOR)):
 
-        # catch any leftovers
-        if len(curstep) > 0:
-            extraction_plan.append(curstep)
+                # start loading the next ndarrays while this chunk is extracted and the earlier ones are sent
+                if PREFETCH_WINDOW > 0:
+                    chunk_keys = set([x[0].GetLink('ndarray').key for x in curstrips])
+                    prefetch_pos = self._prefetch_ndarrays(ndarray_cache, prefetch_list, prefetch_index, prefetch_pos,
+                                                           chunk_keys, PREFETCH_WINDOW, ITEM_SIZE, np_dtype)
 
-        # ===================================================================
-        # STEP 7: Perform extractions
-        # ===================================================================
+                # calculate number of elements we are going to output in this chunk
+                elemcount = reduce(lambda x, y: x+y, [x[3] for x in curstrips])
 
-        # create a least-recently-used cache for ndarrays, using 5mb as the default max size
-        ndarray_cache = NDArrayLRUDict(LRU_DICT_LIMIT, repo)
+                log.debug("Extraction step %d, # strips: %d, element count: %d, start index: %d" % (exidx, len(curstrips), elemcount, targetstartidx))
 
-        for exidx, exstep in enumerate(extraction_plan):
-            curstrips = []
-            for sidx in exstep:
-                curstrips.append(compressed_striplist[sidx])
+                if np_dtype is not None:
+                    targetndarray = yield self._extract_chunk_numpy(curstrips, elemcount, ndarray_cache, ITEM_SIZE, np_dtype)
+                else:
+                    targetndarray = yield self._extract_chunk_list(curstrips, elemcount, ndarray_cache, ITEM_SIZE)
 
-            # get the start index.. should be in the first item
-            targetstartidx = curstrips[0][1][0]
+                # SEND THIS CHUNK
 
-            # calculate number of elements we are going to output in this chunk, create temp storage for it
-            elemcount = reduce(lambda x, y: x+y, [x[3] for x in curstrips])
-            targetndarray = [None] * elemcount
+                # create new message to send
+                chunkmsg = yield self._process.message_client.create_instance(DATA_CHUNK_MESSAGE_TYPE)
+                chunkmsg.seq_number = exidx
+                chunkmsg.seq_max = num_chunks
 
-            log.debug("Extraction step %d, # strips: %d, element count: %d, start index: %d" % (exidx, len(curstrips), elemcount, targetstartidx))
+                # set info in this chunk
+                chunkmsg.start_index = targetstartidx
+                chunkmsg.done = exidx == num_chunks - 1       # last chunk message?  set the done flag
 
-            # ok, now we can perform the extractions on this step
-            for csidx, curstrip in enumerate(curstrips):
-                ba, targetidxs, srcidxs, leng, stride = curstrip
+                # create the ndarray in this chunk
+                chunkndarray = chunkmsg.CreateObject(curstrips[0][0].GetLink('ndarray').type)
 
-                # index into the current chunk data
-                striplen = leng
-                targetoffset = csidx * striplen
+                # these lines blow up with a TypeError if we screwed up the bounds and didn't fill in the targetarray fully,
+                # aka it contains Nones
+                chunkndarray.value[0:elemcount] = targetndarray
+                chunkmsg.ndarray = chunkndarray
 
-                # get/possibly load from ndarray_cache
-                ndobjval = yield ndarray_cache.get_ndarray_value(ba.GetLink('ndarray').key, ba.bounds, ITEM_SIZE, self._get_blobs)
+                # send this message to the passed in routing key
+                if chunkmsg.done:
+                    # the done flag must not overtake the rest of the data - drain the window first
+                    while inflight:
+                        yield inflight.pop(0)
 
-                srcslice = ndobjval[srcidxs[0]:srcidxs[1]]
-                if stride == 1:
-                    targetslice = srcslice
+                    yield self._send_data_chunk(request.data_routing_key, chunkmsg)
                 else:
-                    targetslice = [d for i, d in enumerate(srcslice) if i % stride == 0]
+                    inflight.append(self._send_data_chunk(request.data_routing_key, chunkmsg))
 
-                targetndarray[targetoffset:targetoffset+striplen] = targetslice
+                    # backpressure - do not extract the next chunk until the oldest send is complete
+                    if len(inflight) >= SEND_WINDOW:
+                        yield inflight.pop(0)
+        finally:
+            if inflight:
+                # an error stopped the extraction - wait for the sends already started and drop their errors,
+                # the first error is the one reported
+                yield defer.DeferredList(inflight, consumeErrors=True)
 
-            # ensure we filled this chunk
-            nonelist = [i for i,d in enumerate(targetndarray) if d is None]
-            if len(nonelist) > 0:
-                raise DataStoreWorkBenchError("Data extraction did not properly fill in all members of response ndarray!")
+        self._process.reply_ok(message, response)
+        log.info("/op_extract_data")
+        
+    def _prefetch_ndarrays(self, ndarray_cache, prefetch_list, prefetch_index, prefetch_pos, chunk_keys, window, itembytes, dtype):
+        """
+        Starts loading up to window ndarrays beyond the ones used by the current chunk. Prefetching stops early
+        if the next ndarray does not fit in the cache next to the ones in use and the ones already prefetched.
 
-            # SEND THIS CHUNK
+        @returns    The position in prefetch_list to continue prefetching from for the next chunk.
+        """
+        last = max([prefetch_index[key] for key in chunk_keys])
+        reserved = 0
+        for key in chunk_keys:
+            if ndarray_cache.has_key(key):
+                # touch the ndarrays in use so they are not evicted to make room
+                reserved += ndarray_cache.get(key).__sizeof__()
 
-            # create new message to send
-            chunkmsg = yield self._process.message_client.create_instance(DATA_CHUNK_MESSAGE_TYPE)
-            chunkmsg.seq_number = exidx
-            chunkmsg.seq_max = len(extraction_plan)
+        for key, bounds in prefetch_list[last + 1:prefetch_pos]:
+            reserved += ndarray_bytes(bounds, itembytes)
 
-            # set info in this chunk
-            chunkmsg.start_index = targetstartidx
-            chunkmsg.done = exidx == len(extraction_plan) - 1       # last chunk message?  set the done flag
+        pos = max(prefetch_pos, last + 1)
+        while pos < len(prefetch_list) and pos <= last + window:
+            key, bounds = prefetch_list[pos]
+            if not ndarray_cache.prefetch(key, bounds, itembytes, self._get_blobs, dtype, reserved):
+                break
 
-            # create the ndarray in this chunk
-            chunkndarray = chunkmsg.CreateObject(curstrips[0][0].GetLink('ndarray').type)
+            reserved += ndarray_bytes(bounds, itembytes)
+            pos += 1
 
-            # these lines blow up with a TypeError if we screwed up the bounds and didn't fill in the targetarray fully,
-            # aka it contains Nones
-            chunkndarray.value[0:elemcount] = targetndarray[:]
-            chunkmsg.ndarray = chunkndarray
+        return pos
 
-            # send this message to the passed in routing key
-            yield self._send_data_chunk(request.data_routing_key, chunkmsg)
-            
-        self._process.reply_ok(message, response)
-        log.info("/op_extract_data")
-        
     @defer.inlineCallbacks
-    def _send_data_chunk(self, data_routing_key, chunkmsg):
+    def _extract_chunk_numpy(self, curstrips, elemcount, ndarray_cache, itembytes, dtype):
         """
-        Sends a data chunk message (from op_extract_data).  This is split out to facilitate
-        testing via monkeypatching this method.
+        Extracts the strips of one extraction step into a preallocated numpy chunk. Each source ndarray
+        is decoded into a typed buffer once (and kept in the ndarray_cache), the strided strip is cut out
+        as a view and copied straight into the output chunk.
+
+        @returns    A list of the chunk's values, ready to be set on the chunk message's ndarray.
         """
-        log.debug("_send_data_chunk to %s" % data_routing_key)
-        yield self._process.send(data_routing_key, 'noop', chunkmsg)
+        targetndarray = numpy.empty(elemcount, dtype=dtype)
 
+        targetoffset = 0
+        for ba, targetidxs, srcidxs, leng, stride in curstrips:
 
-    def _double_xrange(self, start1, end1, start2, end2):
-        """
-        This is a method just like xrange, but it operates on two diff ranges at once.
-        Used by extract_data when mapping slice ranges for data extraction.
+            # get/possibly load from ndarray_cache
+            ndbuf = yield ndarray_cache.get_ndarray_buffer(ba.GetLink('ndarray').key, ba.bounds, itembytes, self._get_blobs, dtype)
 
-        @NOTE: This is a generator method, not to be confused with one that needs defer.inlineCallbacks decoration!
-        """
-        counter1 = start1
-        counter2 = start2
-        while counter1 < end1 and counter2 < end2:
-            yield (counter1, counter2)
+            # a strided view - no copy is made until it is assigned into the chunk
+            srcview = ndbuf[srcidxs[0]:srcidxs[1]:stride][:leng]
 
-            counter1 += 1
-            counter2 += 1
+            targetndarray[targetoffset:targetoffset+len(srcview)] = srcview
+            targetoffset += len(srcview)
 
-    def _get_slices(self, targetdimextents, srcdimextents, targetranges, srcranges, strides, targetidx=0, srcidx=0):
-        """
-        Returns a tuple of slice ranges (as tuples) that you can use to extract data from slices
-        inside an ndarray. This is used by extract_data.
+        # ensure we filled this chunk
+        if targetoffset != elemcount:
+            raise DataStoreWorkBenchError("Data extraction did not properly fill in all members of response ndarray!")
 
-        @NOTE: This is a generator method, not to be confused with one that needs defer.inlineCallbacks decoration!
+        defer.returnValue(targetndarray.tolist())
 
-        @param  targetdimextents    The dimensional extents of the target bounded array.
-        @param  srcdimextents       The dimensional extents of the source bounded array.
-        @param  targetranges        A list of tuples (one tuple per dimension), specifying a range in each
-                                    dimension that we are storing into.
-        @param  srcranges           A list of tuples (one tuple per dimension), specifying a range in each
-                                    dimension that we are pulling data out of.
-        @param  strides             A list of stride amounts for each dimension. Should be the same length
-                                    as targetranges/srcranges. The last dimension is not factored in here, but is
-                                    returned as the last member of the return tuple.
-        @param  targetidx           An accumulated index value into the target bounded array which gives the
-                                    current index calculated on each recursive call.
-        @param  srcidx              An accumulated index value into the source bounded array which gives the
-                                    current index calculated on each recursive call.
+    @defer.inlineCallbacks
+    def _extract_chunk_list(self, curstrips, elemcount, ndarray_cache, itembytes):
+        """
+        Extracts the strips of one extraction step into a python list. Used for string and opaque arrays,
+        and for all arrays when numpy is not available.
 
-        @returns                    On each yield, a tuple containing two tuples and an integer: a range to the target WITH
-                                    striding applied to all but the last dimension, a range to copy from the source WITHOUT
-                                    striding applied, and the stride length of the last dimension. 
+        @returns    A list of the chunk's values, ready to be set on the chunk message's ndarray.
         """
+        targetndarray = [None] * elemcount
 
-        # make sure we have sane things here
-        assert len(targetdimextents) == len(srcdimextents)
-        assert len(strides) == len(targetdimextents)
+        targetoffset = 0
+        for ba, targetidxs, srcidxs, leng, stride in curstrips:
 
-        # build index extent arrays
-        targetidxextents = [None] * len(targetdimextents)
-        srcidxextents = [None] * len(srcdimextents)
+            # get/possibly load from ndarray_cache
+            ndobjval = yield ndarray_cache.get_ndarray_value(ba.GetLink('ndarray').key, ba.bounds, itembytes, self._get_blobs)
 
-        targetidxextents[-1] = 1
-        srcidxextents[-1] = 1
+            srcslice = ndobjval[srcidxs[0]:srcidxs[1]]
+            if stride == 1:
+                targetslice = srcslice
+            else:
+                targetslice = [d for i, d in enumerate(srcslice) if i % stride == 0]
 
-        # reduce target dim extents to extents after applying stride
-        striddentargetextents = [targetdimextents[i]/strides[i] for i in xrange(len(targetdimextents))]
+            targetndarray[targetoffset:targetoffset+leng] = targetslice
+            targetoffset += leng
 
-        # calculate index extents into target array, using stridden extents
-        for x in range(len(targetidxextents)-2, -1, -1):
-            targetidxextents[x] = reduce(lambda x,y: x*y, striddentargetextents[x+1:])
+        # ensure we filled this chunk
+        nonelist = [i for i,d in enumerate(targetndarray) if d is None]
+        if len(nonelist) > 0:
+            raise DataStoreWorkBenchError("Data extraction did not properly fill in all members of response ndarray!")
 
-        # calculate index extents into source array
-        for x in range(len(srcidxextents)-2, -1, -1):
-            srcidxextents[x] = reduce(lambda x, y: x*y, srcdimextents[x+1:])
+        defer.returnValue(targetndarray)
 
-        def recslice(trs, srs, ts, ss, tstrides, cts=0, css=0, rc=0):
-            """
-            Recursive slice finder.
-            @param  trs     Target ranges.
-            @param  srs     Source ranges.
-            @param  ts      Target slice (last dimension).
-            @param  ss      Source slice (last dimension).
-            @param  tstrides List of strides in all dimensions.
-            @param  cts     Current target sum, aka index into target array.
-            @param  css     Current source sum, aka index into source array.
-            @param  rc      Recursion count, used to index into targetidxextents/srcidxextents.
-            """
-            if len(trs) == 0:
-                # exit case: traversed all dimensions, we're on the last dimension, extract our slices
-                yield ((cts+ts[0]/tstrides[0], cts+ts[1]/tstrides[0]),
-                       (css+ss[0], css+ss[1]),
-                       tstrides[0])
-            else:
-                # iterative case: look at current dimension, co-iterate over the ranges in target/src,
-                #                 recurse into recslice again one dimension up until we run out.
-                ctr = trs[0]
-                csr = srs[0]
-                cstride = tstrides[0]
-
-                for tv, sv in self._double_xrange(ctr[0], ctr[1], csr[0], csr[1]):
-                    if tv % cstride == 0:
-                        for xx in recslice(trs[1:],
-                                           srs[1:],
-                                           ts,
-                                           ss,
-                                           tstrides[1:],
-                                           cts+(tv * targetidxextents[rc]),     # calculate actual index offset here and pass it
-                                           css+(sv * srcidxextents[rc]),        # calculate actual index offset here and pass it
-                                           rc+1):
-                            yield xx
-                    else:
-                        log.debug("IGNOREING STRIDED OUT DIM tv/sv %d,%d len dims %d" % (tv, sv, len(trs)))
+    @defer.inlineCallbacks
+    def _send_data_chunk(self, data_routing_key, chunkmsg):
+        """
+        Sends a data chunk message (from op_extract_data).  This is split out to facilitate
+        testing via monkeypatching this method.
+        """
+        log.debug("_send_data_chunk to %s" % data_routing_key)
+        yield self._process.send(data_routing_key, 'noop', chunkmsg)
 
-        # iterate through all recslice generated slicepairs
-        for x in recslice(targetranges[:-1],
-                          srcranges[:-1],
-                          targetranges[-1],
-                          srcranges[-1],
-                          strides[:]):
-            yield x
 
     @defer.inlineCallbacks
     def op_get_object(self, request, headers, message):
@@ -1342,7 +1664,7 @@ class DataStoreWorkbench(WorkBench):
         response = yield self._process.message_client.create_instance(GET_OBJECT_REPLY_MESSAGE_TYPE)
 
         key = request.object_id.key
-        repo = yield self._resolve_repo_state(key)    # gets latest repo state from cassandra
+        repo = yield self._resolve_repo_state(key, request=request)    # gets latest repo state from cassandra
         assert repo
         repo.cached = True
 
@@ -1423,6 +1745,17 @@ class DataStoreService(ServiceProcess):
 
         self._cache_size = self.spawn_args.get('cache_size', CONF.getValue('cache_size', default=10**8))
 
+        # Size of the ndarray caches shared by all extract_data and get_object requests, and the largest array
+        # admitted to them as a fraction of that size
+        self._ndarray_cache_size = self.spawn_args.get('ndarray_cache_size', CONF.getValue('ndarray_cache_size', default=5*10**7))
+        self._ndarray_cache_max_fraction = self.spawn_args.get('ndarray_cache_max_fraction', CONF.getValue('ndarray_cache_max_fraction', default=0.25))
+
+        # Size of the cache of ndarrays decoded into numpy buffers by extract_data, in addition to ndarray_cache_size
+        self._ndarray_buffer_cache_size = self.spawn_args.get('ndarray_buffer_cache_size', CONF.getValue('ndarray_buffer_cache_size', default=5*10**7))
+
+        # Publish an event for each repository updated by a push - needed by the association graph
+        self._publish_push_events = self.spawn_args.get('publish_push_events', CONF.getValue('publish_push_events', default=False))
+
         self._backend_classes={}
 
         self._username = self.spawn_args.get("username", CONF.getValue("username", None))
@@ -1516,21 +1849,33 @@ class DataStoreService(ServiceProcess):
 
         
         log.info("Created stores")
-        self.workbench = DataStoreWorkbench(self, self.b_store, self.c_store, cache_size=self._cache_size)
+        self.workbench = DataStoreWorkbench(self, self.b_store, self.c_store, cache_size=self._cache_size,
+                                            ndarray_cache_size=self._ndarray_cache_size,
+                                            ndarray_cache_max_fraction=self._ndarray_cache_max_fraction,
+                                            ndarray_buffer_cache_size=self._ndarray_buffer_cache_size)
 
         yield self.initialize_datastore()
 
 
+    @defer.inlineCallbacks
     def slc_activate(self):
 
 
         self.op_fetch_blobs = self.workbench.op_fetch_blobs
         self.op_pull = self.workbench.op_pull
+        self.op_multi_pull = self.workbench.op_multi_pull
         self.op_push = self.workbench.op_push
         self.op_checkout = self.workbench.op_checkout
         self.op_put_blobs = self.workbench.op_put_blobs
         self.op_get_object = self.workbench.op_get_object
         self.op_extract_data = self.workbench.op_extract_data
+        self.op_get_cache_stats = self.workbench.op_get_cache_stats
+        self.op_get_workbench_stats = self.workbench.op_get_workbench_stats
+
+        if self._publish_push_events:
+            pub_factory = PublisherFactory(process=self)
+            self.workbench.push_publisher = yield pub_factory.build(publisher_type=DatastorePushEventPublisher)
+            self.workbench.ownership_publisher = yield pub_factory.build(publisher_type=OwnershipChangeEventPublisher)
 
 
     @defer.inlineCallbacks
@@ -1865,6 +2210,20 @@ class DataStoreClient(ServiceClient):
         (content, headers, msg) = yield self.rpc_send('extract_data', content)
         defer.returnValue(content)
 
+    @defer.inlineCallbacks
+    def get_cache_stats(self):
+        yield self._check_init()
+
+        (content, headers, msg) = yield self.rpc_send('get_cache_stats', None)
+        defer.returnValue(content)
+
+    @defer.inlineCallbacks
+    def get_workbench_stats(self):
+        yield self._check_init()
+
+        (content, headers, msg) = yield self.rpc_send('get_workbench_stats', None)
+        defer.returnValue(content)
+
 #    @defer.inlineCallbacks
 #    def get_preloaded_datasets_dict(self):
 #        """
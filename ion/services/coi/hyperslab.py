@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/coi/hyperslab.py
+@brief Closed form hyperslab planner used by the datastore's extract_data operation.
+
+The planner describes the part of each bounded array that falls inside a request as a single strided box:
+a start offset plus a count and a step per dimension, in both the source ndarray and the (strided) target
+array. Dimensions which are contiguous in both are merged, so a box is made of evenly spaced runs which
+are contiguous in the target. The plan only holds one box per bounded array - the runs are generated
+arithmetically when the data is extracted.
+"""
+
+import heapq
+
+
+def _product(values):
+    result = 1
+    for v in values:
+        result *= v
+    return result
+
+
+class HyperslabBox(object):
+    """
+    The strided box of data to copy from one bounded array into the target array.
+
+    All offsets and steps are flat element indices. The last dimension is always contiguous in the target,
+    its src step is the request stride in that dimension.
+    """
+
+    __slots__ = ['ba', 'target_start', 'src_start', 'counts', 'target_steps', 'src_steps']
+
+    def __init__(self, ba, target_start, src_start, counts, target_steps, src_steps):
+        self.ba = ba
+        self.target_start = target_start
+        self.src_start = src_start
+        self.counts = counts
+        self.target_steps = target_steps
+        self.src_steps = src_steps
+
+    @property
+    def size(self):
+        return _product(self.counts)
+
+    @property
+    def run_count(self):
+        return _product(self.counts[:-1])
+
+    def runs(self):
+        """
+        Generator of the runs in this box, in target order.
+
+        @returns    On each yield, a tuple of (target index, source index, length, source step).
+        """
+        length = self.counts[-1]
+        src_step = self.src_steps[-1]
+
+        outer = len(self.counts) - 1
+        if outer == 0:
+            yield (self.target_start, self.src_start, length, src_step)
+            return
+
+        # odometer over the outer dimensions - positions are updated incrementally
+        idx = [0] * outer
+        tpos = self.target_start
+        spos = self.src_start
+        while True:
+            yield (tpos, spos, length, src_step)
+
+            dim = outer - 1
+            while dim >= 0:
+                idx[dim] += 1
+                tpos += self.target_steps[dim]
+                spos += self.src_steps[dim]
+                if idx[dim] < self.counts[dim]:
+                    break
+
+                # roll this dimension back over and carry into the next one out
+                tpos -= self.target_steps[dim] * self.counts[dim]
+                spos -= self.src_steps[dim] * self.counts[dim]
+                idx[dim] = 0
+                dim -= 1
+            else:
+                return
+
+
+class HyperslabPlan(object):
+    """
+    Extraction plan for a hyperslab request over a set of bounded arrays.
+
+    Add each intersecting bounded array with add_bounded_array, then iterate chunks to get the strips
+    to copy for each data chunk message.
+    """
+
+    def __init__(self, targetshape, strides):
+        """
+        @param  targetshape     The size of the request in each dimension, before striding.
+        @param  strides         The stride of the request in each dimension.
+        """
+        assert len(targetshape) == len(strides)
+
+        self.strides = list(strides)
+
+        # number of elements in each dimension of the target after applying the stride
+        self.targetshape = [(size + stride - 1) / stride for size, stride in zip(targetshape, strides)]
+
+        # flat index extents of each dimension of the target array
+        self._target_extents = [_product(self.targetshape[x+1:]) for x in xrange(len(self.targetshape))]
+
+        self.boxes = []
+
+    @property
+    def size(self):
+        """
+        Number of target elements covered by the bounded arrays in the plan.
+        """
+        return sum([box.size for box in self.boxes])
+
+    @property
+    def target_size(self):
+        """
+        Number of elements in the strided target array.
+        """
+        return _product(self.targetshape)
+
+    def add_bounded_array(self, ba, ba_shape, target_ranges, src_ranges):
+        """
+        Computes the box of data to copy from a bounded array and adds it to the plan.
+
+        @param  ba              The bounded array object.
+        @param  ba_shape        The size of the bounded array in each dimension.
+        @param  target_ranges   A list of (start, end) tuples, one per dimension, of the intersection in request
+                                coordinates (relative to the request origin, before striding).
+        @param  src_ranges      A list of (start, end) tuples, one per dimension, of the same intersection in
+                                bounded array coordinates.
+
+        @returns    The box added to the plan, or None if the strides exclude all of the intersection.
+        """
+        assert len(ba_shape) == len(self.targetshape)
+
+        # scalars - a single element
+        if len(ba_shape) == 0:
+            box = HyperslabBox(ba, 0, 0, [1], [1], [1])
+            self.boxes.append(box)
+            return box
+
+        target_start = 0
+        src_start = 0
+        counts = []
+        target_steps = []
+        src_steps = []
+
+        for dim, (trange, srange, stride) in enumerate(zip(target_ranges, src_ranges, self.strides)):
+
+            # first index in the range that the stride selects
+            first = ((trange[0] + stride - 1) / stride) * stride
+            if first >= trange[1]:
+                return None
+
+            src_extent = _product(ba_shape[dim+1:])
+
+            counts.append((trange[1] - 1 - first) / stride + 1)
+            target_start += (first / stride) * self._target_extents[dim]
+            src_start += (srange[0] + first - trange[0]) * src_extent
+
+            target_steps.append(self._target_extents[dim])
+            src_steps.append(stride * src_extent)
+
+        # drop outer dimensions with a single entry - their offset is already in the start index
+        for dim in xrange(len(counts) - 2, -1, -1):
+            if counts[dim] == 1:
+                del counts[dim]
+                del target_steps[dim]
+                del src_steps[dim]
+
+        # merge the innermost dimensions while they are contiguous with the next one out in both arrays
+        while len(counts) > 1 and \
+              target_steps[-2] == counts[-1] * target_steps[-1] and \
+              src_steps[-2] == counts[-1] * src_steps[-1]:
+            counts[-2:] = [counts[-2] * counts[-1]]
+            del target_steps[-2]
+            del src_steps[-2]
+
+        box = HyperslabBox(ba, target_start, src_start, counts, target_steps, src_steps)
+        self.boxes.append(box)
+        return box
+
+    def runs(self):
+        """
+        Generator of the runs of all boxes in the plan, in target order.
+
+        @returns    On each yield, a tuple of (target index, source index, length, source step, box).
+        """
+        def box_runs(boxidx, box):
+            for tpos, spos, length, step in box.runs():
+                yield (tpos, spos, length, step, boxidx)
+
+        generators = [box_runs(boxidx, box) for boxidx, box in enumerate(self.boxes)]
+        for tpos, spos, length, step, boxidx in heapq.merge(*generators):
+            yield (tpos, spos, length, step, self.boxes[boxidx])
+
+    def chunks(self, chunk_size):
+        """
+        Generator which cuts the runs of the plan into chunks of at most chunk_size elements. A chunk is always
+        contiguous in the target - a new chunk is started where the bounded arrays leave a gap.
+
+        @returns    On each yield, a tuple of the chunk's target start index and a list of strips. Each strip is a
+                    tuple of (bounded array, target range, source range, length, source step), where the source
+                    range is not strided.
+        """
+        curstrips = []
+        curstart = 0
+        curlen = 0
+
+        for tpos, spos, length, step, box in self.runs():
+            while length > 0:
+                if curstrips and (tpos != curstart + curlen or curlen >= chunk_size):
+                    yield (curstart, curstrips)
+                    curstrips = []
+                    curlen = 0
+
+                if not curstrips:
+                    curstart = tpos
+
+                n = min(length, chunk_size - curlen)
+                curstrips.append((box.ba, (tpos, tpos + n), (spos, spos + (n - 1) * step + 1), n, step))
+
+                curlen += n
+                tpos += n
+                spos += n * step
+                length -= n
+
+        if curstrips:
+            yield (curstart, curstrips)
+
+    def chunk_count(self, chunk_size):
+        """
+        Number of chunks the chunks generator will yield for chunk_size.
+        """
+        size = self.size
+        if size == self.target_size:
+            # the bounded arrays tile the target - there are no gaps to start new chunks at
+            return (size + chunk_size - 1) / chunk_size
+
+        count = 0
+        for chunk in self.chunks(chunk_size):
+            count += 1
+        return count
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/coi/resource_registry/resource_cache.py
+@brief A process local cache of the resources read by resource clients. Entries expire after a time to live and are
+invalidated by the events which announce that a resource has changed.
+"""
+
+from time import time
+
+from twisted.internet import defer
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+from ion.core.object import gpb_wrapper
+from ion.util.cache import LRUDict
+from ion.services.dm.distribution.events import DatastorePushEventSubscriber, DatasetChangeEventSubscriber, DatasourceChangeEventSubscriber
+from ion.services.dm.distribution.publisher_subscriber import SubscriberFactory
+
+
+class CachedResource(object):
+    """
+    The state of a resource repository when it was read from the datastore: the serialized head, which names the
+    head commits, and the structure elements of the commits and content.
+    """
+    __slots__ = ['head_element', 'elements', 'upstream', 'time', 'size']
+
+    def __init__(self, head_element, elements, upstream):
+        self.head_element = head_element
+        self.elements = elements
+        self.upstream = upstream
+        self.time = time()
+        self.size = sum([element.__sizeof__() for element in elements]) + head_element.__sizeof__()
+
+    def __sizeof__(self):
+        return self.size
+
+
+class ResourceInstanceCache(object):
+    """
+    A read through cache of resource repositories for the resource clients of one process. A hit creates a new
+    repository in the workbench which shares the immutable structure elements of the cached state - changes made
+    by one caller can not be seen by another.
+    """
+
+    # The events which announce that a resource has changed - the origin of each is the resource id. The datastore
+    # only publishes push events when its publish_push_events option is on
+    subscriber_types = [DatastorePushEventSubscriber, DatasetChangeEventSubscriber, DatasourceChangeEventSubscriber]
+
+    def __init__(self, proc, ttl, size):
+        """
+        @param ttl the number of seconds an entry is used for
+        @param size the limit on the bytes of structure elements held
+        """
+        self.proc = proc
+        self.ttl = ttl
+
+        self._entries = LRUDict(size, use_size=True)
+        self._subscribers = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @defer.inlineCallbacks
+    def subscribe(self):
+        """
+        Subscribe to the resource change events once. Must be called by a spawned process.
+        """
+        if self._subscribers is not None:
+            return
+        self._subscribers = []
+
+        for subscriber_type in self.subscriber_types:
+            sub_factory = SubscriberFactory(subscriber_type=subscriber_type, process=self.proc)
+            subscriber = yield sub_factory.build(handler=self._on_resource_changed)
+            self._subscribers.append(subscriber)
+
+    def _on_resource_changed(self, data):
+        """
+        Handler for resource change events - the origin of the event is the resource id.
+        """
+        self.invalidate(data['content'].origin)
+
+    def invalidate(self, resource_id):
+        if resource_id in self._entries:
+            del self._entries[resource_id]
+            self.invalidations += 1
+
+    def put(self, repo, pull_response):
+        """
+        Record the state of a repository which was just cloned by a pull: the head of the pull response and the
+        elements pulled.
+        """
+        head_element = gpb_wrapper.StructureElement(pull_response.repo_head_element.GPBMessage)
+        self._entries[repo.repository_key] = CachedResource(head_element, repo.index_hash.values(), repo.upstream)
+
+    def get_repository(self, resource_id):
+        """
+        @retval a new repository in the process workbench with the cached state of the resource, or None if it is not
+        cached or has expired. Must not be called while a repository of the resource is in use in the workbench.
+        """
+        entry = self._entries.get(resource_id)
+        if entry is not None and time() - entry.time > self.ttl:
+            del self._entries[resource_id]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self.proc.workbench.load_repository(resource_id, entry.head_element, entry.elements, entry.upstream)
+
+    def stats(self):
+        return {'items':len(self._entries.keys()),
+                'bytes':self._entries.total_size,
+                'limit':self._entries.limit,
+                'hits':self.hits,
+                'misses':self.misses,
+                'invalidations':self.invalidations}
@@ -25,6 +25,7 @@ from ion.core.object import repository
 from ion.core.object import association_manager
 
 from ion.services.coi.resource_registry.resource_registry import ResourceRegistryClient
+from ion.services.coi.resource_registry.resource_cache import ResourceInstanceCache
 from ion.services.coi.datastore_bootstrap import ion_preload_config
 
 from ion.services.coi.datastore_bootstrap.ion_preload_config import OWNED_BY_ID
@@ -86,6 +87,14 @@ class ResourceClient(object):
 
         self.registry_client = ResourceRegistryClient(proc=self.proc)
 
+        # The resource cache is shared by the resource clients of a process - off unless configured
+        self.resource_cache = getattr(proc, 'resource_cache', None)
+        if self.resource_cache is None and proc.spawn_args.get('resource_cache', CONF.getValue('resource_cache', False)):
+            self.resource_cache = ResourceInstanceCache(proc,
+                                                        ttl=CONF.getValue('resource_cache_ttl', 60),
+                                                        size=CONF.getValue('resource_cache_size', 10**7))
+            proc.resource_cache = self.resource_cache
+
 
     @defer.inlineCallbacks
     def _check_init(self):
@@ -96,6 +105,9 @@ class ResourceClient(object):
         if not self.proc.is_spawned():
             yield self.proc.spawn()
 
+        if self.resource_cache is not None:
+            yield self.resource_cache.subscribe()
+
         assert isinstance(self.workbench, workbench.WorkBench),\
         'Process workbench is not initialized'
 
@@ -169,9 +181,76 @@ class ResourceClient(object):
         """
         yield self._check_init()
 
+        reference, branch = self._resolve_resource_id(resource_id, 'get_instance')
+
+        # Only the complete state of a resource is cached, and only used when the workbench does not hold the
+        # repository in use - it may have local changes
+        use_cache = self.resource_cache is not None and not excluded_types and not self.workbench.holds_repository(reference)
+
+        repo = None
+        if use_cache:
+            repo = self.resource_cache.get_repository(reference)
+
+        if repo is None:
+            # Pull the repository
+            try:
+                result = yield self.workbench.pull(self.datastore_service, reference, excluded_types=excluded_types)
+            except workbench.WorkBenchError, ex:
+                log.error('Resource client error during pull operation: Resource ID "%s" \nException - %s' % (reference, str(ex)))
+                raise ResourceClientError(
+                    'Could not pull the requested resource from the datastore. Workbench exception: \n %s' % ex)
+
+            if use_cache:
+                self.resource_cache.put(self.workbench.get_repository(reference), result)
+
+        resource = yield self._checkout_instance(reference, branch, 'get_instance')
+
+        # Get owner and ownership association:
+        #owner_associations = yield self.get_associations(subject=resource, predicate_or_predicates=OWNED_BY_ID)
+
+        defer.returnValue(resource)
+
+    @defer.inlineCallbacks
+    def get_instances(self, resource_ids, excluded_types=None):
+        """
+        @brief Get the latest version of several resources from the data store with one request
+        @param resource_ids a list of string resource identities or IDRef objects, as for get_instance
+        @param excluded_types the types not to get - applied to all of the resources
+        @retval a tuple of a dictionary of ResourceInstances and a dictionary of error messages for the resources
+        which could not be retrieved. Both are keyed by resource identity.
+        """
+        yield self._check_init()
+
+        branches = {}
+        for resource_id in resource_ids:
+            reference, branch = self._resolve_resource_id(resource_id, 'get_instances')
+            branches[reference] = branch
+
+        try:
+            errors = yield self.workbench.multi_pull(self.datastore_service, branches.keys(), excluded_types=excluded_types)
+        except workbench.WorkBenchError, ex:
+            log.error('Resource client error during multi pull operation: \nException - %s', ex)
+            raise ResourceClientError(
+                'Could not pull the requested resources from the datastore. Workbench exception: \n %s' % ex)
+
+        resources = {}
+        for reference, branch in branches.items():
+            if reference in errors:
+                continue
+
+            try:
+                resources[reference] = yield self._checkout_instance(reference, branch, 'get_instances')
+            except ResourceClientError, ex:
+                errors[reference] = str(ex)
+
+        defer.returnValue((resources, errors))
+
+    def _resolve_resource_id(self, resource_id, method):
+        """
+        Return the repository key and branch name of a string resource identity or an IDRef
+        """
         reference = None
         branch = 'master'
-        commit = None
 
         # Get the type of the argument and act accordingly
         if hasattr(resource_id, 'ObjectType') and resource_id.ObjectType == IDREF_TYPE:
@@ -180,7 +259,6 @@ class ResourceClient(object):
                 branch = resource_id.branch
 
             reference = resource_id.key
-            commit = resource_id.commit
 
         elif isinstance(resource_id, (str, unicode)):
             # if it is a string, us it as an identity
@@ -188,24 +266,23 @@ class ResourceClient(object):
             # @TODO Some reasonable test to make sure it is valid?
 
         else:
-            raise ResourceClientError('''Illegal argument type in get_instance:
-                                      \n type: %s \nvalue: %s''' % (type(resource_id), str(resource_id)))
+            raise ResourceClientError('''Illegal argument type in %s:
+                                      \n type: %s \nvalue: %s''' % (method, type(resource_id), str(resource_id)))
 
-            # Pull the repository
-        try:
-            result = yield self.workbench.pull(self.datastore_service, reference, excluded_types=excluded_types)
-        except workbench.WorkBenchError, ex:
-            log.error('Resource client error during pull operation: Resource ID "%s" \nException - %s' % (reference, str(ex)))
-            raise ResourceClientError(
-                'Could not pull the requested resource from the datastore. Workbench exception: \n %s' % ex)
+        return reference, branch
 
+    @defer.inlineCallbacks
+    def _checkout_instance(self, reference, branch, method):
+        """
+        Check out a branch of a pulled repository and return it as a ResourceInstance
+        """
         # Get the repository
         repo = self.workbench.get_repository(reference)
         try:
             yield repo.checkout(branch)
         except repository.RepositoryError, ex:
             log.exception('Could not check out branch "%s":\n Current repo state:\n %s' % (branch, str(repo)))
-            raise ResourceClientError('Could not checkout branch during get_instance.')
+            raise ResourceClientError('Could not checkout branch during %s.' % method)
 
         # Create a resource instance to return
         # @TODO - Check and see if there is already one - what to do?
@@ -214,9 +291,6 @@ class ResourceClient(object):
         self.workbench.set_repository_nickname(reference, resource.ResourceName)
         # Is this a good use of the resource name? Is it safe?
 
-        # Get owner and ownership association:
-        #owner_associations = yield self.get_associations(subject=resource, predicate_or_predicates=OWNED_BY_ID)
-
         defer.returnValue(resource)
 
     @defer.inlineCallbacks
@@ -239,6 +313,9 @@ class ResourceClient(object):
         if repository.status == repository.MODIFIED:
             repository.commit(comment=comment)
 
+        if self.resource_cache is not None:
+            self.resource_cache.invalidate(repository.repository_key)
+
         result = yield self.workbench.push(self.datastore_service, repository)
 
         if not result.MessageResponseCode == result.ResponseCodes.OK:
@@ -282,6 +359,9 @@ class ResourceClient(object):
 
             transaction_repos.append(repo)
 
+            if self.resource_cache is not None:
+                self.resource_cache.invalidate(repo.repository_key)
+
         result = yield self.workbench.push(self.datastore_service, transaction_repos)
 
         if not result.MessageResponseCode == result.ResponseCodes.OK:
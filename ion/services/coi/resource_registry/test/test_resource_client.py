@@ -24,6 +24,8 @@ from ion.core.exception import ReceivedError
 from ion.services.coi.resource_registry.resource_registry import ResourceRegistryClient, ResourceRegistryError
 from ion.services.coi.resource_registry.resource_client import ResourceClient, ResourceInstance, RESOURCE_TYPE
 from ion.services.coi.resource_registry.resource_client import ResourceClientError, ResourceInstanceError
+from ion.services.coi.resource_registry.resource_cache import ResourceInstanceCache
+from ion.services.coi.datastore import DataStoreWorkbench
 from ion.test.iontest import IonTestCase
 from ion.services.coi.datastore_bootstrap.ion_preload_config import ION_RESOURCE_TYPES, ION_IDENTITIES, ID_CFG, PRELOAD_CFG, ION_DATASETS_CFG, ION_DATASETS, NAME_CFG, DEFAULT_RESOURCE_TYPE_ID
 from ion.services.coi.datastore_bootstrap.ion_preload_config import SAMPLE_PROFILE_DATASET_ID, ANONYMOUS_USER_ID
@@ -387,6 +389,88 @@ class ResourceClientTest(IonTestCase):
             self.assertEqual(resource.ResourceName, value[NAME_CFG])
             #print resource
 
+    @defer.inlineCallbacks
+    def test_resource_cache(self):
+
+        resource = yield self.rc.create_instance(ADDRESSLINK_TYPE, ResourceName='Test AddressLink Resource', ResourceDescription='A test resource')
+        resource.title = 'Cached'
+        yield self.rc.put_instance(resource)
+
+        res_id = resource.ResourceIdentity
+
+        self.rc.resource_cache = ResourceInstanceCache(self.sup, ttl=60, size=10**7)
+        wb = self.sup.workbench
+
+        # The repository created in the workbench is in use - it is used, not the cache
+        held = yield self.rc.get_instance(res_id)
+        self.assertEqual(self.rc.resource_cache.misses, 0)
+        self.assertEqual(self.rc.resource_cache.hits, 0)
+
+        # Release it, as the workbench does when a request is done with it
+        wb.cache_repository(held.Repository)
+        first = yield self.rc.get_instance(res_id)
+        self.assertEqual(first.title, 'Cached')
+
+        wb.cache_repository(first.Repository)
+        second = yield self.rc.get_instance(res_id)
+        self.assertEqual(second.title, 'Cached')
+
+        self.assertEqual(self.rc.resource_cache.misses, 1)
+        self.assertEqual(self.rc.resource_cache.hits, 1)
+
+        # Each hit is a new repository over the cached state
+        self.assertNotIdentical(first.Repository, second.Repository)
+        second.title = 'Changed'
+
+        # A held repository is never replaced by the cached state
+        self.assertRaises(workbench.WorkBenchError, wb.load_repository, res_id, None, [])
+
+        # Writing the resource invalidates the cached state
+        yield self.rc.put_instance(second)
+
+        wb.cache_repository(second.Repository)
+        third = yield self.rc.get_instance(res_id)
+        self.assertEqual(self.rc.resource_cache.misses, 2)
+        self.assertEqual(third.title, 'Changed')
+
+    @defer.inlineCallbacks
+    def test_get_instances(self):
+
+        defaults={}
+        defaults.update(ION_RESOURCE_TYPES)
+        defaults.update(ION_IDENTITIES)
+
+        ids = [value[ID_CFG] for value in defaults.values()]
+        ids.append('foobar')
+
+        resources, errors = yield self.rc.get_instances(ids)
+
+        self.assertEqual(errors.keys(), ['foobar'])
+        self.assertEqual(len(resources), len(defaults))
+
+        for key, value in defaults.items():
+            self.assertEqual(resources[value[ID_CFG]].ResourceName, value[NAME_CFG])
+
+        # The repository which was not found is not left in the workbench
+        self.assertEqual(self.rc.workbench.get_repository('foobar'), None)
+
+    @defer.inlineCallbacks
+    def test_get_instances_error(self):
+
+        # Any error pulling one repository is reported for that repository only
+        resolve_repo_state = DataStoreWorkbench._resolve_repo_state
+        def broken_resolve_repo_state(dswb, repository_key, *args, **kwargs):
+            if repository_key == ANONYMOUS_USER_ID:
+                return defer.fail(RuntimeError('Broken repository'))
+            return resolve_repo_state(dswb, repository_key, *args, **kwargs)
+        self.patch(DataStoreWorkbench, '_resolve_repo_state', broken_resolve_repo_state)
+
+        resources, errors = yield self.rc.get_instances([ANONYMOUS_USER_ID, DEFAULT_RESOURCE_TYPE_ID])
+
+        self.assertEqual(errors.keys(), [ANONYMOUS_USER_ID])
+        self.assertIn('Broken repository', errors[ANONYMOUS_USER_ID])
+        self.assertEqual(resources.keys(), [DEFAULT_RESOURCE_TYPE_ID])
+
     '''
     @defer.inlineCallbacks
     def test_get_associated(self):
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/coi/test/benchmark_hyperslab.py
+@brief Compares the extract_data hyperslab planner with the recursive strip generator it replaced.
+"""
+
+from ion.test.iontest import IonTestCase
+from ion.test.benchmark import best_time
+
+from ion.services.coi.hyperslab import HyperslabPlan
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+
+def legacy_double_xrange(start1, end1, start2, end2):
+    """
+    The xrange over two ranges at once used by the old DataStoreWorkbench._get_slices.
+    """
+    counter1 = start1
+    counter2 = start2
+    while counter1 < end1 and counter2 < end2:
+        yield (counter1, counter2)
+
+        counter1 += 1
+        counter2 += 1
+
+
+def legacy_get_slices(targetdimextents, srcdimextents, targetranges, srcranges, strides):
+    """
+    The recursive strip generator from the old DataStoreWorkbench._get_slices, kept here for comparison only.
+    """
+    targetidxextents = [None] * len(targetdimextents)
+    srcidxextents = [None] * len(srcdimextents)
+
+    targetidxextents[-1] = 1
+    srcidxextents[-1] = 1
+
+    striddentargetextents = [targetdimextents[i]/strides[i] for i in xrange(len(targetdimextents))]
+
+    for x in range(len(targetidxextents)-2, -1, -1):
+        targetidxextents[x] = reduce(lambda x,y: x*y, striddentargetextents[x+1:])
+
+    for x in range(len(srcidxextents)-2, -1, -1):
+        srcidxextents[x] = reduce(lambda x, y: x*y, srcdimextents[x+1:])
+
+    def recslice(trs, srs, ts, ss, tstrides, cts=0, css=0, rc=0):
+        if len(trs) == 0:
+            yield ((cts+ts[0]/tstrides[0], cts+ts[1]/tstrides[0]),
+                   (css+ss[0], css+ss[1]),
+                   tstrides[0])
+        else:
+            ctr = trs[0]
+            csr = srs[0]
+            cstride = tstrides[0]
+
+            for tv, sv in legacy_double_xrange(ctr[0], ctr[1], csr[0], csr[1]):
+                if tv % cstride == 0:
+                    for xx in recslice(trs[1:], srs[1:], ts, ss, tstrides[1:],
+                                       cts+(tv * targetidxextents[rc]),
+                                       css+(sv * srcidxextents[rc]),
+                                       rc+1):
+                        yield xx
+
+    for x in recslice(targetranges[:-1], srcranges[:-1], targetranges[-1], srcranges[-1], strides[:]):
+        yield x
+
+
+def make_request(rank, size, num_bas):
+    """
+    A request for the full extent of a dataset split into num_bas bounded arrays along the slowest dimension.
+
+    @returns    The target shape and a list of (ba, ba shape, target ranges, source ranges) tuples.
+    """
+    targetshape = [num_bas] + [size] * (rank - 1)
+    ba_shape = [1] + [size] * (rank - 1)
+
+    bas = []
+    for x in xrange(num_bas):
+        target_ranges = [(x, x + 1)] + [(0, size)] * (rank - 1)
+        src_ranges = [(0, 1)] + [(0, size)] * (rank - 1)
+        bas.append(('ba%d' % x, ba_shape, target_ranges, src_ranges))
+
+    return targetshape, bas
+
+
+def legacy_plan(targetshape, bas, strides):
+    striplist = []
+    for ba, ba_shape, target_ranges, src_ranges in bas:
+        for targetslice, srcslice, laststridelen in legacy_get_slices(targetshape, ba_shape, target_ranges, src_ranges, strides):
+            striplist.append((ba, targetslice, srcslice, targetslice[1]-targetslice[0], laststridelen))
+    sorted(striplist, lambda x, y: x[1][1] < y[1][0])
+    return striplist
+
+
+def planner_plan(targetshape, bas, strides, chunk_size):
+    plan = HyperslabPlan(targetshape, strides)
+    for ba, ba_shape, target_ranges, src_ranges in bas:
+        plan.add_bounded_array(ba, ba_shape, target_ranges, src_ranges)
+    plan.chunk_count(chunk_size)
+    return plan
+
+
+class HyperslabBenchmark(IonTestCase):
+
+    repeats = 3
+    size = 40
+    num_bas = 4
+    chunk_size = 15000
+
+    def test_planner(self):
+
+        log.info("%4s %8s %12s %12s %10s %10s %8s" % ('rank', 'stride', 'legacy (s)', 'planner (s)', 'strips', 'runs', 'boxes'))
+        for rank in xrange(1, 5):
+            for stride in (1, 2):
+                targetshape, bas = make_request(rank, self.size, self.num_bas)
+                strides = [1] * (rank - 1) + [stride]
+
+                legacy, striplist = best_time(self.repeats, legacy_plan, targetshape, bas, strides)
+                planner, plan = best_time(self.repeats, planner_plan, targetshape, bas, strides, self.chunk_size)
+
+                runs = sum([box.run_count for box in plan.boxes])
+                log.info("%4d %8d %12.6f %12.6f %10d %10d %8d" % (rank, stride, legacy, planner, len(striplist), runs, len(plan.boxes)))
@@ -14,9 +14,10 @@ from ion.core.object.object_utils import ARRAY_STRUCTURE_TYPE, CDM_ARRAY_FLOAT64
 
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 
 from ion.core import ioninit
+from ion.core.exception import ReceivedError
 CONF = ioninit.config(__name__)
 
 from ion.util import procutils as pu
@@ -33,6 +34,7 @@ from ion.core.data.storage_configuration_utility import BLOB_CACHE, COMMIT_CACHE
 
 from telephus.cassandra.ttypes import InvalidRequestException
 
+from ion.services.coi import datastore
 from ion.services.coi.datastore import ION_DATASETS_CFG, PRELOAD_CFG, ID_CFG, DataStoreClient, CDM_BOUNDED_ARRAY_TYPE
 # Pick three to test existence
 from ion.services.coi.datastore_bootstrap.ion_preload_config import HAS_A_ID, DATASET_RESOURCE_TYPE_ID, ROOT_USER_ID, NAME_CFG, CONTENT_ARGS_CFG, PREDICATE_CFG, ION_RESOURCE_TYPES_CFG, ION_PREDICATES_CFG, ION_IDENTITIES_CFG
@@ -1039,6 +1041,61 @@ class DataStoreExtractDataTest(IonTestCase):
                 self.failUnlessEqual(int(data), counter)
                 counter += 1
         
+    @defer.inlineCallbacks
+    def test_full_one_ba_sequence(self):
+        # chunks are sent through a window - all of them must be in before the done flag
+        msg = yield self.dsc.proc.message_client.create_instance(DATA_REQUEST_MESSAGE_TYPE)
+        msg.structure_array_ref = self.first_struct_as_key
+
+        for size in (15, 40, 200):
+            bounds = msg.request_bounds.add()
+            bounds.origin = 0
+            bounds.size = size
+
+        msg.data_routing_key = "data_listener"
+
+        resp = yield self.dsc.extract_data(msg)
+        yield self._def_done
+
+        self.failUnless(len(self._recv_data) > 1)
+
+        seq_numbers = [x['seq_number'] for x in self._recv_data]
+        self.failUnlessEquals(sorted(seq_numbers), range(len(self._recv_data)))
+        self.failUnlessEquals(seq_numbers[-1], len(self._recv_data) - 1)
+
+        for chunk in self._recv_data:
+            self.failUnlessEquals(chunk['seq_max'], len(self._recv_data))
+
+    @defer.inlineCallbacks
+    def test_send_error(self):
+        # a failed chunk send is reported and the sends already started are waited for
+        sends = []
+        def failing_send(wb, data_routing_key, chunkmsg):
+            d = defer.Deferred()
+            sends.append(d)
+            if len(sends) == 2:
+                d.errback(Exception('Chunk send failed'))
+            else:
+                reactor.callLater(0, d.callback, None)
+            return d
+        self.patch(datastore.DataStoreWorkbench, '_send_data_chunk', failing_send)
+
+        msg = yield self.dsc.proc.message_client.create_instance(DATA_REQUEST_MESSAGE_TYPE)
+        msg.structure_array_ref = self.first_struct_as_key
+
+        for size in (15, 40, 200):
+            bounds = msg.request_bounds.add()
+            bounds.origin = 0
+            bounds.size = size
+
+        msg.data_routing_key = "data_listener"
+
+        yield self.failUnlessFailure(self.dsc.extract_data(msg), ReceivedError)
+
+        self.failUnless(len(sends) >= 2)
+        for d in sends:
+            self.failUnless(d.called)
+
     @defer.inlineCallbacks
     def test_partial_one_ba(self):
         msg = yield self.dsc.proc.message_client.create_instance(DATA_REQUEST_MESSAGE_TYPE)
@@ -1123,6 +1180,33 @@ class DataStoreExtractDataTest(IonTestCase):
             last = int(bigndarray[x])
 
 
+    @defer.inlineCallbacks
+    def test_stride_one_ba_list_fallback(self):
+        # Without numpy there is no dtype for the array type and the extraction goes through the python list code path
+        self.patch(datastore, 'NUMPY_DTYPES', {})
+        self.patch(datastore, 'numpy', None)
+
+        yield self.test_stride_one_ba()
+
+    @defer.inlineCallbacks
+    def test_ndarray_cache_shared(self):
+        yield self.test_partial_one_ba()
+
+        stats = yield self.dsc.get_cache_stats()
+        self.failUnlessEquals(stats['misses'], 1)
+        self.failUnless(stats['bytes'] > 0)
+        if datastore.numpy is not None:
+            self.failUnless(stats['buffer_bytes'] > 0)
+
+        # the same ndarray again - it must not go back to the blob store
+        self._recv_data = []
+        self._def_done = defer.Deferred()
+        yield self.test_partial_one_ba()
+
+        stats = yield self.dsc.get_cache_stats()
+        self.failUnlessEquals(stats['misses'], 1)
+        self.failUnlessEquals(stats['evictions'], 0)
+
     @defer.inlineCallbacks
     def test_full_multi_ba(self):
         
@@ -1274,3 +1358,98 @@ class DataStoreExtractDataTest(IonTestCase):
         # now the next index in our returned array
         nextidx = 10 * 10
         self.failUnlessEquals(int(bigndarray[nextidx]), nextval)
+
+
+class NDArrayBlockCacheTest(unittest.TestCase):
+
+    def _element(self, obj_type, value):
+        element = StructureElement()
+        element.type = obj_type
+        element.value = value
+        element.key = element.sha1
+        return element
+
+    def test_admission(self):
+        cache = datastore.NDArrayBlockCache(4000, max_fraction=0.5)
+
+        small = self._element(CDM_ARRAY_FLOAT64_TYPE, 'x' * 100)
+        big = self._element(CDM_ARRAY_FLOAT64_TYPE, 'y' * 3000)
+        other = self._element(CDM_ATTRIBUTE_TYPE, 'z' * 100)
+
+        self.failUnless(cache.offer(small))
+        self.failIf(cache.offer(big))
+        self.failIf(cache.offer(other))
+
+        self.failUnlessIdentical(cache.lookup(small.key), small)
+        self.failUnlessEquals(cache.lookup(big.key), None)
+        self.failUnlessEquals(cache.lookup(other.key), None)
+
+        stats = cache.stats()
+        self.failUnlessEquals(stats['hits'], 1)
+        self.failUnlessEquals(stats['misses'], 2)
+        self.failUnlessEquals(stats['rejections'], 1)
+        self.failUnlessEquals(stats['items'], 1)
+
+    def test_eviction(self):
+        cache = datastore.NDArrayBlockCache(1000, max_fraction=0.5)
+
+        elements = [self._element(CDM_ARRAY_FLOAT64_TYPE, str(x) * 400) for x in range(3)]
+        for element in elements:
+            cache.offer(element)
+
+        self.failUnlessEquals(cache.lookup(elements[0].key), None)
+        self.failUnlessIdentical(cache.lookup(elements[2].key), elements[2])
+        self.failUnlessEquals(cache.stats()['evictions'], 1)
+
+
+class NDArrayBufferCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        if datastore.numpy is None:
+            raise unittest.SkipTest('numpy is not installed')
+
+    def test_admission(self):
+        numpy = datastore.numpy
+        cache = datastore.NDArrayBufferCache(4000, max_fraction=0.5)
+
+        small = numpy.arange(100, dtype='float64')
+        big = numpy.arange(300, dtype='float64')
+
+        self.failUnless(cache.put_buffer('small', small))
+        self.failIf(cache.put_buffer('big', big))
+
+        self.failUnlessIdentical(cache.get_buffer('small'), small)
+        self.failUnlessEquals(cache.get_buffer('big'), None)
+        self.failUnlessEquals(cache.total_size, small.nbytes)
+
+        # the buffer is shared between requests
+        self.failIf(small.flags.writeable)
+
+    def test_eviction(self):
+        numpy = datastore.numpy
+        cache = datastore.NDArrayBufferCache(2000, max_fraction=0.5)
+
+        buffers = [numpy.arange(100, dtype='float64') for x in range(3)]
+        for i, buf in enumerate(buffers):
+            cache.put_buffer(i, buf)
+
+        self.failUnlessEquals(cache.get_buffer(0), None)
+        self.failUnlessIdentical(cache.get_buffer(2), buffers[2])
+
+        stats = cache.stats()
+        self.failUnlessEquals(stats['evictions'], 1)
+        self.failUnlessEquals(stats['hits'], 1)
+        self.failUnlessEquals(stats['misses'], 1)
+        self.failUnlessEquals(stats['bytes'], 1600)
+
+    def test_wrap_size_counts_buffer(self):
+        numpy = datastore.numpy
+
+        class Bounds(object):
+            size = 10
+
+        wrap = datastore.NDArrayWrap('key', None, [Bounds()], 8, None, dtype='float64')
+        self.failUnlessEquals(wrap.__sizeof__(), 80)
+
+        wrap._buffer = numpy.arange(10, dtype='float64')
+        self.failUnlessEquals(wrap.__sizeof__(), 160)
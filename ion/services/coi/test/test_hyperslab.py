@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/coi/test/test_hyperslab.py
+@brief Tests for the extract_data hyperslab planner
+"""
+
+from twisted.trial import unittest
+
+from ion.services.coi.hyperslab import HyperslabPlan
+
+
+class HyperslabPlanTest(unittest.TestCase):
+    """
+    Checks the planner against a brute force walk over every element of the request.
+    Each fake bounded array is a (name, origins, shape) tuple, its source array is filled with (name, flat index).
+    """
+
+    def _intersect(self, reqorigin, reqshape, ba):
+        name, origins, shape = ba
+        target_ranges = []
+        src_ranges = []
+        for ro, rs, bo, bs in zip(reqorigin, reqshape, origins, shape):
+            start = max(ro, bo)
+            end = min(ro + rs, bo + bs)
+            if start >= end:
+                return None
+            target_ranges.append((start - ro, end - ro))
+            src_ranges.append((start - bo, end - bo))
+        return target_ranges, src_ranges
+
+    def _brute_force(self, reqorigin, reqshape, strides, bas):
+        """
+        Returns a dict of strided target flat index -> (name, source flat index)
+        """
+        stridden = [(s + k - 1) / k for s, k in zip(reqshape, strides)]
+        expected = {}
+
+        def walk(dim, coords):
+            if dim == len(reqshape):
+                for name, origins, shape in bas:
+                    if all([o <= c < o + s for c, o, s in zip(coords, origins, shape)]):
+                        srcidx = 0
+                        for c, o, s in zip(coords, origins, shape):
+                            srcidx = srcidx * s + (c - o)
+                        tgtidx = 0
+                        for c, ro, k, s in zip(coords, reqorigin, strides, stridden):
+                            tgtidx = tgtidx * s + (c - ro) / k
+                        expected[tgtidx] = (name, srcidx)
+                return
+            for i in xrange(0, reqshape[dim], strides[dim]):
+                walk(dim + 1, coords + [reqorigin[dim] + i])
+
+        walk(0, [])
+        return expected
+
+    def _check(self, reqorigin, reqshape, strides, bas, chunk_size=7):
+        plan = HyperslabPlan(reqshape, strides)
+        for ba in bas:
+            ranges = self._intersect(reqorigin, reqshape, ba)
+            if ranges is not None:
+                plan.add_bounded_array(ba[0], ba[2], ranges[0], ranges[1])
+
+        expected = self._brute_force(reqorigin, reqshape, strides, bas)
+
+        result = {}
+        nchunks = 0
+        for start, strips in plan.chunks(chunk_size):
+            nchunks += 1
+            chunklen = 0
+            for name, trange, srange, length, step in strips:
+                self.assertEqual(trange[0], start + chunklen)
+                self.assertEqual(trange[1] - trange[0], length)
+
+                srcindices = range(srange[0], srange[1], step)
+                self.assertEqual(len(srcindices), length)
+                for i, srcidx in enumerate(srcindices):
+                    result[trange[0] + i] = (name, srcidx)
+                chunklen += length
+            self.failUnless(chunklen <= chunk_size)
+
+        self.assertEqual(result, expected)
+        self.assertEqual(plan.size, len(expected))
+        self.assertEqual(plan.chunk_count(chunk_size), nchunks)
+        return plan
+
+    def test_one_d(self):
+        plan = self._check([0], [20], [1], [('a', [0], [20])])
+        self.assertEqual(len(plan.boxes), 1)
+        self.assertEqual(plan.boxes[0].run_count, 1)
+
+    def test_one_d_strided(self):
+        self._check([3], [15], [4], [('a', [0], [20])])
+
+    def test_full_three_d_is_one_run(self):
+        plan = self._check([0, 0, 0], [3, 4, 5], [1, 1, 1], [('a', [0, 0, 0], [3, 4, 5])])
+        self.assertEqual(plan.boxes[0].counts, [60])
+
+    def test_partial_three_d(self):
+        plan = self._check([1, 0, 2], [1, 3, 2], [1, 1, 1], [('a', [0, 0, 0], [3, 4, 5])])
+        self.assertEqual(plan.boxes[0].run_count, 3)
+
+    def test_strided_three_d(self):
+        self._check([0, 1, 0], [3, 3, 5], [2, 2, 3], [('a', [0, 0, 0], [3, 4, 5])])
+
+    def test_multi_ba_split_outer(self):
+        bas = [('ba%d' % x, [x, 0, 0, 0], [1, 4, 4, 4]) for x in xrange(4)]
+        plan = self._check([1, 1, 1, 1], [2, 2, 3, 3], [1, 1, 1, 1], bas)
+        self.assertEqual(len(plan.boxes), 2)
+
+    def test_multi_ba_split_inner(self):
+        # bounded arrays split along the fastest varying dimension interleave in the target
+        bas = [('left', [0, 0], [4, 3]), ('right', [0, 3], [4, 3])]
+        self._check([0, 1], [4, 5], [1, 1], bas, chunk_size=4)
+
+    def test_multi_ba_strided(self):
+        bas = [('ba%d' % x, [x, 0, 0, 0], [1, 5, 4, 4]) for x in xrange(4)]
+        self._check([0, 0, 1, 0], [4, 5, 3, 4], [1, 2, 1, 3], bas)
+
+    def test_gap_starts_new_chunk(self):
+        bas = [('a', [0], [4]), ('b', [6], [4])]
+        plan = self._check([0], [10], [1], bas, chunk_size=100)
+        self.assertEqual(plan.chunk_count(100), 2)
+
+    def test_scalar(self):
+        plan = HyperslabPlan([], [])
+        plan.add_bounded_array('s', [], [], [])
+        chunks = list(plan.chunks(10))
+        self.assertEqual(chunks, [(0, [('s', (0, 1), (0, 1), 1, 1)])])
@@ -49,6 +49,8 @@ DATASET_SUPPLEMENT_ADDED_EVENT_ID = 1111
 BUSINESS_STATE_MODIFICATION_EVENT_ID = 1112
 DATASET_CHANGE_EVENT_ID = 1113
 DATASOURCE_CHANGE_EVENT_ID = 1114
+DATASTORE_PUSH_EVENT_ID = 1115
+OWNERSHIP_CHANGE_EVENT_ID = 1116
 NEW_SUBSCRIPTION_EVENT_ID = 1201
 DEL_SUBSCRIPTION_EVENT_ID = 1202
 SCHEDULE_EVENT_ID = 2001
@@ -347,6 +349,24 @@ class DatasourceChangeEventPublisher(ResourceModifiedEventPublisher):
     event_id = DATASOURCE_CHANGE_EVENT_ID
     msg_type = DATASOURCE_CHANGE_EVENT_MESSAGE_TYPE
 
+class DatastorePushEventPublisher(ResourceModifiedEventPublisher):
+    """
+    Event Notification Publisher for new commits pushed to the datastore - Will cause the association service to update
+    its association graph for this repository.
+
+    The "origin" parameter in this class' initializer should be the repository key.
+    """
+    event_id = DATASTORE_PUSH_EVENT_ID
+
+class OwnershipChangeEventPublisher(ResourceModifiedEventPublisher):
+    """
+    Event Notification Publisher for new commits to ownership associations pushed to the datastore - Will cause the
+    policy interceptors to forget their ownership decisions for this resource.
+
+    The "origin" parameter in this class' initializer should be the resource id (UUID) of the owned resource.
+    """
+    event_id = OWNERSHIP_CHANGE_EVENT_ID
+
     
 class NewSubscriptionEventPublisher(EventPublisher):
     """
@@ -581,6 +601,22 @@ class DatasourceChangeEventSubscriber(ResourceModifiedEventSubscriber):
     """
     event_id = DATASOURCE_CHANGE_EVENT_ID
 
+class DatastorePushEventSubscriber(ResourceModifiedEventSubscriber):
+    """
+    Event Notification Subscriber for new commits pushed to the datastore.
+
+    The "origin" parameter in this class' initializer should be the repository key.
+    """
+    event_id = DATASTORE_PUSH_EVENT_ID
+
+class OwnershipChangeEventSubscriber(ResourceModifiedEventSubscriber):
+    """
+    Event Notification Subscriber for new commits to ownership associations pushed to the datastore.
+
+    The "origin" parameter in this class' initializer should be the resource id (UUID) of the owned resource.
+    """
+    event_id = OWNERSHIP_CHANGE_EVENT_ID
+
 class NewSubscriptionEventSubscriber(EventSubscriber):
     """
     Event Notification Subscriber for Subscription Modifications.
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/inventory/association_graph.py
+@brief An in process index of the head associations in the commit store, used by the association service.
+
+The graph holds the head commit rows of each association repository, indexed by (subject, predicate),
+(predicate, object), subject and object. It also holds the head commit rows of the repositories which are the
+subject or object of an association, so that the branch, type and life cycle state of the results can be checked
+without going back to the commit store. The graph is updated one repository at a time from the current head rows
+of that repository in the commit store.
+"""
+
+from ion.core.data.storage_configuration_utility import VALUE
+from ion.core.data.storage_configuration_utility import SUBJECT_KEY, PREDICATE_KEY, OBJECT_KEY
+
+
+class AssociationGraph(object):
+    """
+    Adjacency maps over the head commits of the associations in the commit store.
+
+    All rows are dictionaries of commit store columns, without the value column, and are keyed by commit key
+    within each repository.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # association repository key -> {commit key: row}
+        self._associations = {}
+
+        # repository key -> {commit key: row} for the subjects and objects of associations
+        self._heads = {}
+
+        # adjacency maps to sets of association repository keys
+        self._subject_predicate = {}
+        self._predicate_object = {}
+        self._subjects = {}
+        self._objects = {}
+
+    def __len__(self):
+        return len(self._associations)
+
+    def __str__(self):
+        return 'AssociationGraph: %d associations, %d subject and object heads' % (len(self._associations), len(self._heads))
+
+    def update_repository(self, repo_key, rows):
+        """
+        Replace the state of a repository with its current head rows from the commit store.
+
+        @param repo_key The repository key
+        @param rows A dictionary of commit key to row for the head commits of the repository - empty if it has none
+        @retval A set of subject and object keys referenced by the repository which have no head rows in the graph
+        """
+        self._remove_association(repo_key)
+
+        rows = self._strip(rows)
+
+        if self._heads.has_key(repo_key):
+            self._heads[repo_key] = rows
+
+        association_rows = {}
+        for key, row in rows.iteritems():
+            if row.get(PREDICATE_KEY):
+                association_rows[key] = row
+
+        missing = set()
+        if association_rows:
+            self._add_association(repo_key, association_rows)
+
+            for row in association_rows.itervalues():
+                for ref_key in (row[SUBJECT_KEY], row[OBJECT_KEY]):
+                    if not self._heads.has_key(ref_key):
+                        missing.add(ref_key)
+
+        return missing
+
+    def set_heads(self, repo_key, rows):
+        """
+        Set the head rows of a repository which is the subject or object of an association.
+        """
+        self._heads[repo_key] = self._strip(rows)
+
+    def associations(self, subject_key=None, predicate_key=None, object_key=None):
+        """
+        Find the head association rows which match a subject, predicate and object.
+
+        @retval A dictionary of commit key to row, or None if the graph can not answer a search by predicate only.
+        """
+        if subject_key is not None and predicate_key is not None:
+            repo_keys = self._subject_predicate.get((subject_key, predicate_key), ())
+        elif predicate_key is not None and object_key is not None:
+            repo_keys = self._predicate_object.get((predicate_key, object_key), ())
+        elif subject_key is not None:
+            repo_keys = self._subjects.get(subject_key, ())
+        elif object_key is not None:
+            repo_keys = self._objects.get(object_key, ())
+        else:
+            return None
+
+        result = {}
+        for repo_key in repo_keys:
+            for key, row in self._associations[repo_key].iteritems():
+                if subject_key is not None and row[SUBJECT_KEY] != subject_key:
+                    continue
+                if predicate_key is not None and row[PREDICATE_KEY] != predicate_key:
+                    continue
+                if object_key is not None and row[OBJECT_KEY] != object_key:
+                    continue
+                result[key] = row
+        return result
+
+    def predicates(self):
+        """
+        The set of predicate keys used by the associations in the graph.
+        """
+        return set([predicate_key for predicate_key, object_key in self._predicate_object.iterkeys()])
+
+    def get_heads(self, repo_keys):
+        """
+        Get the head rows of a set of repositories.
+
+        @retval A tuple of a dictionary of repository key to a list of its head rows, and the set of repository keys
+        for which the graph has no head rows.
+        """
+        heads = {}
+        missing = set()
+        for repo_key in repo_keys:
+            rows = self._heads.get(repo_key, None)
+            if rows is None:
+                missing.add(repo_key)
+            elif rows:
+                heads[repo_key] = rows.values()
+        return heads, missing
+
+    def compare(self, other):
+        """
+        Compare the associations and heads in this graph with another graph, usually one freshly built from the commit
+        store.
+
+        @retval A dictionary with the number of associations in each graph and the repository keys which are missing
+        from this graph, which are only in this graph and which differ.
+        """
+        missing = []
+        stale = []
+        changed = []
+
+        for repo_key, rows in other._associations.iteritems():
+            mine = self._associations.get(repo_key, None)
+            if mine is None:
+                missing.append(repo_key)
+            elif mine != rows:
+                changed.append(repo_key)
+
+        for repo_key in self._associations.iterkeys():
+            if not other._associations.has_key(repo_key):
+                stale.append(repo_key)
+
+        for repo_key, rows in other._heads.iteritems():
+            mine = self._heads.get(repo_key, None)
+            if mine is not None and mine != rows:
+                changed.append(repo_key)
+
+        return {'associations':len(self._associations),
+                'expected_associations':len(other._associations),
+                'missing':missing,
+                'stale':stale,
+                'changed':changed,
+                'consistent':not (missing or stale or changed)}
+
+    def _strip(self, rows):
+        result = {}
+        for key, row in rows.iteritems():
+            row = dict(row)
+            row.pop(VALUE, None)
+            result[key] = row
+        return result
+
+    def _add_association(self, repo_key, rows):
+        self._associations[repo_key] = rows
+
+        for row in rows.itervalues():
+            subject_key = row[SUBJECT_KEY]
+            predicate_key = row[PREDICATE_KEY]
+            object_key = row[OBJECT_KEY]
+
+            self._subject_predicate.setdefault((subject_key, predicate_key), set()).add(repo_key)
+            self._predicate_object.setdefault((predicate_key, object_key), set()).add(repo_key)
+            self._subjects.setdefault(subject_key, set()).add(repo_key)
+            self._objects.setdefault(object_key, set()).add(repo_key)
+
+    def _remove_association(self, repo_key):
+        rows = self._associations.pop(repo_key, None)
+        if rows is None:
+            return
+
+        for row in rows.itervalues():
+            subject_key = row[SUBJECT_KEY]
+            predicate_key = row[PREDICATE_KEY]
+            object_key = row[OBJECT_KEY]
+
+            self._discard(self._subject_predicate, (subject_key, predicate_key), repo_key)
+            self._discard(self._predicate_object, (predicate_key, object_key), repo_key)
+            self._discard(self._subjects, subject_key, repo_key)
+            self._discard(self._objects, object_key, repo_key)
+
+    def _discard(self, index, index_key, repo_key):
+        repo_keys = index.get(index_key, None)
+        if repo_keys is not None:
+            repo_keys.discard(repo_key)
+            if not repo_keys:
+                del index[index_key]
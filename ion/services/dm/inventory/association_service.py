@@ -10,6 +10,7 @@
 import ion.util.ionlog
 log = ion.util.ionlog.getLogger(__name__)
 from twisted.internet import defer
+from twisted.python import failure
 
 from ion.core.exception import ApplicationError
 
@@ -23,7 +24,11 @@ from ion.core.data.storage_configuration_utility import  BRANCH_NAME, SUBJECT_KE
 from ion.core.data.storage_configuration_utility import  RESOURCE_LIFE_CYCLE_STATE, REPOSITORY_KEY, OBJECT_BRANCH
 from ion.core.data.storage_configuration_utility import get_cassandra_configuration, STORAGE_PROVIDER, PERSISTENT_ARCHIVE
 
-from ion.services.coi.datastore_bootstrap.ion_preload_config import HAS_LIFE_CYCLE_STATE_ID, TYPE_OF_ID
+from ion.services.coi.datastore_bootstrap.ion_preload_config import HAS_LIFE_CYCLE_STATE_ID, TYPE_OF_ID, ION_PREDICATES, ID_CFG
+
+from ion.services.dm.distribution.events import DatastorePushEventSubscriber
+from ion.services.dm.distribution.publisher_subscriber import SubscriberFactory
+from ion.services.dm.inventory.association_graph import AssociationGraph
 
 from ion.core.data import store
 
@@ -44,6 +49,8 @@ BOOL_MSG_TYPE = object_utils.create_type_identifier(object_id=30, version=1)
 
 QUERY_RESULT_TYPE = object_utils.create_type_identifier(object_id=22, version=1)
 
+BLOBS_MESSAGE_TYPE = object_utils.create_type_identifier(object_id=52, version=1)
+
 PREDICATE_REFERENCE_TYPE = object_utils.create_type_identifier(object_id=25, version=1)
 
 LifeCycleStateObject = object_utils.create_type_identifier(object_id=26, version=1)
@@ -83,6 +90,24 @@ class AssociationService(ServiceProcess):
         # Get the configuration for cassandra - may or may not be used depending on the backend class
         self._storage_conf = get_cassandra_configuration()
 
+        # Answer association searches from an in process graph of the head associations. The datastore must publish
+        # push events (publish_push_events) to keep it current.
+        self._use_graph = self.spawn_args.get('association_graph', CONF.getValue('association_graph', default=False))
+
+        # Predicates other than the ION predicates to load into the graph when it is built, and the number of rows
+        # read at a time from a cassandra commit store
+        self._graph_predicates = self.spawn_args.get('graph_predicates', CONF.getValue('graph_predicates', default=[]))
+        self._graph_page_size = self.spawn_args.get('graph_page_size', CONF.getValue('graph_page_size', default=1000))
+
+        self.graph = AssociationGraph()
+        self._graph_ready = False
+
+        # Deferreds waiting for the graph to be built
+        self._graph_waiters = []
+
+        # Repositories pushed while the graph is being built - None when there is no build in progress
+        self._graph_pending = None
+
 
 
     @defer.inlineCallbacks
@@ -103,6 +128,13 @@ class AssociationService(ServiceProcess):
 
         log.info('SLC_INIT Association Service: index store class - %s' % self.index_store_class)
 
+    @defer.inlineCallbacks
+    def slc_activate(self):
+
+        if self._use_graph:
+            sub_factory = SubscriberFactory(subscriber_type=DatastorePushEventSubscriber, process=self)
+            self._push_subscriber = yield sub_factory.build(handler=self._on_datastore_push)
+
     @defer.inlineCallbacks
     def op_get_subjects(self, predicate_object_query, headers, msg):
         """
@@ -130,10 +162,6 @@ class AssociationService(ServiceProcess):
         for pair in predicate_object_query.pairs:
 
 
-            q = store.Query()
-            # Get only the latest version of the association!
-            q.add_predicate_gt(BRANCH_NAME,'')
-
             # Build a query for the predicate of the search
             if pair.predicate.ObjectType != PREDICATE_REFERENCE_TYPE:
                 raise AssociationServiceError('Invlalid predicate type in predicate object pairs request to get_subjects.', predicate_object_query.ResponseCodes.BAD_REQUEST)
@@ -162,15 +190,13 @@ class AssociationService(ServiceProcess):
                     raise AssociationServiceError('Invalid search by type - two predicate object pairs in the query specify type_of. There can be only One!', predicate_object_query.ResponseCodes.BAD_REQUEST)
                 continue
 
-            q.add_predicate_eq(PREDICATE_KEY, pair.predicate.key)
-
-            q.add_predicate_eq(OBJECT_KEY, pair.object.key)
-
-            rows = yield self.index_store.query(q)
+            # Get only the latest version of the association!
+            rows = yield self._query_associations(predicate_key=pair.predicate.key, object_key=pair.object.key)
 
             # subject_pointers is the resulting set of pointers to the current state of the association subject
             subjects_pointers = set()
 
+            current_rows = []
             current_keys = set()
             for key, row in rows.items():
 
@@ -181,16 +207,15 @@ class AssociationService(ServiceProcess):
                     # The result we are looking for is an intersection operation. If this key is not here escape!
                     continue
                 current_keys.add(row[SUBJECT_KEY])
+                current_rows.append(row)
+
+            # Get the latest commits for all the Subject_Keys at once
+            heads = yield self._get_heads(current_keys)
 
-                # Get the latest commits for the Subject_Key
-                subject_query = store.Query()
-                # Get only the head or get all? Hmmm not sure...
-                subject_query.add_predicate_gt(BRANCH_NAME,'')
-                subject_query.add_predicate_eq(REPOSITORY_KEY,row[SUBJECT_KEY])
-                subject_heads = yield self.index_store.query(subject_query)
+            for row in current_rows:
 
                 branches = []
-                for commit_key, commit_row in subject_heads.items():
+                for commit_row in heads.get(row[SUBJECT_KEY], ()):
 
                     if commit_row[BRANCH_NAME] in branches:
                         raise NotImplementedError('Dealing with divergence in an associated Subject is not yet supported')
@@ -256,27 +281,11 @@ class AssociationService(ServiceProcess):
             new_set=set()
 
             # Assumption - the number of rows returned by the association search is much smaller than what will come from search by type or state!
-            for subject in subjects:
-
-                # There for, for each result - check and see if it meets the criteria by type and state...
-                q = store.Query()
-
-                # Test this repository key
-                q.add_predicate_eq(REPOSITORY_KEY, subject[0])
-
-                # Latest state
-                q.add_predicate_gt(BRANCH_NAME,'')
-
-                if life_cycle_pair:
-                    q.add_predicate_eq(RESOURCE_LIFE_CYCLE_STATE, str(life_cycle_pair.object.lcs))
-
-                if type_of_pair:
-                    q.add_predicate_eq(RESOURCE_OBJECT_TYPE, type_of_pair.object.key)
-
-                # Get all the results that meet the type / state query
-                rows = yield self.index_store.query(q)
+            # Check all the results against the criteria by type and state in one query
+            heads = yield self._get_heads(set([subject[0] for subject in subjects]), life_cycle_pair, type_of_pair)
 
-                for key, row in rows.items():
+            for commit_rows in heads.itervalues():
+                for row in commit_rows:
 
                     totalkey = (row[REPOSITORY_KEY] , row[BRANCH_NAME])
 
@@ -331,24 +340,18 @@ class AssociationService(ServiceProcess):
         for pair in subject_predicate_query.pairs:
 
 
-            q = store.Query()
-            # Get only the latest version of the association!
-            q.add_predicate_gt(BRANCH_NAME,'')
-
             # Build a query for the predicate of the search
             if pair.predicate.ObjectType != PREDICATE_REFERENCE_TYPE:
                 raise AssociationServiceError('Invlalid predicate type in subject predicate pairs request to get_objects.', subject_predicate_query.ResponseCodes.BAD_REQUEST)
 
 
-            q.add_predicate_eq(PREDICATE_KEY, pair.predicate.key)
-
-            q.add_predicate_eq(SUBJECT_KEY, pair.subject.key)
-
-            rows = yield self.index_store.query(q)
+            # Get only the latest version of the association!
+            rows = yield self._query_associations(subject_key=pair.subject.key, predicate_key=pair.predicate.key)
 
             # subject_pointers is the resulting set of pointers to the current state of the association subject
             objects_pointers = set()
 
+            current_rows = []
             current_keys=set()
             for key, row in rows.items():
 
@@ -357,16 +360,15 @@ class AssociationService(ServiceProcess):
                     continue
 
                 current_keys.add(row[OBJECT_KEY])
+                current_rows.append(row)
+
+            # Get the latest commits for all the Object_Keys at once
+            heads = yield self._get_heads(current_keys)
 
-                # Get the latest commits for the Subject_Key
-                object_query = store.Query()
-                # Get only the head or get all? Hmmm not sure...
-                object_query.add_predicate_gt(BRANCH_NAME,'')
-                object_query.add_predicate_eq(REPOSITORY_KEY,row[OBJECT_KEY])
-                object_heads = yield self.index_store.query(object_query)
+            for row in current_rows:
 
                 branches = []
-                for commit_key, commit_row in object_heads.items():
+                for commit_row in heads.get(row[OBJECT_KEY], ()):
 
                     if commit_row[BRANCH_NAME] in branches:
                         raise NotImplementedError('Dealing with divergence in an associated Object is not yet supported')
@@ -425,13 +427,8 @@ class AssociationService(ServiceProcess):
             raise AssociationServiceError('Unexpected type received \n %s' % str(object_reference), object_reference.ResponseCodes.BAD_REQUEST)
 
 
-        q = store.Query()
         # Get only the latest version of the association!
-        q.add_predicate_gt(BRANCH_NAME,'')
-
-        q.add_predicate_eq(OBJECT_KEY, object_reference.key)
-
-        rows = yield self.index_store.query(q)
+        rows = yield self._query_associations(object_key=object_reference.key)
 
 
         list_of_associations = yield self.message_client.create_instance(QUERY_RESULT_TYPE)
@@ -439,6 +436,11 @@ class AssociationService(ServiceProcess):
         # Make a place to store the branches found for each association
         repo_branches={}
 
+        # Read the branch of the reference once - not for every association
+        object_branch = None
+        if object_reference.IsFieldSet('branch') is True:
+            object_branch = object_reference.branch
+
         for key, row in rows.items():
 
             branches = repo_branches.get(row[REPOSITORY_KEY],None)
@@ -451,8 +453,8 @@ class AssociationService(ServiceProcess):
             else:
                 branches.add(row[BRANCH_NAME])
 
-            if object_reference.IsFieldSet('branch') is True:
-                if  True and row[OBJECT_BRANCH] == object_reference.branch:
+            if object_branch is not None:
+                if  True and row[OBJECT_BRANCH] == object_branch:
                     pass
 
                 else:
@@ -482,19 +484,19 @@ class AssociationService(ServiceProcess):
         if subject_reference.MessageType != IDREF_TYPE:
             raise AssociationServiceError('Unexpected type received \n %s' % str(subject_reference), subject_reference.ResponseCodes.BAD_REQUEST)
 
-        q = store.Query()
         # Get only the latest version of the association!
-        q.add_predicate_gt(BRANCH_NAME,'')
-
-        q.add_predicate_eq(SUBJECT_KEY, subject_reference.key)
-
-        rows = yield self.index_store.query(q)
+        rows = yield self._query_associations(subject_key=subject_reference.key)
 
         list_of_associations = yield self.message_client.create_instance(QUERY_RESULT_TYPE)
 
         # Make a place to store the branches found for each association
         repo_branches={}
 
+        # Read the branch of the reference once - not for every association
+        subject_branch = None
+        if subject_reference.IsFieldSet('branch') is True:
+            subject_branch = subject_reference.branch
+
         for key, row in rows.items():
 
             branches = repo_branches.get(row[REPOSITORY_KEY],None)
@@ -507,9 +509,9 @@ class AssociationService(ServiceProcess):
             else:
                 branches.add(row[BRANCH_NAME])
 
-            if subject_reference.IsFieldSet('branch') is True:
+            if subject_branch is not None:
 
-                if row[SUBJECT_BRANCH] == subject_reference.branch:
+                if row[SUBJECT_BRANCH] == subject_branch:
                     pass
 
                 else:
@@ -575,25 +577,316 @@ class AssociationService(ServiceProcess):
 
         yield self.reply_ok(msg, response)
 
+    @defer.inlineCallbacks
+    def op_associations_exist(self, request, headers, msg):
+        """
+        @see AssociationServiceClient.associations_exist
+        """
+        log.info('op_associations_exist: ')
 
+        if request.MessageType != BLOBS_MESSAGE_TYPE:
+            raise AssociationServiceError('Unexpected type received \n %s' % str(request), request.ResponseCodes.BAD_REQUEST)
 
+        response = yield self.message_client.create_instance(BLOBS_MESSAGE_TYPE)
 
-    def _get_association(self, association_query):
+        for association_query in request.blob_elements:
 
-        if association_query.MessageType != ASSOCIATION_QUERY_MSG_TYPE:
-            raise AssociationServiceError('Unexpected type received \n %s' % str(association_query), association_query.ResponseCodes.BAD_REQUEST)
+            if association_query.ObjectType != ASSOCIATION_QUERY_MSG_TYPE:
+                raise AssociationServiceError('Unexpected association query type received \n %s' % str(association_query), request.ResponseCodes.BAD_REQUEST)
+
+            rows = yield self._query_associations(subject_key=association_query.subject.key,
+                                                  predicate_key=association_query.predicate.key,
+                                                  object_key=association_query.object.key)
+
+            if len(rows) > 1:
+                raise AssociationServiceError('More than one association found for the specified triple!', request.ResponseCodes.BAD_REQUEST)
+
+            exists = response.CreateObject(BOOL_MSG_TYPE)
+            exists.result = len(rows) == 1
+
+            link = response.blob_elements.add()
+            link.SetLink(exists)
+
+        yield self.reply_ok(msg, response)
+
+
+    @defer.inlineCallbacks
+    def _get_heads(self, repo_keys, life_cycle_pair=None, type_of_pair=None):
+        """
+        Get the head commit rows for a set of repositories with a single query, optionally only those which have the
+        type and life cycle state of the given predicate object pairs.
+        @retval Deferred, for a dictionary of repository key to a list of its head commit rows
+        """
+        heads = {}
+        if not repo_keys:
+            defer.returnValue(heads)
+
+        ready = yield self._ensure_graph()
+        if ready:
+            heads, missing = self.graph.get_heads(repo_keys)
+            if missing:
+                yield self._load_graph_heads(self.graph, missing)
+                more_heads, missing = self.graph.get_heads(missing)
+                heads.update(more_heads)
+
+            if life_cycle_pair or type_of_pair:
+                heads = self._filter_heads(heads, life_cycle_pair, type_of_pair)
+
+            defer.returnValue(heads)
+
+        q = store.Query()
+        # Latest state
+        q.add_predicate_gt(BRANCH_NAME,'')
+
+        q.add_predicate_in(REPOSITORY_KEY, repo_keys)
+
+        if life_cycle_pair:
+            q.add_predicate_eq(RESOURCE_LIFE_CYCLE_STATE, str(life_cycle_pair.object.lcs))
+
+        if type_of_pair:
+            q.add_predicate_eq(RESOURCE_OBJECT_TYPE, type_of_pair.object.key)
+
+        rows = yield self.index_store.query(q)
+
+        for key, row in rows.iteritems():
+            heads.setdefault(row[REPOSITORY_KEY], []).append(row)
+
+        defer.returnValue(heads)
+
+
+    def _filter_heads(self, heads, life_cycle_pair, type_of_pair):
+        """
+        Keep only the head rows which have the type and life cycle state of the given predicate object pairs.
+        """
+        lcs = None
+        if life_cycle_pair:
+            lcs = str(life_cycle_pair.object.lcs)
+
+        resource_type = None
+        if type_of_pair:
+            resource_type = type_of_pair.object.key
+
+        result = {}
+        for repo_key, rows in heads.iteritems():
+            rows = [row for row in rows if (lcs is None or row.get(RESOURCE_LIFE_CYCLE_STATE) == lcs) and
+                                           (resource_type is None or row.get(RESOURCE_OBJECT_TYPE) == resource_type)]
+            if rows:
+                result[repo_key] = rows
+        return result
+
+    @defer.inlineCallbacks
+    def _query_associations(self, subject_key=None, predicate_key=None, object_key=None):
+        """
+        Get the head commit rows of the associations with the given subject, predicate and object keys - from the
+        association graph if it is in use, otherwise from the index store.
+        @retval Deferred, for a dictionary of commit key to row
+        """
+        ready = yield self._ensure_graph()
+        if ready:
+            rows = self.graph.associations(subject_key, predicate_key, object_key)
+            if rows is not None:
+                defer.returnValue(rows)
 
         q = store.Query()
-        # Get only the latest version of the association!
         q.add_predicate_gt(BRANCH_NAME,'')
 
-        q.add_predicate_eq(SUBJECT_KEY, association_query.subject.key)
+        if subject_key is not None:
+            q.add_predicate_eq(SUBJECT_KEY, subject_key)
 
-        q.add_predicate_eq(PREDICATE_KEY, association_query.predicate.key)
+        if predicate_key is not None:
+            q.add_predicate_eq(PREDICATE_KEY, predicate_key)
 
-        q.add_predicate_eq(OBJECT_KEY, association_query.object.key)
+        if object_key is not None:
+            q.add_predicate_eq(OBJECT_KEY, object_key)
 
-        return self.index_store.query(q)
+        rows = yield self.index_store.query(q)
+        defer.returnValue(rows)
+
+    def _ensure_graph(self):
+        """
+        Build the association graph the first time it is needed - concurrent requests wait for the same build.
+        @retval Deferred, True if the graph is in use and ready
+        """
+        if not self._use_graph:
+            return defer.succeed(False)
+
+        if self._graph_ready:
+            return defer.succeed(True)
+
+        d = defer.Deferred()
+        self._graph_waiters.append(d)
+        if len(self._graph_waiters) == 1:
+            self._rebuild_graph().addBoth(self._graph_build_complete)
+        return d
+
+    def _graph_build_complete(self, result):
+        if isinstance(result, failure.Failure):
+            # Fall back to the index store for the waiting requests - the next request will try again
+            log.error('Failed to build the association graph: %s' % result.getErrorMessage())
+
+        waiters = self._graph_waiters
+        self._graph_waiters = []
+        for d in waiters:
+            d.callback(self._graph_ready)
+
+    @defer.inlineCallbacks
+    def _rebuild_graph(self):
+        """
+        Build a new graph from the commit store and make it current, applying any pushes which arrive during the build.
+        """
+        self._graph_pending = set()
+        try:
+            graph = yield self._build_graph()
+
+            while self._graph_pending:
+                pending = self._graph_pending
+                self._graph_pending = set()
+                yield self._refresh_graph(graph, pending)
+
+        finally:
+            self._graph_pending = None
+
+        self.graph = graph
+        self._graph_ready = True
+        log.info('Built %s' % graph)
+
+    @defer.inlineCallbacks
+    def _build_graph(self):
+        """
+        Build a graph of the head associations in the commit store. The commit store can only be searched by
+        predicate, so the graph is built for the ION predicates, the configured graph_predicates and the predicates
+        of the current graph. Associations using other predicates are added as they are pushed.
+        """
+        predicates = set([value[ID_CFG] for value in ION_PREDICATES.values()])
+        predicates.update(self._graph_predicates)
+        predicates.update(self.graph.predicates())
+
+        graph = AssociationGraph()
+
+        q = store.Query()
+        q.add_predicate_gt(BRANCH_NAME,'')
+        q.add_predicate_in(PREDICATE_KEY, list(predicates))
+
+        rows = yield self._query_all(q)
+
+        missing = set()
+        for repo_key, repo_rows in self._group_by_repository(rows).iteritems():
+            missing.update(graph.update_repository(repo_key, repo_rows))
+
+        yield self._load_graph_heads(graph, missing)
+        defer.returnValue(graph)
+
+    @defer.inlineCallbacks
+    def _refresh_graph(self, graph, repo_keys):
+        """
+        Update the graph with the current head commits of some repositories.
+        """
+        q = store.Query()
+        q.add_predicate_gt(BRANCH_NAME,'')
+        q.add_predicate_in(REPOSITORY_KEY, repo_keys)
+
+        rows = yield self._query_all(q)
+        grouped = self._group_by_repository(rows)
+
+        missing = set()
+        for repo_key in repo_keys:
+            missing.update(graph.update_repository(repo_key, grouped.get(repo_key, {})))
+
+        yield self._load_graph_heads(graph, missing)
+
+    @defer.inlineCallbacks
+    def _load_graph_heads(self, graph, repo_keys):
+        """
+        Load the head commits of the subjects and objects of associations into the graph.
+        """
+        if not repo_keys:
+            return
+
+        q = store.Query()
+        q.add_predicate_gt(BRANCH_NAME,'')
+        q.add_predicate_in(REPOSITORY_KEY, repo_keys)
+
+        rows = yield self._query_all(q)
+        grouped = self._group_by_repository(rows)
+
+        for repo_key in repo_keys:
+            graph.set_heads(repo_key, grouped.get(repo_key, {}))
+
+    @defer.inlineCallbacks
+    def _query_all(self, q):
+        """
+        Get all the rows which match a query. A cassandra query returns at most row_count rows, so page through them.
+        """
+        if isinstance(self.index_store, cassandra.CassandraIndexedStore):
+            rows = yield self.index_store.query_all(q, page_size=self._graph_page_size)
+        else:
+            rows = yield self.index_store.query(q)
+
+        defer.returnValue(rows)
+
+    def _group_by_repository(self, rows):
+        grouped = {}
+        for key, row in rows.iteritems():
+            grouped.setdefault(row[REPOSITORY_KEY], {})[key] = row
+        return grouped
+
+    @defer.inlineCallbacks
+    def _on_datastore_push(self, data):
+        """
+        Handler for datastore push events - the origin of the event is the repository key.
+        """
+        repo_key = data['content'].origin
+
+        if self._graph_pending is not None:
+            # Apply it when the build in progress is complete
+            self._graph_pending.add(repo_key)
+
+        elif self._graph_ready:
+            yield self._refresh_graph(self.graph, [repo_key])
+
+    @defer.inlineCallbacks
+    def op_rebuild_graph(self, request, headers, msg):
+        """
+        @see AssociationServiceClient.rebuild_graph
+        """
+        log.info('op_rebuild_graph: ')
+
+        if not self._use_graph:
+            raise AssociationServiceError('The association graph is not in use by this association service!', self.BAD_REQUEST)
+
+        self._graph_ready = False
+        yield self._ensure_graph()
+
+        yield self.reply_ok(msg, {'associations':len(self.graph), 'ready':self._graph_ready})
+
+    @defer.inlineCallbacks
+    def op_check_graph(self, request, headers, msg):
+        """
+        @see AssociationServiceClient.check_graph
+        """
+        log.info('op_check_graph: ')
+
+        if not self._use_graph:
+            raise AssociationServiceError('The association graph is not in use by this association service!', self.BAD_REQUEST)
+
+        ready = yield self._ensure_graph()
+        if not ready:
+            raise AssociationServiceError('The association graph could not be built!')
+
+        expected = yield self._build_graph()
+
+        yield self.reply_ok(msg, self.graph.compare(expected))
+
+
+    def _get_association(self, association_query):
+
+        if association_query.MessageType != ASSOCIATION_QUERY_MSG_TYPE:
+            raise AssociationServiceError('Unexpected type received \n %s' % str(association_query), association_query.ResponseCodes.BAD_REQUEST)
+
+        # Get only the latest version of the association!
+        return self._query_associations(subject_key=association_query.subject.key,
+                                        predicate_key=association_query.predicate.key,
+                                        object_key=association_query.object.key)
 
 
     @defer.inlineCallbacks
@@ -606,20 +899,20 @@ class AssociationService(ServiceProcess):
         if association_query.MessageType != ASSOCIATION_QUERY_MSG_TYPE:
             raise AssociationServiceError('Unexpected type received \n %s' % str(association_query), association_query.ResponseCodes.BAD_REQUEST)
 
-        q = store.Query()
-        # Get only the latest version of the association!
-        q.add_predicate_gt(BRANCH_NAME,'')
-
+        subject_key = None
         if association_query.IsFieldSet('subject'):
-            q.add_predicate_eq(SUBJECT_KEY, association_query.subject.key)
+            subject_key = association_query.subject.key
 
+        predicate_key = None
         if association_query.IsFieldSet('predicate'):
-            q.add_predicate_eq(PREDICATE_KEY, association_query.predicate.key)
+            predicate_key = association_query.predicate.key
 
+        object_key = None
         if association_query.IsFieldSet('object'):
-            q.add_predicate_eq(OBJECT_KEY, association_query.object.key)
+            object_key = association_query.object.key
 
-        rows = yield self.index_store.query(q)
+        # Get only the latest version of the association!
+        rows = yield self._query_associations(subject_key, predicate_key, object_key)
 
         response = yield self.message_client.create_instance(QUERY_RESULT_TYPE)
 
@@ -757,6 +1050,45 @@ class AssociationServiceClient(ServiceClient):
 
         defer.returnValue(content)
 
+    @defer.inlineCallbacks
+    def associations_exist(self, msg):
+        """
+        @brief Check several associations with one request
+        @param params msg, GPB 52/1, a blobs message which links an association query GPB 27/1 for each association
+        @retval a blobs message GPB 52/1 which links a Boolean Result GPB 30/1 for each query in the same order
+        @GPB{Input,52,1}
+        @GPB{Returns,52,1}
+        """
+        yield self._check_init()
+
+        (content, headers, msg) = yield self.rpc_send('associations_exist', msg)
+
+        defer.returnValue(content)
+
+    @defer.inlineCallbacks
+    def rebuild_graph(self):
+        """
+        @brief Rebuild the association graph of the service from the commit store
+        @retval A dictionary with the number of associations in the graph
+        """
+        yield self._check_init()
+
+        (content, headers, msg) = yield self.rpc_send('rebuild_graph', None)
+
+        defer.returnValue(content)
+
+    @defer.inlineCallbacks
+    def check_graph(self):
+        """
+        @brief Compare the association graph of the service with the commit store
+        @retval A dictionary with the keys of the associations which are missing, stale or changed in the graph
+        """
+        yield self._check_init()
+
+        (content, headers, msg) = yield self.rpc_send('check_graph', None)
+
+        defer.returnValue(content)
+
 # Spawn of the process using the module name
 factory = ProcessFactory(AssociationService)
 
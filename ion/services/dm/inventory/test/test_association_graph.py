@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""
+@file ion/services/dm/inventory/test/test_association_graph.py
+@brief Tests for the association service's in process association graph
+"""
+
+from twisted.trial import unittest
+
+from ion.core.data.storage_configuration_utility import REPOSITORY_KEY, BRANCH_NAME, VALUE
+from ion.core.data.storage_configuration_utility import SUBJECT_KEY, SUBJECT_BRANCH, PREDICATE_KEY, OBJECT_KEY, OBJECT_BRANCH
+from ion.core.data.storage_configuration_utility import RESOURCE_OBJECT_TYPE, RESOURCE_LIFE_CYCLE_STATE
+
+from ion.services.dm.inventory.association_graph import AssociationGraph
+
+
+def association_row(repo_key, subject_key, predicate_key, object_key):
+    return {REPOSITORY_KEY:repo_key, BRANCH_NAME:'master', VALUE:'blob',
+            SUBJECT_KEY:subject_key, SUBJECT_BRANCH:'master',
+            PREDICATE_KEY:predicate_key,
+            OBJECT_KEY:object_key, OBJECT_BRANCH:'master'}
+
+def resource_row(repo_key, resource_type, lcs):
+    return {REPOSITORY_KEY:repo_key, BRANCH_NAME:'master', VALUE:'blob',
+            RESOURCE_OBJECT_TYPE:resource_type, RESOURCE_LIFE_CYCLE_STATE:lcs}
+
+
+class AssociationGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = AssociationGraph()
+
+        missing = self.graph.update_repository('assoc1', {'c1':association_row('assoc1', 'dataset1', 'owned_by', 'user1')})
+        self.assertEqual(missing, set(['dataset1', 'user1']))
+
+        missing = self.graph.update_repository('assoc2', {'c2':association_row('assoc2', 'dataset2', 'owned_by', 'user1')})
+        self.assertEqual(missing, set(['dataset2', 'user1']))
+
+        self.graph.update_repository('assoc3', {'c3':association_row('assoc3', 'dataset1', 'type_of', 'dataset_type')})
+
+        self.graph.set_heads('dataset1', {'d1':resource_row('dataset1', 'dataset_type', 'ACTIVE')})
+        self.graph.set_heads('dataset2', {'d2':resource_row('dataset2', 'dataset_type', 'NEW')})
+        self.graph.set_heads('user1', {'u1':resource_row('user1', 'identity_type', 'ACTIVE')})
+
+    def test_associations(self):
+        rows = self.graph.associations(predicate_key='owned_by', object_key='user1')
+        self.assertEqual(set(rows.keys()), set(['c1', 'c2']))
+        self.failIf(VALUE in rows['c1'])
+
+        rows = self.graph.associations(subject_key='dataset1', predicate_key='type_of')
+        self.assertEqual(rows.keys(), ['c3'])
+
+        rows = self.graph.associations(subject_key='dataset1')
+        self.assertEqual(set(rows.keys()), set(['c1', 'c3']))
+
+        rows = self.graph.associations(subject_key='dataset1', predicate_key='owned_by', object_key='user2')
+        self.assertEqual(rows, {})
+
+        # No index for a search by predicate alone
+        self.assertEqual(self.graph.associations(predicate_key='owned_by'), None)
+
+    def test_predicates(self):
+        self.assertEqual(self.graph.predicates(), set(['owned_by', 'type_of']))
+
+        self.graph.update_repository('assoc3', {})
+        self.assertEqual(self.graph.predicates(), set(['owned_by']))
+
+    def test_get_heads(self):
+        heads, missing = self.graph.get_heads(['dataset1', 'dataset2', 'unknown'])
+        self.assertEqual(set(heads.keys()), set(['dataset1', 'dataset2']))
+        self.assertEqual(heads['dataset1'][0][RESOURCE_LIFE_CYCLE_STATE], 'ACTIVE')
+        self.assertEqual(missing, set(['unknown']))
+
+    def test_update_repository(self):
+        # The association now points at a new object
+        self.graph.update_repository('assoc2', {'c4':association_row('assoc2', 'dataset2', 'owned_by', 'user2')})
+
+        rows = self.graph.associations(predicate_key='owned_by', object_key='user1')
+        self.assertEqual(rows.keys(), ['c1'])
+
+        rows = self.graph.associations(predicate_key='owned_by', object_key='user2')
+        self.assertEqual(rows.keys(), ['c4'])
+
+        # A subject changes state
+        self.graph.update_repository('dataset2', {'d3':resource_row('dataset2', 'dataset_type', 'ACTIVE')})
+        heads, missing = self.graph.get_heads(['dataset2'])
+        self.assertEqual(heads['dataset2'][0][RESOURCE_LIFE_CYCLE_STATE], 'ACTIVE')
+
+        # The association has no head any more
+        self.graph.update_repository('assoc1', {})
+        self.assertEqual(self.graph.associations(subject_key='dataset1', predicate_key='owned_by'), {})
+        self.assertEqual(len(self.graph), 2)
+
+    def test_compare(self):
+        other = AssociationGraph()
+        other.update_repository('assoc1', {'c1':association_row('assoc1', 'dataset1', 'owned_by', 'user1')})
+        other.update_repository('assoc2', {'c5':association_row('assoc2', 'dataset2', 'owned_by', 'user2')})
+        other.update_repository('assoc4', {'c6':association_row('assoc4', 'dataset3', 'owned_by', 'user1')})
+        other.set_heads('dataset1', {'d1':resource_row('dataset1', 'dataset_type', 'RETIRED')})
+
+        result = self.graph.compare(other)
+        self.assertEqual(result['missing'], ['assoc4'])
+        self.assertEqual(result['stale'], ['assoc3'])
+        self.assertEqual(set(result['changed']), set(['assoc2', 'dataset1']))
+        self.assertEqual(result['consistent'], False)
+
+        self.assertEqual(self.graph.compare(self.graph)['consistent'], True)
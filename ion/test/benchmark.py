@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+"""
+@file ion/test/benchmark.py
+@brief Timing helpers shared by the benchmark test cases. Benchmark modules are named benchmark_*.py so a plain
+trial run does not collect them - run one by name: bin/trial ion.core.object.test.benchmark_codec
+"""
+
+import time
+
+
+def time_call(func, *args, **kwargs):
+    """
+    Calls func once.
+    @retval tuple of the seconds the call took and its result
+    """
+    t1 = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - t1, result
+
+
+def best_time(repeats, func, *args, **kwargs):
+    """
+    Calls func repeats times.
+    @retval tuple of the seconds the fastest call took and its result
+    """
+    return min([time_call(func, *args, **kwargs) for x in xrange(repeats)], key=lambda x: x[0])
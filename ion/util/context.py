@@ -112,20 +112,85 @@ class StackLocal(object):
         return val
 
 
-class ContextLocal(threading.local):
+class RequestContext(dict):
     """
-    Extend threading.local to have a dict-style 'get' method.
-    Eventually this class could be a generic context-local class that works in threads, deferreds, greenlets, etc.
+    The values of one request context.
     """
 
-    def get(self, key, defaultVal=None):
+
+class _ThreadContexts(threading.local):
+    """
+    Per thread state of a ContextLocal: the root context of the thread and the request context which is active in it,
+    if any.
+    """
+    def __init__(self):
+        self.root = RequestContext()
+        self.active = None
+
+
+class ContextLocal(object):
+    """
+    Context storage for request processing with a dict-style 'get' method.
+
+    Without a request context the values are thread local. Code running in the reactor thread can instead run in a
+    RequestContext of its own (see run_in_context). The context is carried explicitly: the receiver runs each message
+    in a context of its own and a reply in the context of the request which sent it, so a handler waiting for an RPC
+    resumes in its own context. Values set in a request context are also set in the thread's root context, so code
+    resumed from elsewhere (a timer, a datastore query) sees the values last set, as with a plain thread local.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, '_contexts', _ThreadContexts())
+
+    def current_context(self):
+        """
+        @retval the active request context or the root context of this thread
+        """
+        contexts = self._contexts
+        return contexts.active if contexts.active is not None else contexts.root
+
+    def active_context(self):
+        """
+        @retval the active request context, None outside a request context
+        """
+        return self._contexts.active
+
+    def __getattr__(self, key):
         try:
-            return self.__getattribute__(key)
-        except AttributeError:
-            return defaultVal
+            return self.current_context()[key]
+        except KeyError:
+            raise AttributeError('There is no attribute named "%s" in the current context.' % key)
+
+    def __setattr__(self, key, val):
+        contexts = self._contexts
+        if contexts.active is not None:
+            contexts.active[key] = val
+        contexts.root[key] = val
+
+    def __delattr__(self, key):
+        try:
+            del self.current_context()[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def get(self, key, defaultVal=None):
+        return self.current_context().get(key, defaultVal)
 
     def clear(self):
-        self.__dict__.clear()
+        self.current_context().clear()
+
+    def run_in_context(self, context, f, *args, **kwargs):
+        """
+        Call f with context as the active request context. The previous context is active again when f returns.
+        """
+        contexts = self._contexts
+        previous = contexts.active
+        contexts.active = context
+        try:
+            return f(*args, **kwargs)
+        finally:
+            contexts.active = previous
+
 
 if __name__ == '__main__':
     context = StackLocal()
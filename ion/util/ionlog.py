@@ -6,6 +6,8 @@
 @brief Abstracts from any form of logging in ION
 """
 import logging
+import os
+import sys
 from ion.core import ioninit
 
 class LogFactory(object):
@@ -57,30 +59,113 @@ except NameError:
 def getLogger(loggername=__name__):
     """
     This function is used to assign every module in the code base a separate
-    logger instance. Currently it just delegates to Python logging.
+    logger instance. The Python logging logger is wrapped in an IonLogger.
     """
-    return log_factory.get_logger(loggername)
+    return IonLogger(log_factory.get_logger(loggername))
 
-class ProcessInfo:
+
+# Frames in these files are not the caller of a log statement
+_srcfiles = (logging._srcfile, os.path.normcase(__file__.replace('.pyc', '.py').replace('.pyo', '.py')))
+
+
+class IonLogger(object):
     """
-    Adds extra parameters to the Python logging loggers, for process identification.
+    Wraps a Python logging logger. A message is only formatted with its
+    arguments once a handler emits it.
+    Pass the arguments to the log call instead of formatting the message
+    first, and wrap expensive arguments in lazy():
+
+        log.debug('Received %s', lazy(pu.pprint_to_string, payload))
+
+    All other attributes are those of the wrapped logger.
     """
 
-    def __getitem__(self, name):
-        from random import choice
-        if name == "procid":
-            result = "p1"
-        elif name == "procname":
-            result = "n1"
-        else:
-            result = self.__dict__.get(name, "?")
-        return result
-
-    def __iter__(self):
+    def __init__(self, logger):
+        self.logger = logger
+        self.manager = logger.manager
+
+    def isEnabledFor(self, level):
+        # Nothing is cached, so a level set any way at all is seen at once
+        if self.manager.disable >= level:
+            return False
+        return level >= self.logger.getEffectiveLevel()
+
+    def debug(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, msg, args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, msg, args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, msg, args, **kwargs)
+
+    warn = warning
+
+    def error(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.ERROR):
+            kwargs['exc_info'] = 1
+            self._log(logging.ERROR, msg, args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.CRITICAL):
+            self._log(logging.CRITICAL, msg, args, **kwargs)
+
+    fatal = critical
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.isEnabledFor(level):
+            self._log(level, msg, args, **kwargs)
+
+    def _log(self, level, msg, args, exc_info=None, extra=None):
         """
-        To allow iteration over keys, which will be merged into
-        the LogRecord dict before formatting and output.
+        Same as logging.Logger._log, but reports the caller of the IonLogger.
         """
-        keys = ["procid", "procname"]
-        keys.extend(self.__dict__.keys())
-        return keys.__iter__()
+        filename, lineno, func = _find_caller()
+        if exc_info and not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+        record = self.logger.makeRecord(self.logger.name, level, filename, lineno, msg, args, exc_info, func, extra)
+        self.logger.handle(record)
+
+    def __getattr__(self, name):
+        return getattr(self.logger, name)
+
+    def __repr__(self):
+        return '<IonLogger %s>' % self.logger.name
+
+
+def _find_caller():
+    f = sys._getframe(2)
+    while f is not None:
+        filename = os.path.normcase(f.f_code.co_filename)
+        if filename not in _srcfiles:
+            return f.f_code.co_filename, f.f_lineno, f.f_code.co_name
+        f = f.f_back
+    return "(unknown file)", 0, "(unknown function)"
+
+
+class lazy(object):
+    """
+    A log argument which is computed by calling f(*args, **kwargs) when the
+    message is first formatted, so never if the log level is disabled.
+    """
+    __slots__ = ['f', 'args', 'kwargs', 'value']
+
+    def __init__(self, f, *args, **kwargs):
+        self.f = f
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+
+    def __str__(self):
+        if self.value is None:
+            self.value = str(self.f(*self.args, **self.kwargs))
+        return self.value
+
+    __repr__ = __str__
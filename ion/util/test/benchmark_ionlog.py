@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+@file ion/util/test/benchmark_ionlog.py
+@brief Measures the cost of the debug log statements of a message round trip with the log level at INFO: formatted
+before the call, as the message stack used to, and with deferred arguments through the IonLogger.
+"""
+
+import logging
+
+from ion.test.iontest import IonTestCase
+from ion.test.benchmark import time_call
+
+import ion.util.ionlog
+from ion.util.ionlog import lazy
+import ion.util.procutils as pu
+
+log = ion.util.ionlog.getLogger(__name__)
+
+
+def make_payload(size):
+    """
+    A message payload with size bytes of content.
+    """
+    return {'sender':'bench_sender',
+            'receiver':'bench_receiver',
+            'conv-id':'bench#1',
+            'protocol':'rpc',
+            'performative':'request',
+            'op':'bench',
+            'content':'x' * size}
+
+
+def round_trip_none(payload):
+    pass
+
+def round_trip_eager(payload):
+    # The request, as sent and received
+    for side in ('send', 'receive'):
+        log.debug('[%s] %s(): payload %s' % ('bench', side, pu.pprint_to_string(payload)))
+        log.debug('CONVID "%s"' % payload['conv-id'])
+        log.debug('Content "%s"' % str(payload['content']))
+
+def round_trip_lazy(payload):
+    for side in ('send', 'receive'):
+        log.debug('[%s] %s(): payload %s', 'bench', side, lazy(pu.pprint_to_string, payload))
+        log.debug('CONVID "%s"', payload['conv-id'])
+        log.debug('Content "%s"', payload['content'])
+
+
+def round_trips(round_trip, payload, count):
+    for x in xrange(count):
+        round_trip(payload)
+
+
+class IonLogBenchmark(IonTestCase):
+
+    count = 20
+    size = 2**20
+
+    def test_round_trip_logging(self):
+
+        level = log.level
+        log.setLevel(logging.INFO)
+        try:
+            payload = make_payload(self.size)
+
+            log.info("%10s %16s" % ('logging', 'per trip (us)'))
+            for name, round_trip in (('none', round_trip_none), ('eager', round_trip_eager), ('lazy', round_trip_lazy)):
+                seconds = time_call(round_trips, round_trip, payload, self.count)[0]
+                log.info("%10s %16.2f" % (name, seconds / self.count * 1e6))
+        finally:
+            log.setLevel(level)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+@file ion/util/test/test_context.py
+@brief Tests of request context storage
+"""
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+import ion.util.ionlog
+log = ion.util.ionlog.getLogger(__name__)
+
+from ion.util.context import ContextLocal, RequestContext
+
+
+class ContextLocalTest(unittest.TestCase):
+
+    def test_attributes(self):
+
+        context = ContextLocal()
+        context.user_id = 'bob'
+
+        self.assertEqual(context.user_id, 'bob')
+        self.assertEqual(context.get('user_id'), 'bob')
+        self.assertEqual(context.get('expiry', '0'), '0')
+        self.assertRaises(AttributeError, getattr, context, 'expiry')
+
+        context.clear()
+        self.assertEqual(context.get('user_id'), None)
+
+    def test_run_in_context(self):
+
+        context = ContextLocal()
+        context.user_id = 'root'
+
+        request_context = RequestContext()
+
+        def set_user():
+            context.user_id = 'bob'
+            return context.user_id
+
+        self.assertEqual(context.run_in_context(request_context, set_user), 'bob')
+
+        self.assertEqual(request_context['user_id'], 'bob')
+
+        # The request context keeps its value when the thread's value changes
+        context.user_id = 'root'
+        self.assertEqual(context.run_in_context(request_context, context.get, 'user_id'), 'bob')
+
+    def test_root_sees_last_value(self):
+
+        context = ContextLocal()
+        context.user_id = 'root'
+
+        def set_user(user_id):
+            context.user_id = user_id
+
+        context.run_in_context(RequestContext(), set_user, 'alice')
+        self.assertEqual(context.user_id, 'alice')
+        self.assertEqual(context.active_context(), None)
+
+    @defer.inlineCallbacks
+    def test_resume_in_request_context(self):
+
+        context = ContextLocal()
+        waiting = {}
+        contexts = {}
+        seen = {}
+
+        @defer.inlineCallbacks
+        def handle(user_id):
+            context.user_id = user_id
+            contexts[user_id] = context.active_context()
+            d = defer.Deferred()
+            waiting[user_id] = d
+
+            # The reply is received in the context of the request that waits for it
+            yield d
+            seen[user_id] = context.get('user_id')
+
+        d1 = context.run_in_context(RequestContext(), handle, 'alice')
+        d2 = context.run_in_context(RequestContext(), handle, 'bob')
+
+        context.run_in_context(contexts['alice'], waiting['alice'].callback, None)
+        context.run_in_context(contexts['bob'], waiting['bob'].callback, None)
+
+        yield defer.DeferredList([d1, d2])
+
+        self.assertEqual(seen, {'alice':'alice', 'bob':'bob'})
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+@file ion/util/test/test_ionlog.py
+@brief Tests of the IonLogger facade
+"""
+
+import logging
+
+from twisted.trial import unittest
+
+import ion.util.ionlog
+from ion.util.ionlog import lazy
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class IonLoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.logger = logging.getLogger('ion.util.test.ionlog_facade')
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+        self.log = ion.util.ionlog.getLogger('ion.util.test.ionlog_facade')
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.logger.propagate = True
+        self.logger.setLevel(logging.NOTSET)
+
+    def test_lazy_arguments(self):
+        calls = []
+        def expensive(value):
+            calls.append(value)
+            return value.upper()
+
+        self.log.debug('Debug %s', lazy(expensive, 'debug'))
+        self.assertEqual(calls, [])
+        self.assertEqual(self.handler.records, [])
+
+        self.log.info('Info %s', lazy(expensive, 'info'))
+        self.assertEqual(calls, [])
+
+        record = self.handler.records[0]
+        self.assertEqual(record.getMessage(), 'Info INFO')
+        self.assertEqual(record.getMessage(), 'Info INFO')
+        self.assertEqual(calls, ['info'])
+
+        # The caller of the log statement is recorded, not the facade
+        self.assertEqual(record.funcName, 'test_lazy_arguments')
+        self.assertEqual(record.module, 'test_ionlog')
+
+    def test_level_change(self):
+        self.assertEqual(self.log.isEnabledFor(logging.DEBUG), False)
+        self.assertEqual(self.log.getEffectiveLevel(), logging.INFO)
+
+        # The level of a parent logger applies
+        self.logger.setLevel(logging.NOTSET)
+        parent = logging.getLogger('ion.util.test')
+        level = parent.level
+        parent.setLevel(logging.DEBUG)
+        try:
+            self.assertEqual(self.log.isEnabledFor(logging.DEBUG), True)
+            self.assertEqual(self.log.getEffectiveLevel(), logging.DEBUG)
+        finally:
+            parent.setLevel(level)
+
+    def test_level_set_directly(self):
+        self.assertEqual(self.log.isEnabledFor(logging.DEBUG), False)
+
+        # Not through setLevel - the check must still see it
+        self.logger.level = logging.DEBUG
+        self.assertEqual(self.log.isEnabledFor(logging.DEBUG), True)
+
+        logging.disable(logging.INFO)
+        try:
+            self.assertEqual(self.log.isEnabledFor(logging.DEBUG), False)
+            self.assertEqual(self.log.isEnabledFor(logging.INFO), False)
+            self.assertEqual(self.log.isEnabledFor(logging.WARNING), True)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.assertEqual(self.log.isEnabledFor(logging.DEBUG), True)
@@ -19,12 +19,18 @@ from ion.core import ioninit
 CONF = ioninit.config(__name__)
 
 @defer.inlineCallbacks
-def send_messages():
+def send_messages(count=600, receive_in_thread=None):
+    """
+    Send count concurrent hello messages and print the rate.
+    @param receive_in_thread if not None, set the receiver's receive_in_thread config value first
+    """
+    if receive_in_thread is not None:
+        ioninit.ion_config.update({'ion.core.messaging.receiver':{'receive_in_thread':receive_in_thread}})
+
     proc = Process()
     yield proc.spawn()
     hc = HelloServiceClient(proc)
 
-    count = 600
     tzero = time.time()
     
     yield hc._check_init()
@@ -39,8 +45,18 @@ def send_messages():
 
     delta_t = (time.time() - tzero)
     print('%f elapsed, %f per second' % (delta_t, float(count) / delta_t) )
-    defer.returnValue(None)
-    
+    defer.returnValue(float(count) / delta_t)
+
+@defer.inlineCallbacks
+def compare_receive_modes(count=600):
+    """
+    Run send_messages with messages received through a pool thread and in the reactor thread.
+    """
+    in_thread = yield send_messages(count, receive_in_thread=True)
+    in_reactor = yield send_messages(count, receive_in_thread=False)
+
+    print('receive in thread: %f per second, receive in reactor: %f per second' % (in_thread, in_reactor))
+
 @defer.inlineCallbacks
 def start(container, starttype, app_definition, *args, **kwargs):
     
@@ -54,6 +70,7 @@ def start(container, starttype, app_definition, *args, **kwargs):
     supid = yield appsup_desc.spawn()
     print "Hi "
     control.add_term_name('send_messages',send_messages)
+    control.add_term_name('compare_receive_modes',compare_receive_modes)
     res = (supid.full, [appsup_desc])
     defer.returnValue(res)
     
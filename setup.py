@@ -58,6 +58,10 @@ setup( name = 'ioncore',
            'pyserial==2.5',
            'ionproto>=0.3.28',
                           ],
+       extras_require = {
+           # optional - the datastore extracts fixed width arrays with numpy and falls back to python lists without it
+           'numpy': ['numpy>=1.3.0'],
+                        },
        entry_points = {
                         'console_scripts': [
                             'cassandra-setup=ion.core.data.cassandra_schema_script:main',